@@ -0,0 +1,12 @@
+"""
+gunicorn settings, used by the Procfile: gunicorn -c gunicorn.conf.py statistik.wsgi
+"""
+
+
+def post_worker_init(worker):
+    # post_fork runs before the worker has loaded Django, so warm up here.
+    # Warming runs in the background; /healthz/ready answers 503 until it's done.
+    from django.conf import settings
+    if getattr(settings, 'WARM_CACHES_ON_START', False):
+        from statistik.warmup import start_warmup
+        start_warmup()
@@ -0,0 +1,127 @@
+"""
+Benchmark storing review techniques/options as bitmasks instead of int arrays.
+
+Storage: copies the review masks into a temporary table alongside the int[]
+they replaced and compares pg_column_size totals. Queries: times technique
+search done with a bitwise AND against the old LIKE over the array's text form.
+Highlighting: times formatting characteristics from lists vs masks.
+
+    python misc/benchmark_bitmask.py --tech 3
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from django.db import connection, transaction
+
+from statistik.constants import IIDX
+from statistik.fields import technique_bit, mask_to_techniques, techniques_to_mask
+from statistik.labels import (get_label_table, format_characteristics_mask, HIGHLIGHT_COLOR,
+                              DEFAULT_COLOR)
+
+
+def format_characteristics_list(table, characteristics, best_techniques):
+    """
+    How reviews were formatted before masks: technique lists and a set of the
+    reviewer's best techniques
+    """
+    labels = table.techniques
+    return [(labels[x], HIGHLIGHT_COLOR if x in best_techniques else DEFAULT_COLOR)
+            for x in characteristics or ()]
+
+
+def setup_storage_table(cursor):
+    # rebuild the old array columns from the masks so both can be measured
+    cursor.execute("""
+        CREATE TEMPORARY TABLE bitmask_benchmark AS
+        SELECT r.characteristics AS characteristics_mask,
+               r.recommended_options AS options_mask,
+               ARRAY(SELECT ((b / 16) * 100 + b % 16) FROM generate_series(0, 31) b
+                     WHERE r.characteristics & (1 << b) != 0) AS characteristics_array,
+               ARRAY(SELECT b FROM generate_series(0, 31) b
+                     WHERE r.recommended_options & (1 << b) != 0) AS options_array
+        FROM statistik_review r
+        WHERE r.characteristics IS NOT NULL""")
+    cursor.execute("ANALYZE bitmask_benchmark")
+
+
+def report_storage(cursor):
+    cursor.execute("""
+        SELECT count(*),
+               sum(pg_column_size(characteristics_array)),
+               sum(pg_column_size(characteristics_mask)),
+               sum(pg_column_size(options_array)),
+               sum(pg_column_size(options_mask))
+        FROM bitmask_benchmark""")
+    rows, char_array, char_mask, opt_array, opt_mask = cursor.fetchone()
+    print('%d reviews' % rows)
+    print('  characteristics: int[] %8d bytes  mask %8d bytes' % (char_array or 0,
+                                                                     char_mask or 0))
+    print('  options:         int[] %8d bytes  mask %8d bytes' % (opt_array or 0,
+                                                                     opt_mask or 0))
+
+
+def report_queries(cursor, tech, repeat):
+    like = "SELECT count(*) FROM bitmask_benchmark WHERE " \
+           "UPPER(characteristics_array::text) LIKE UPPER(%s)"
+    bitand = "SELECT count(*) FROM bitmask_benchmark WHERE characteristics_mask & %s = %s"
+    bit = 1 << technique_bit(tech)
+
+    def run(sql, params):
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+    print('technique %d search' % tech)
+    for name, sql, params in (('icontains on int[]', like, ['%%%d%%' % tech]),
+                              ('bitwise AND', bitand, [bit, bit])):
+        matched = run(sql, params)
+        seconds = timeit.timeit(lambda: run(sql, params), number=repeat)
+        print('  %-20s %8.2f ms/query (%d rows)' % (name, seconds / repeat * 1000, matched))
+
+
+def report_highlighting(cursor, repeat):
+    cursor.execute("SELECT characteristics_mask FROM bitmask_benchmark")
+    masks = [row[0] for row in cursor.fetchall()]
+    lists = [mask_to_techniques(mask) for mask in masks]
+    best = [0, 3, 5]
+    best_set = set(best)
+    best_mask = techniques_to_mask(best)
+    table = get_label_table(IIDX)
+    per_review = repeat * max(len(masks), 1) / 1e6
+
+    print('highlighting best techniques')
+    seconds = timeit.timeit(lambda: [format_characteristics_list(table, x, best_set)
+                                     for x in lists], number=repeat)
+    print('  %-20s %8.2f us/review' % ('lists + set', seconds / per_review))
+    seconds = timeit.timeit(lambda: [format_characteristics_mask(table, x, best_mask)
+                                     for x in masks], number=repeat)
+    print('  %-20s %8.2f us/review' % ('masks + AND', seconds / per_review))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tech', type=int, default=3, help='Technique to search for')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        cursor = connection.cursor()
+        setup_storage_table(cursor)
+        report_storage(cursor)
+        report_queries(cursor, args.tech, args.repeat)
+        report_highlighting(cursor, args.repeat)
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    main()
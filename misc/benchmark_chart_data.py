@@ -0,0 +1,122 @@
+"""
+Benchmark the per-row cost of formatting chart lists.
+
+Compares building display data from Chart/Song model instances (the old
+get_chart_data and its difficulty and BPM display passes) with
+build_chart_rows over values_list() tuples. With --db, also times get_chart_data against the
+configured database.
+
+    python misc/benchmark_chart_data.py --rows 3000
+    python misc/benchmark_chart_data.py --db --difficulty 12
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from statistik.constants import IIDX
+from statistik.models import Song, Chart
+from statistik.rows import build_chart_rows
+
+
+def make_models(count):
+    return [Chart(id=i, type=i % 3, difficulty=12, note_count=1500,
+                  clickagain_nc=None, clickagain_hc=None,
+                  song=Song(id=i, title='Song %d' % i, alt_title=None, bpm_min=150,
+                            bpm_max=150 + i % 2, game=IIDX, game_version=i % 25 + 1))
+            for i in range(count)]
+
+
+def make_tuples(charts):
+    return [(c.id, c.song.title, c.song.alt_title, c.note_count, c.song.bpm_min,
+             c.song.bpm_max, c.difficulty, c.song.game_version, c.type,
+             c.clickagain_nc, c.clickagain_hc, c.aggregate_version) for c in charts]
+
+
+def make_avg_ratings(count):
+    return {i: {'clear_rating': '11.5', 'hc_rating': '12.1', 'exhc_rating': 0,
+                'score_rating': 0, 'has_reviewed': i % 7 == 0} for i in range(count)}
+
+
+def legacy_chart_data(charts, avg_ratings):
+    """
+    The model-based formatting get_chart_data used before tuple rows
+    """
+    chart_data = []
+    for chart in charts:
+        data = {
+            'id': chart.id,
+            'title': chart.song.title,
+            'alt_title': chart.song.alt_title or chart.song.title,
+            'note_count': chart.note_count or '--',
+            'bpm_min': chart.song.bpm_min or '--',
+            'bpm_max': chart.song.bpm_max or '--',
+            'difficulty': chart.difficulty,
+            'avg_clear_rating': str(avg_ratings[chart.id].get('clear_rating') or ""),
+            'avg_hc_rating': str(avg_ratings[chart.id].get('hc_rating') or ""),
+            'avg_exhc_rating': str(avg_ratings[chart.id].get('exhc_rating') or ""),
+            'avg_score_rating': str(avg_ratings[chart.id].get('score_rating') or ""),
+            'game_version': chart.song.game_version,
+            'game_version_display': chart.song.get_game_version_display(),
+            'type_display': chart.get_type_display(),
+            'clickagain_nc': False,
+            'clickagain_hc': False,
+            'has_reviewed': avg_ratings[chart.id].get('has_reviewed')
+        }
+        chart_data.append(data)
+    for chart in chart_data:
+        star = '★' if chart['has_reviewed'] else '☆'
+        chart['difficulty'] = str(chart['difficulty']) + star
+    for chart in chart_data:
+        if chart['bpm_min'] != chart['bpm_max']:
+            chart['bpm'] = '{0} - {1}'.format(chart['bpm_min'], chart['bpm_max'])
+        else:
+            chart['bpm'] = str(chart['bpm_min'])
+    return chart_data
+
+
+def report(name, seconds, rows, repeat):
+    print('%-28s %8.2f us/row' % (name, seconds / (rows * repeat) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', action='store_true', help='Also time get_chart_data')
+    parser.add_argument('--difficulty', type=int, default=12)
+    args = parser.parse_args()
+
+    models = make_models(args.rows)
+    tuples = make_tuples(models)
+    avg_ratings = make_avg_ratings(args.rows)
+
+    report('models + dicts (legacy)',
+           timeit.timeit(lambda: legacy_chart_data(models, avg_ratings), number=args.repeat),
+           args.rows, args.repeat)
+    report('model instantiation only',
+           timeit.timeit(lambda: make_models(args.rows), number=args.repeat),
+           args.rows, args.repeat)
+    report('tuples + ChartRow',
+           timeit.timeit(lambda: build_chart_rows(tuples, avg_ratings), number=args.repeat),
+           args.rows, args.repeat)
+
+    if args.db:
+        from statistik.controller import get_chart_data
+        rows = len(get_chart_data(IIDX, difficulty=args.difficulty))
+        seconds = timeit.timeit(lambda: get_chart_data(IIDX, difficulty=args.difficulty),
+                                number=args.repeat)
+        report('get_chart_data (%d rows)' % rows, seconds, max(rows, 1), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Micro-benchmark review serialization against the configured database.
+
+Compares the model/dict based review formatting that get_reviews_for_chart,
+get_reviews_for_user and get_avg_ratings(include_reviews=True) used to do with
+statistik.serializers.
+
+    python misc/benchmark_reviews.py --chart 1234 --user 5
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from django.db.models import Count
+from django.utils.translation import ugettext as _
+
+from statistik.constants import TECHNIQUE_CHOICES, RECOMMENDED_OPTIONS_CHOICES
+from statistik.models import Review
+from statistik.serializers import (serialize_reviews, encode_json, CHART_PAGE_FIELDS,
+                                   USER_PAGE_FIELDS)
+
+
+def legacy_reviews_for_chart(chart_id):
+    reviews = Review.objects.filter(chart=chart_id).prefetch_related('user__userprofile',
+                                                                     'chart__song')
+    data = []
+    for review in reviews:
+        game = review.chart.song.game
+        data.append({
+            'user': review.user.get_username(),
+            'user_id': review.user.id,
+            'playside': review.user.userprofile.get_play_side_display(),
+            'text': review.text,
+            'clear_rating': str(review.clear_rating or ""),
+            'hc_rating': str(review.hc_rating or ""),
+            'exhc_rating': str(review.exhc_rating or ""),
+            'score_rating': str(review.score_rating or ""),
+            'characteristics': [
+                (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#187638')
+                if x in review.user.userprofile.best_techniques
+                else (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#000')
+                for x in review.characteristics],
+            'recommended_options': ', '.join([
+                _(RECOMMENDED_OPTIONS_CHOICES[game][x][1]) for x in review.recommended_options])
+        })
+        if review.difficulty_spike:
+            data[-1]['characteristics'].append(
+                (_('Difficult ' + review.get_difficulty_spike_display()), '#000'))
+    return data
+
+
+def legacy_reviews_for_user(user_id):
+    reviews = Review.objects.filter(user=user_id).prefetch_related('chart__song',
+                                                                   'user__userprofile')
+    data = []
+    for review in reviews:
+        game = review.chart.song.game
+        techniques = review.user.userprofile.best_techniques
+        data.append({
+            'title': review.chart.song.title,
+            'text': review.text,
+            'chart_id': review.chart.id,
+            'type_display': review.chart.get_type_display(),
+            'difficulty': review.chart.difficulty,
+            'clear_rating': str(review.clear_rating or ""),
+            'hc_rating': str(review.hc_rating or ""),
+            'exhc_rating': str(review.exhc_rating or ""),
+            'score_rating': str(review.score_rating or ""),
+            'characteristics': [
+                (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#187638')
+                if x in techniques else (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#000')
+                for x in review.characteristics],
+            'recommended_options': ', '.join([
+                _(RECOMMENDED_OPTIONS_CHOICES[game][x][1]) for x in review.recommended_options])
+        })
+    return data
+
+
+def report(name, func, repeat, count):
+    seconds = timeit.timeit(func, number=repeat)
+    print('%-40s %8.2f ms/call %8.2f us/review' % (
+        name, seconds / repeat * 1000, seconds / (repeat * max(count, 1)) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chart', type=int, help='Chart to serialize reviews of '
+                                                  '(defaults to the most reviewed chart)')
+    parser.add_argument('--user', type=int, help='User to serialize reviews of '
+                                                 '(defaults to the most active reviewer)')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    chart_id = args.chart or Review.objects.values('chart').annotate(
+        n=Count('id')).order_by('-n')[0]['chart']
+    user_id = args.user or Review.objects.values('user').annotate(
+        n=Count('id')).order_by('-n')[0]['user']
+    chart_reviews = Review.objects.filter(chart=chart_id)
+    user_reviews = Review.objects.filter(user=user_id)
+
+    count = chart_reviews.count()
+    print('chart %d (%d reviews)' % (chart_id, count))
+    report('  legacy dicts', lambda: legacy_reviews_for_chart(chart_id), args.repeat, count)
+    report('  serializer', lambda: serialize_reviews(chart_reviews, CHART_PAGE_FIELDS),
+           args.repeat, count)
+    report('  serializer + JSON', lambda: encode_json(
+        serialize_reviews(chart_reviews, CHART_PAGE_FIELDS)), args.repeat, count)
+    report('  serializer + JSON (user, ratings only)', lambda: encode_json(
+        serialize_reviews(chart_reviews, ('user', 'clear_rating', 'hc_rating'))),
+           args.repeat, count)
+
+    count = user_reviews.count()
+    print('user %d (%d reviews)' % (user_id, count))
+    report('  legacy dicts', lambda: legacy_reviews_for_user(user_id), args.repeat, count)
+    report('  serializer', lambda: serialize_reviews(user_reviews, USER_PAGE_FIELDS),
+           args.repeat, count)
+
+
+if __name__ == '__main__':
+    main()
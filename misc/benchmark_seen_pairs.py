@@ -0,0 +1,78 @@
+"""
+Benchmark the per-user seen-pairs Bloom filter used by Elo matchmaking.
+
+Reports memory per user, false positive rate and lookup time for a user with
+--votes votes, against a sorted array of pair keys and a Python set.
+
+    python misc/benchmark_seen_pairs.py --votes 10000
+"""
+import argparse
+import array
+import bisect
+import os
+import random
+import sys
+import timeit
+from pathlib import Path
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from statistik.seen_pairs import BloomFilter, pair_key
+
+
+def random_pairs(count, charts, rng):
+    pairs = set()
+    while len(pairs) < count:
+        first, second = rng.sample(range(1, charts + 1), 2)
+        pairs.add((min(first, second), max(first, second)))
+    return list(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--votes', type=int, default=10000)
+    parser.add_argument('--charts', type=int, default=5000,
+                        help='Number of chart IDs pairs are drawn from')
+    parser.add_argument('--probes', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pairs = random_pairs(args.votes, args.charts, rng)
+    seen = set(pairs)
+    probes = [pair for pair in random_pairs(args.probes, args.charts, rng) if pair not in seen]
+
+    bloom = BloomFilter(args.votes)
+    for pair in pairs:
+        bloom.add(*pair)
+    keys = array.array('Q', sorted(pair_key(*pair) for pair in pairs))
+    key_set = {pair_key(*pair) for pair in pairs}
+
+    def sorted_contains(pair):
+        key = pair_key(*pair)
+        i = bisect.bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    false_positives = sum(1 for pair in probes if pair in bloom)
+    print('%d votes' % args.votes)
+    print('  bloom filter:  %8d bytes  (%d hashes, %.2f%% false positives)' % (
+        len(bloom.bits), bloom.hashes, false_positives * 100 / len(probes)))
+    print('  sorted keys:   %8d bytes' % (keys.itemsize * len(keys)))
+    print('  python set:    %8d bytes' % (sys.getsizeof(key_set) +
+                                          sum(sys.getsizeof(key) for key in key_set)))
+
+    sample = probes[:10000]
+    for name, contains in (('bloom filter', lambda pair: pair in bloom),
+                           ('sorted keys', sorted_contains),
+                           ('python set', lambda pair: pair_key(*pair) in key_set)):
+        seconds = timeit.timeit(lambda: [contains(pair) for pair in sample], number=5)
+        print('  %-14s %6.2f us/lookup' % (name, seconds / (5 * len(sample)) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
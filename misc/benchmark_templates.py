@@ -0,0 +1,76 @@
+"""
+Benchmark rendering the ratings table with the Django and Jinja2 engines.
+
+Renders the IIDX ratings table partial ({% table 'ratings_iidx' %}) for a
+synthetic chart list with each TABLE_TEMPLATE_ENGINE, checks that the outputs
+are identical and reports the time per render and per row, both with an empty
+row cache (cold) and with every row cached (warm).
+
+    python misc/benchmark_templates.py --rows 3000
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import engines
+from django.test import RequestFactory
+
+from statistik.rows import build_chart_rows
+
+TEMPLATE = "{% load tables %}{% table 'ratings_iidx' %}"
+
+
+def make_rows(count):
+    tuples = [(i, 'Song <%d>' % i, None, 1500, 150, 150 + i % 2, 12, i % 25 + 1, i % 3,
+               11.9 if i % 5 == 0 else None, 12.4 if i % 5 == 0 else None, 0)
+              for i in range(count)]
+    avg_ratings = {i: {'clear_rating': '11.5', 'hc_rating': '12.1', 'exhc_rating': 0,
+                       'score_rating': 0, 'has_reviewed': i % 7 == 0} if i % 5 else {}
+                   for i in range(count)}
+    return build_chart_rows(tuples, avg_ratings)
+
+
+def render(engine, context, request, cached=False):
+    if not cached:
+        cache.clear()
+    settings.TABLE_TEMPLATE_ENGINE = engine
+    return engines['django'].from_string(TEMPLATE).render(context, request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    context = {'charts': make_rows(args.rows)}
+    request = RequestFactory().get('/ratings')
+    outputs = {engine: render(engine, context, request) for engine in ('django', 'jinja2')}
+    if outputs['django'] != outputs['jinja2']:
+        sys.exit('Outputs differ')
+    print('%d rows, %d bytes, identical output' % (args.rows, len(outputs['django'])))
+
+    for engine in ('django', 'jinja2'):
+        for cached in (False, True):
+            render(engine, context, request)
+            seconds = timeit.timeit(lambda: render(engine, context, request, cached),
+                                    number=args.repeat)
+            print('%-8s %-5s %8.2f ms/render %8.2f us/row' % (
+                engine, 'warm' if cached else 'cold', seconds / args.repeat * 1000,
+                seconds / (args.repeat * args.rows) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
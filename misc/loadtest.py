@@ -0,0 +1,544 @@
+"""
+Load test the WSGI application with a realistic mix of traffic.
+
+Virtual users (threads) keep picking a scenario from the traffic mix by
+weight: ratings pages by level (weighted by PageAccess counts when there are
+any), chart pages, Elo matching with batched votes, user pages, searches and
+the JSON endpoints. A share of the virtual users log in as loadtest-<n>
+accounts, which are created in the configured database if they don't exist;
+logged-out users look at Elo lists instead of voting.
+
+By default requests are sent to statistik.wsgi.application in this process,
+which also counts each request's database queries. With --url they are sent
+over HTTP to a running server instead, e.g. one started with
+`gunicorn -c gunicorn.conf.py statistik.wsgi`; query counts aren't available
+then, but the server can use all its workers. Both modes read the chart,
+level and user samples from the database in DJANGO_SETTINGS_MODULE.
+
+Reports throughput, p50/p95/p99 latency, error rates and query totals per
+route. --json writes the report along with the run's settings and git
+revision, and --compare prints the changes against such a report, so runs
+with the same --seed and mix can be compared across commits.
+
+    python misc/loadtest.py --users 8 --duration 30 --json before.json
+    python misc/loadtest.py --url http://localhost:8000 --users 32 --compare before.json
+    python misc/loadtest.py --mix ratings=1,json=1 --no-votes
+"""
+import argparse
+import bisect
+import http.client
+import io
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+import django
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from statistik.constants import GAMES, SINGLES_LEVELS
+from statistik.controller import create_new_user
+from statistik.models import Chart, Review, PageAccess, Song
+
+# scenario -> relative weight
+DEFAULT_MIX = OrderedDict([('ratings', 30), ('chart', 20), ('elo', 15), ('user', 10),
+                           ('search', 10), ('json', 15)])
+USERNAME = 'loadtest-%d'
+PASSWORD = 'loadtest'
+VOTES_PER_BATCH = 5
+PERCENTILES = (50, 95, 99)
+
+
+def weighted_choice(rng, items, cumulative_weights):
+    """
+    Pick one of items with probability proportional to its weight (random.choices
+    is not available on Python 3.5)
+    :param random.Random rng:           Random source
+    :param list items:                  Items to choose from
+    :param list cumulative_weights:     Running totals of the items' weights
+    """
+    total = cumulative_weights[-1]
+    return items[bisect.bisect(cumulative_weights, rng.random() * total)]
+
+
+class Sample(object):
+    """
+    Levels, charts, users and search terms to request, read from the database
+    """
+
+    def __init__(self, game):
+        self.game = game
+        game_id = GAMES[game]
+        singles = [str(i) for i in SINGLES_LEVELS[game_id]]
+        charts = list(Chart.objects.filter(song__game=game_id).values_list(
+            'id', 'difficulty', 'type'))
+        if not charts:
+            raise SystemExit('No %s charts in the database' % game)
+        self.chart_ids = [chart_id for chart_id, _, _ in charts]
+        self.elo_levels = sorted({level for _, level, chart_type in charts
+                                  if str(chart_type) in singles})
+        accessed = dict(((level, variant), count) for level, variant, count in
+                        PageAccess.objects.filter(kind='ratings', game=game_id).values_list(
+                            'level', 'variant', 'count'))
+        if accessed:
+            self.ratings_pages = list(accessed)
+            self.ratings_weights = list(itertools.accumulate(accessed.values()))
+        else:
+            self.ratings_pages = [(level, 'SP') for level in self.elo_levels]
+            self.ratings_weights = None
+        self.user_ids = list(Review.objects.filter(chart__song__game=game_id).order_by(
+            'user_id').values_list('user_id', flat=True).distinct()[:1000]) or [None]
+        titles = Song.objects.filter(game=game_id).values_list('title', flat=True)[:1000]
+        self.search_terms = [word for title in titles for word in title.split()
+                             if len(word) > 2] or ['a']
+
+    def ratings_page(self, rng):
+        if self.ratings_weights:
+            return weighted_choice(rng, self.ratings_pages, self.ratings_weights)
+        return rng.choice(self.ratings_pages)
+
+
+class Client(object):
+    """
+    Sends requests for one virtual user, keeping its cookies
+    """
+
+    def __init__(self):
+        self.cookies = {}
+
+    def request(self, method, path, params=None, data=None):
+        """
+        :param str method:  HTTP method
+        :param str path:    Path without the query string
+        :param dict params: Query string parameters
+        :param dict data:   Form fields to POST
+        :rtype tuple:       (status, headers, body, number of queries or None)
+        """
+        query = urlencode(params or {}, doseq=True)
+        body = urlencode(data or {}).encode('utf-8')
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join('%s=%s' % item for item in self.cookies.items())
+        if data is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        status, response_headers, response_body, queries = self.send(method, path, query,
+                                                                      body, headers)
+        for name, value in response_headers:
+            if name.lower() == 'set-cookie':
+                for morsel in SimpleCookie(value).values():
+                    if morsel.value:
+                        self.cookies[morsel.key] = morsel.value
+                    else:
+                        self.cookies.pop(morsel.key, None)
+        return status, response_headers, response_body, queries
+
+    def send(self, method, path, query, body, headers):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WSGIClient(Client):
+    """
+    Calls the WSGI application in this process
+    """
+
+    def __init__(self, application, host):
+        super(WSGIClient, self).__init__()
+        self.application = application
+        self.host = host
+
+    def send(self, method, path, query, body, headers):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query,
+                   'SERVER_NAME': self.host, 'HTTP_HOST': self.host,
+                   'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else 'HTTP_' + key] = value
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = response_headers
+
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.application(environ, start_response)
+            try:
+                response_body = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        return response['status'], response['headers'], response_body, len(queries)
+
+    def close(self):
+        # threads aren't requests, so nothing else closes their connections
+        connection.close()
+
+
+class HTTPClient(Client):
+    """
+    Sends requests to a running server over one keep-alive connection
+    """
+
+    def __init__(self, url):
+        super(HTTPClient, self).__init__()
+        parts = urlsplit(url)
+        connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                            else http.client.HTTPConnection)
+        self.connection = connection_class(parts.hostname, parts.port, timeout=60)
+        self.prefix = parts.path.rstrip('/')
+
+    def send(self, method, path, query, body, headers):
+        url = self.prefix + path + ('?' + query if query else '')
+        try:
+            self.connection.request(method, url, body=body or None, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.getheaders(), response.read(), None
+        except Exception:
+            # reconnects on the next request
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+
+class Stats(object):
+    """
+    Latencies, errors and query counts per route, from all virtual users
+    """
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = Counter()
+        self.statuses = {}
+        self.queries = Counter()
+
+    def record(self, route, started, seconds, status, queries):
+        if started < self.measure_from:
+            return
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            self.statuses.setdefault(route, Counter())[str(status)] += 1
+            if status is None or status >= 400:
+                self.errors[route] += 1
+            if queries is not None:
+                self.queries[route] += queries
+
+
+class VirtualUser(object):
+    """
+    Runs scenarios from the traffic mix until the deadline
+    """
+
+    def __init__(self, client, sample, stats, rng, username=None, votes=True, think_time=0):
+        self.client = client
+        self.sample = sample
+        self.stats = stats
+        self.rng = rng
+        self.username = username
+        self.votes = votes
+        self.think_time = think_time
+        self.game = sample.game
+
+    def timed(self, route, method, path, params=None, data=None):
+        """
+        Send a request, recording it under route
+        :rtype tuple:   (status, headers, body), or None if it failed
+        """
+        started = time.time()
+        try:
+            status, headers, body, queries = self.client.request(method, path, params, data)
+        except Exception:
+            self.stats.record(route, started, time.time() - started, None, None)
+            return None
+        self.stats.record(route, started, time.time() - started, status, queries)
+        return status, headers, body
+
+    def login(self):
+        # the login form on every page sets the CSRF cookie
+        self.client.request('GET', '/' + self.game)
+        self.client.request('POST', '/login', data={
+            'username': self.username, 'password': PASSWORD,
+            'csrfmiddlewaretoken': self.client.cookies.get('csrftoken', '')})
+        if 'sessionid' not in self.client.cookies:
+            raise SystemExit('Could not log in as %s' % self.username)
+
+    def ratings(self):
+        level, style = self.sample.ratings_page(self.rng)
+        self.timed('ratings', 'GET', '/%s/ratings' % self.game,
+                   {'difficulty': level, 'style': style})
+
+    def chart(self):
+        self.timed('chart', 'GET', '/chart/%d' % self.rng.choice(self.sample.chart_ids))
+
+    def elo(self):
+        params = {'level': self.rng.choice(self.sample.elo_levels), 'type': self.rng.randint(0, 1)}
+        if not self.username:
+            self.timed('elo_list', 'GET', '/%s/elo' % self.game, dict(params, list='true'))
+            return
+        self.timed('elo_match', 'GET', '/%s/elo' % self.game, params)
+        response = self.timed('elo_matchups', 'GET', '/%s/elo/matchups' % self.game,
+                              dict(params, count=VOTES_PER_BATCH))
+        if not (self.votes and response and response[0] == 200):
+            return
+        matchups = json.loads(response[2].decode('utf-8'))['matchups']
+        votes = [{'first': first['id'], 'second': second['id'],
+                  'result': self.rng.choice(('first', 'second', 'draw', 'pass'))}
+                 for first, second in matchups]
+        self.timed('elo_votes', 'POST', '/%s/elo/votes' % self.game, data={
+            'votes': json.dumps(votes), 'type': params['type'],
+            'csrfmiddlewaretoken': self.client.cookies.get('csrftoken', '')})
+
+    def user(self):
+        user_id = self.rng.choice(self.sample.user_ids)
+        self.timed('user', 'GET', '/user/%s' % ('' if user_id is None else user_id))
+
+    def search(self):
+        level = self.rng.choice(self.sample.elo_levels)
+        response = self.timed('search', 'GET', '/%s/search' % self.game, {
+            'submit': 'submit', 'title': self.rng.choice(self.sample.search_terms),
+            'min_difficulty': level})
+        if response and response[0] == 302:
+            location = dict((name.lower(), value) for name, value in response[1])['location']
+            parts = urlsplit(location)
+            self.timed('search_results', 'GET', parts.path, parse_qsl(parts.query))
+
+    def json(self):
+        level = self.rng.choice(self.sample.elo_levels)
+        if self.rng.random() < 0.5:
+            self.timed('json_ratings', 'GET', '/%s/ratings' % self.game,
+                       {'difficulty': level, 'json': 'true'})
+        else:
+            self.timed('json_elo', 'GET', '/%s/elo' % self.game,
+                       {'level': level, 'list': 'true', 'json': 'true'})
+
+    def run(self, mix, deadline):
+        scenarios = list(mix)
+        weights = list(itertools.accumulate(mix.values()))
+        try:
+            if self.username:
+                self.login()
+            while time.time() < deadline:
+                getattr(self, weighted_choice(self.rng, scenarios, weights))()
+                if self.think_time:
+                    time.sleep(self.rng.expovariate(1.0 / self.think_time))
+        finally:
+            self.client.close()
+
+
+def ensure_users(count):
+    """
+    Create the loadtest-<n> accounts that don't exist yet
+    :rtype list:    Usernames
+    """
+    usernames = [USERNAME % i for i in range(count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username',
+                                                                          flat=True))
+    for username in usernames:
+        if username not in existing:
+            create_new_user({'username': username, 'password': PASSWORD, 'email': '',
+                             'dj_name': 'LOAD', 'dancer_name': 'LOAD', 'location': '',
+                             'playside': 0, 'best_techniques_iidx': [],
+                             'best_techniques_ddr': []})
+    return usernames
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile
+    :param list values: Sorted values
+    :param int p:       Percentile (0-100)
+    """
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def summarize(latencies, errors, statuses, queries, seconds, count_queries):
+    """
+    :rtype dict:    Throughput, latency percentiles in ms, errors and queries
+    """
+    latencies = sorted(latencies)
+    summary = OrderedDict([('requests', len(latencies)),
+                           ('throughput', len(latencies) / seconds),
+                           ('errors', errors),
+                           ('error_rate', errors / float(len(latencies)))])
+    for p in PERCENTILES:
+        summary['p%d_ms' % p] = percentile(latencies, p) * 1000
+    summary['mean_ms'] = sum(latencies) / len(latencies) * 1000
+    summary['max_ms'] = latencies[-1] * 1000
+    summary['queries'] = queries if count_queries else None
+    summary['queries_per_request'] = queries / float(len(latencies)) if count_queries else None
+    if statuses is not None:
+        summary['statuses'] = dict(statuses)
+    return summary
+
+
+def build_report(stats, seconds, count_queries):
+    routes = OrderedDict()
+    for route in sorted(stats.latencies):
+        routes[route] = summarize(stats.latencies[route], stats.errors[route],
+                                  stats.statuses[route], stats.queries[route], seconds,
+                                  count_queries)
+    all_latencies = [value for values in stats.latencies.values() for value in values]
+    total = summarize(all_latencies, sum(stats.errors.values()), None,
+                      sum(stats.queries.values()), seconds, count_queries) \
+        if all_latencies else None
+    return routes, total
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=root_directory).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_value(value, pattern):
+    return '%8s' % '--' if value is None else pattern % value
+
+
+def print_report(routes, total, previous=None):
+    print('%-16s %8s %8s %8s %8s %8s %8s %8s %8s' % (
+        'route', 'requests', 'req/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms',
+        'queries'))
+    previous_routes = dict(previous['routes'], total=previous['total']) if previous else {}
+    for route, summary in list(routes.items()) + [('total', total)]:
+        print('%-16s %8d %8.1f %7.1f%% %8.1f %8.1f %8.1f %8.1f %s' % (
+            route, summary['requests'], summary['throughput'], summary['error_rate'] * 100,
+            summary['p50_ms'], summary['p95_ms'], summary['p99_ms'], summary['max_ms'],
+            format_value(summary['queries_per_request'], '%8.1f')))
+        before = previous_routes.get(route)
+        if before:
+            print('%-16s %8s %+7.0f%% %+7.1f%% %+7.0f%% %+7.0f%% %+7.0f%%' % (
+                '  vs previous', '', change(before['throughput'], summary['throughput']),
+                (summary['error_rate'] - before['error_rate']) * 100,
+                change(before['p50_ms'], summary['p50_ms']),
+                change(before['p95_ms'], summary['p95_ms']),
+                change(before['p99_ms'], summary['p99_ms'])))
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0
+
+
+def parse_mix(value):
+    """
+    :param str value:   Comma separated scenario=weight pairs, e.g. 'ratings=3,chart=1'
+    :rtype OrderedDict:
+    """
+    mix = OrderedDict()
+    for pair in value.split(','):
+        name, _, weight = pair.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError('Unknown scenario %r, choose from %s' % (
+                name, ', '.join(DEFAULT_MIX)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running server, instead of in-process')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--logged-in', type=float, default=0.5,
+                        help='Fraction of virtual users that log in')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to measure')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='Seconds to run before measuring')
+    parser.add_argument('--think-time', type=float, default=0,
+                        help='Mean seconds each virtual user waits between scenarios')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Scenario weights, default %s' % ','.join(
+                            '%s=%d' % item for item in DEFAULT_MIX.items()))
+    parser.add_argument('--game', choices=sorted(GAMES), default='IIDX')
+    parser.add_argument('--no-votes', dest='votes', action='store_false',
+                        help="Don't send Elo votes, e.g. against a shared database")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--compare', help='Report written by an earlier run to compare with')
+    args = parser.parse_args()
+
+    sample = Sample(args.game)
+    logged_in = int(round(args.users * args.logged_in))
+    usernames = ensure_users(logged_in) if logged_in else []
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)
+    else:
+        from statistik.wsgi import application
+        host = next((host for host in settings.ALLOWED_HOSTS if '*' not in host),
+                    'localhost').lstrip('.')
+        make_client = lambda: WSGIClient(application, host)
+
+    start = time.time()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+    stats = Stats(measure_from)
+    threads = []
+    for i in range(args.users):
+        user = VirtualUser(make_client(), sample, stats, random.Random(args.seed * 1000 + i),
+                           usernames[i] if i < logged_in else None, args.votes,
+                           args.think_time)
+        thread = threading.Thread(target=user.run, args=(args.mix, deadline),
+                                  name='virtual-user-%d' % i)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - max(measure_from, start)
+
+    routes, total = build_report(stats, seconds, count_queries=not args.url)
+    if total is None:
+        sys.exit('No requests completed')
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print('%s, %d users (%d logged in), %.0f s, seed %d, revision %s' % (
+        args.url or 'in-process', args.users, logged_in, seconds, args.seed, git_revision()))
+    print_report(routes, total, previous)
+
+    if args.json:
+        report = OrderedDict([
+            ('run', OrderedDict([
+                ('target', args.url or 'in-process'), ('revision', git_revision()),
+                ('settings', os.environ['DJANGO_SETTINGS_MODULE']),
+                ('database', connection.vendor), ('game', args.game), ('users', args.users),
+                ('logged_in', logged_in), ('duration', seconds), ('warmup', args.warmup),
+                ('think_time', args.think_time), ('mix', args.mix), ('votes', args.votes),
+                ('seed', args.seed), ('started_at', time.strftime(
+                    '%Y-%m-%dT%H:%M:%S', time.localtime(start)))])),
+            ('total', total),
+            ('routes', routes)])
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Simulate Elo voting to compare matchup strategies.
+
+Charts get synthetic true ratings; simulated voters pick the harder chart with
+the Elo win probability of the true ratings, and ratings are updated online
+like elo_rate_charts does. For each strategy, reports how many votes it takes
+until the rank correlation between the online ratings and the true ratings
+reaches --target.
+
+    python misc/simulate_elo_matchups.py --charts 150 --trials 10
+    python misc/simulate_elo_matchups.py --charts 150 --established 0.8
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import django
+import numpy as np
+
+root_directory = str(Path(__file__).resolve().parents[1])
+sys.path.append(root_directory)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'statistik.settings')
+django.setup()
+
+from statistik.matchmaking import choose_pair, win_probability
+
+K_FACTOR = 20
+
+
+def random_pair(ratings, votes, rng):
+    """
+    The original make_elo_matchup: random pairs within 50 points
+    """
+    for _ in range(1000):
+        first, second = rng.choice(len(ratings), 2, replace=False)
+        if abs(ratings[first] - ratings[second]) <= 50:
+            break
+    return first, second
+
+
+STRATEGIES = {
+    'random': random_pair,
+    'information': lambda ratings, votes, rng: choose_pair(ratings, votes, rng)
+}
+
+
+def rank_correlation(a, b):
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return np.corrcoef(rank_a, rank_b)[0, 1]
+
+
+def simulate(strategy, truth, established, established_votes, target, max_votes,
+             check_every, rng):
+    """
+    :rtype int: Votes until the target rank correlation was reached (max_votes if never)
+    """
+    ratings = np.where(established, truth, 1000.0)
+    votes = np.where(established, float(established_votes), 0.0)
+    for vote in range(1, max_votes + 1):
+        first, second = strategy(ratings, votes, rng)
+        # voter picks the harder chart according to the true ratings
+        if rng.rand() >= win_probability(truth[first], truth[second]):
+            first, second = second, first
+        expected = win_probability(ratings[first], ratings[second])
+        ratings[first] += K_FACTOR * (1 - expected)
+        ratings[second] -= K_FACTOR * (1 - expected)
+        votes[first] += 1
+        votes[second] += 1
+        if vote % check_every == 0 and rank_correlation(ratings, truth) >= target:
+            return vote
+    return max_votes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charts', type=int, default=150)
+    parser.add_argument('--spread', type=float, default=150,
+                        help='Standard deviation of true ratings')
+    parser.add_argument('--established', type=float, default=0,
+                        help='Fraction of charts that start at their true rating')
+    parser.add_argument('--established-votes', type=int, default=40)
+    parser.add_argument('--target', type=float, default=0.9,
+                        help='Rank correlation with the true ratings to reach')
+    parser.add_argument('--max-votes', type=int, default=50000)
+    parser.add_argument('--check-every', type=int, default=10)
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = {name: [] for name in STRATEGIES}
+    for trial in range(args.trials):
+        setup = np.random.RandomState(args.seed + trial)
+        truth = 1000 + setup.randn(args.charts) * args.spread
+        established = setup.rand(args.charts) < args.established
+        for name, strategy in sorted(STRATEGIES.items()):
+            rng = np.random.RandomState(args.seed + trial)
+            results[name].append(simulate(strategy, truth, established,
+                                          args.established_votes, args.target,
+                                          args.max_votes, args.check_every, rng))
+
+    print('%d charts, %.0f%% established, votes to reach rank correlation %.2f' % (
+        args.charts, args.established * 100, args.target))
+    for name, counts in sorted(results.items()):
+        print('  %-12s mean %8.0f  median %8.0f  max %8d' % (
+            name, np.mean(counts), np.median(counts), max(counts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,59 @@
 from django.contrib import admin
-from statistik.models import UserProfile, Chart, Song, Review, EloReview
+from statistik.calibration import invalidate_calibration
+from statistik.controller import delete_review, invalidate_chart_data
+from statistik.matviews import schedule_refresh
+from statistik.models import UserProfile, Chart, Song, Review, EloReview, ReviewEvent
+from statistik.review_events import save_review
 
 admin.site.register(Chart)
 admin.site.register(Song)
-admin.site.register(Review)
 admin.site.register(EloReview)
 
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    """
+    Edits reviews through save_review and delete_review, so admin changes are
+    logged as ReviewEvents like any other
+    """
+    list_display = ['id', 'chart', 'user', 'clear_rating', 'hc_rating', 'created_at']
+
+    def get_readonly_fields(self, request, obj=None):
+        # reviews are logged by chart and user, so moving one would be a different review
+        return ['chart', 'user'] if obj is not None else []
+
+    def get_actions(self, request):
+        # bulk deletes go straight to the database
+        actions = super(ReviewAdmin, self).get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def save_model(self, request, obj, form, change):
+        data = {name: value for name, value in form.cleaned_data.items()
+                if name not in ('chart', 'user')}
+        obj.pk = save_review(obj.chart, obj.user, data).pk
+        invalidate_chart_data()
+        invalidate_calibration(obj.user_id)
+        schedule_refresh()
+
+    def delete_model(self, request, obj):
+        delete_review(obj.user_id, obj.chart_id)
+
+
+@admin.register(ReviewEvent)
+class ReviewEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'action', 'review_id', 'chart', 'user', 'created_at']
+    list_filter = ['action']
+    # the log is append-only
+    readonly_fields = [field.name for field in ReviewEvent._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     exclude = ['best_techniques']
@@ -0,0 +1,91 @@
+// Vote on Elo matchups without a page load per vote: matchups are fetched in
+// batches ahead of time and votes are sent in batches. Without this script the
+// vote links still work as plain links.
+$(document).ready(function() {
+    var table = $(".elo-choices");
+    if (!table.length || !table.data("matchups-url")) {
+        return;
+    }
+
+    var BATCH_SIZE = 10;
+    var matchupsUrl = table.data("matchups-url");
+    var votesUrl = table.data("votes-url");
+    var csrfToken = $("input[name=csrfmiddlewaretoken]").val();
+    var current = {first: table.data("first"), second: table.data("second")};
+    var upcoming = [];
+    var results = [];
+    var fetching = false;
+
+    function prefetch() {
+        if (fetching || upcoming.length >= BATCH_SIZE / 2) {
+            return;
+        }
+        fetching = true;
+        $.getJSON(matchupsUrl + "&count=" + BATCH_SIZE).done(function(data) {
+            upcoming = upcoming.concat(data.matchups);
+        }).always(function() {
+            fetching = false;
+        });
+    }
+
+    function votesData() {
+        return {
+            votes: JSON.stringify(results.splice(0, results.length)),
+            type: table.data("type"),
+            csrfmiddlewaretoken: csrfToken
+        };
+    }
+
+    function sendVotes() {
+        if (results.length) {
+            $.post(votesUrl, votesData());
+        }
+    }
+
+    // point a vote link at a new pair, so the plain link fallback votes on the
+    // matchup that is shown rather than the one the page was rendered with
+    function setPair(link, win, lose) {
+        link.attr("href", link.attr("href")
+            .replace(/([?&]win=)\d+/, "$1" + win)
+            .replace(/([?&]lose=)\d+/, "$1" + lose));
+    }
+
+    function show(matchup) {
+        current = {first: matchup[0].id, second: matchup[1].id};
+        table.find(".elo-first").text(matchup[0].title + " [" + matchup[0].type + "]");
+        table.find(".elo-second").text(matchup[1].title + " [" + matchup[1].type + "]");
+        setPair(table.find(".elo-vote[data-result=first]"), current.first, current.second);
+        setPair(table.find(".elo-vote[data-result=draw]"), current.first, current.second);
+        setPair(table.find(".elo-vote[data-result=second]"), current.second, current.first);
+    }
+
+    table.on("click", ".elo-vote", function(event) {
+        if (!upcoming.length) {
+            // nothing prefetched yet, fall back to the plain link
+            return;
+        }
+        event.preventDefault();
+        results.push({first: current.first, second: current.second,
+                      result: $(this).data("result")});
+        if (results.length >= BATCH_SIZE) {
+            sendVotes();
+        }
+        show(upcoming.shift());
+        prefetch();
+    });
+
+    // don't lose votes still waiting to be sent
+    $(window).on("pagehide", function() {
+        if (results.length && navigator.sendBeacon) {
+            var form = new FormData();
+            $.each(votesData(), function(key, value) {
+                form.append(key, value);
+            });
+            navigator.sendBeacon(votesUrl, form);
+        } else {
+            sendVotes();
+        }
+    });
+
+    prefetch();
+});
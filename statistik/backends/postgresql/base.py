@@ -0,0 +1,23 @@
+"""
+Postgres backend that logs slow queries (see statistik/querylog.py)
+"""
+from django.conf import settings
+from django.db.backends.postgresql_psycopg2.base import \
+    DatabaseWrapper as PostgresDatabaseWrapper
+
+from statistik.querylog import (SlowQueryCursorWrapper,
+                                SlowQueryCursorDebugWrapper)
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        self.slow_query_threshold_ms = float(
+            getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None) or 100)
+
+    def make_cursor(self, cursor):
+        return SlowQueryCursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        return SlowQueryCursorDebugWrapper(cursor, self)
@@ -0,0 +1,125 @@
+"""
+Offline Bradley-Terry fit over the full Elo vote history.
+
+Online Elo depends on the order votes came in and never settles. Here every
+EloReview for a (game, level, type) is treated as one game between two charts
+(draws count as half a win each) and strengths are fit with the MM algorithm,
+vectorized over votes with numpy. Each chart also plays a small number of
+virtual games against a fixed 1000-rated chart, which keeps charts that only
+ever won or lost finite and ties disconnected groups of charts together.
+
+Fitted strengths are reported on the Elo scale, with a Glicko-style rating
+deviation from the Fisher information of each chart's games.
+"""
+import math
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, When, FloatField
+
+from statistik.constants import SINGLES_LEVELS
+from statistik.models import Chart, EloReview
+
+ELO_SCALE = 400 / math.log(10)
+BASE_RATING = 1000
+PRIOR_GAMES = 1.0
+
+# Chart columns the fit is stored in, by rating type
+RATING_COLUMNS = {0: ('bt_rating', 'bt_rd'), 1: ('bt_rating_hc', 'bt_rd_hc')}
+
+
+def fit_bradley_terry(first, second, drawn, n_items, prior_games=PRIOR_GAMES,
+                      max_iterations=1000, tolerance=1e-6):
+    """
+    Fit Bradley-Terry strengths to a list of games
+    :param np.ndarray first:    Index of the winning item of each game
+    :param np.ndarray second:   Index of the losing item of each game
+    :param np.ndarray drawn:    Whether each game was a draw
+    :param int n_items:         Number of items
+    :param float prior_games:   Virtual games (half won) against a strength 1 item
+    :param int max_iterations:  Maximum number of MM iterations
+    :param float tolerance:     Stop once no log-strength changes by more than this
+    :rtype tuple:               (log-strengths, standard errors) as arrays of n_items
+    """
+    first = np.asarray(first, dtype=np.intp)
+    second = np.asarray(second, dtype=np.intp)
+    drawn = np.asarray(drawn, dtype=bool)
+
+    # merge repeated matchups so iterations scale with distinct pairs, not votes
+    low = np.minimum(first, second)
+    high = np.maximum(first, second)
+    pairs, inverse = np.unique(low * n_items + high, return_inverse=True)
+    pair_low = pairs // n_items
+    pair_high = pairs % n_items
+    pair_games = np.bincount(inverse, minlength=len(pairs)).astype(float)
+
+    points = np.where(drawn, 0.5, 1.0)
+    wins = (np.bincount(first, points, n_items) +
+            np.bincount(second, np.where(drawn, 0.5, 0.0), n_items) +
+            prior_games / 2)
+
+    strength = np.ones(n_items)
+    for _ in range(max_iterations):
+        per_game = pair_games / (strength[pair_low] + strength[pair_high])
+        denominator = (np.bincount(pair_low, per_game, n_items) +
+                       np.bincount(pair_high, per_game, n_items) +
+                       prior_games / (strength + 1))
+        updated = wins / denominator
+        change = np.max(np.abs(np.log(updated) - np.log(strength))) if n_items else 0
+        strength = updated
+        if change < tolerance:
+            break
+
+    # diagonal of the Fisher information in log-strength
+    product = strength[pair_low] * strength[pair_high]
+    per_game = pair_games * product / (strength[pair_low] + strength[pair_high]) ** 2
+    information = (np.bincount(pair_low, per_game, n_items) +
+                   np.bincount(pair_high, per_game, n_items) +
+                   prior_games * strength / (strength + 1) ** 2)
+    return np.log(strength), 1 / np.sqrt(information)
+
+
+def fit_level(game, level, rate_type):
+    """
+    Fit ratings for all singles charts of a level from their Elo votes
+    :param int game:        The game to fit (from GAME_CHOICES)
+    :param int level:       Level of the charts to fit
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :rtype tuple:           (chart ids, ratings, rating deviations) as arrays
+    """
+    charts = Chart.objects.filter(difficulty=level, type__in=list(SINGLES_LEVELS[game]),
+                                  song__game=game)
+    chart_ids = np.array(sorted(charts.values_list('id', flat=True)), dtype=np.int64)
+    votes = EloReview.objects.filter(first__in=charts, second__in=charts, type=rate_type)
+    votes = np.array(list(votes.values_list('first_id', 'second_id', 'drawn')),
+                     dtype=np.int64).reshape(-1, 3)
+
+    strength, error = fit_bradley_terry(np.searchsorted(chart_ids, votes[:, 0]),
+                                        np.searchsorted(chart_ids, votes[:, 1]),
+                                        votes[:, 2].astype(bool), len(chart_ids))
+    return chart_ids, BASE_RATING + ELO_SCALE * strength, ELO_SCALE * error
+
+
+def save_ratings(chart_ids, ratings, deviations, rate_type, batch_size=500):
+    """
+    Store fitted ratings on their charts
+    :param np.ndarray chart_ids:    IDs of the fitted charts
+    :param np.ndarray ratings:      Fitted rating of each chart
+    :param np.ndarray deviations:   Rating deviation of each chart
+    :param int rate_type:           Rating type (refer to Chart model for options)
+    :param int batch_size:          Number of charts to update per query
+    """
+    rating_column, deviation_column = RATING_COLUMNS[rate_type]
+    with transaction.atomic():
+        for start in range(0, len(chart_ids), batch_size):
+            ids = [int(x) for x in chart_ids[start:start + batch_size]]
+            batch = zip(ids, ratings[start:start + batch_size],
+                        deviations[start:start + batch_size])
+            rating_cases, deviation_cases = [], []
+            for chart_id, rating, deviation in batch:
+                rating_cases.append(When(id=chart_id, then=float(rating)))
+                deviation_cases.append(When(id=chart_id, then=float(deviation)))
+            Chart.objects.filter(id__in=ids).update(**{
+                rating_column: Case(*rating_cases, output_field=FloatField()),
+                deviation_column: Case(*deviation_cases, output_field=FloatField())
+            })
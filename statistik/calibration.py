@@ -0,0 +1,192 @@
+"""
+How a user's ratings compare to the consensus.
+
+For each game and rating type, a user's calibration is the mean signed offset
+of their ratings from the mean rating of everyone else who rated the chart
+(positive: they rate charts harder than everyone else), the mean absolute
+offset, and the mean signed offset of their reviews tagged with each
+technique. The user's own rating is left out of the chart's mean, since it
+would pull each offset towards 0 (by half, on charts with two reviews), and
+charts nobody else has rated are left out entirely.
+
+Everything comes from the user's reviews and the sums and counts of the
+ratings of the charts they reviewed (from the ratings collected in
+ChartAverage when materialized views are on, otherwise from the charts'
+reviews), reduced with numpy. Results are cached per user until they save or
+delete a review (invalidate_calibration), or for CALIBRATION_TTL seconds as
+other users' reviews move the averages.
+"""
+import numpy as np
+from django.core.cache import cache
+
+from statistik.constants import (SCORE_CATEGORY_NAMES, SCORE_CATEGORY_CHOICES,
+                                 TECHNIQUE_CHOICES, GAMES)
+from statistik.fields import technique_bit, techniques_to_mask
+from statistik.labels import get_label_table
+from statistik.matviews import matviews_enabled
+from statistik.models import ChartAverage, Review
+
+CALIBRATION_TTL = 60 * 60
+# every game's ratings are a subset of these
+RATING_NAMES = tuple(SCORE_CATEGORY_NAMES[GAMES['IIDX']])
+
+
+def _calibration_key(user_id):
+    return 'calibration:%d' % user_id
+
+
+def _other_averages(sums, counts, ratings):
+    """
+    Mean ratings of each review's chart, leaving the review itself out
+    :param np.ndarray sums:     Sums of the chart's ratings, for each review
+    :param np.ndarray counts:   Numbers of the chart's ratings, for each review
+    :param np.ndarray ratings:  The reviews' own ratings, NaN where missing
+    :rtype np.ndarray:          The means, NaN where nobody else rated the chart
+    """
+    rated = ~np.isnan(ratings)
+    others = counts - rated
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(others > 0, (sums - np.where(rated, ratings, 0)) / others, np.nan)
+
+
+def _load_reviews(user_id):
+    """
+    :rtype tuple:   Arrays of the user's reviews' games, technique masks, ratings
+                    and other reviewers' mean ratings of the same charts
+    """
+    if matviews_enabled():
+        rows = list(Review.objects.filter(user=user_id, chart__chartaverage__isnull=False)
+                    .values_list('chart_id', 'chart__song__game', 'characteristics',
+                                 *RATING_NAMES))
+        if not rows:
+            return None
+        stored = ChartAverage.objects.in_bulk([row[0] for row in rows])
+        chart_ratings = [[getattr(stored[row[0]], name + 's') for name in RATING_NAMES]
+                         for row in rows]
+        reviews = [row[1:3] for row in rows]
+        ratings = np.array([row[3:] for row in rows], dtype=float)
+        sums = np.array([[sum(values) for values in chart] for chart in chart_ratings],
+                        dtype=float)
+        counts = np.array([[len(values) for values in chart] for chart in chart_ratings])
+    else:
+        chart_reviews = Review.objects.filter(chart__in=Review.objects.filter(
+            user=user_id).values('chart'))
+        rows = list(chart_reviews.values_list('chart_id', 'user_id', 'chart__song__game',
+                                              'characteristics', *RATING_NAMES))
+        if not rows:
+            return None
+        all_ratings = np.array([row[4:] for row in rows], dtype=float)
+        charts, inverse = np.unique([row[0] for row in rows], return_inverse=True)
+        rated = ~np.isnan(all_ratings)
+        own = np.array([row[1] == user_id for row in rows])
+        # per chart, then for each of the user's reviews
+        sums = np.array([np.bincount(inverse, np.where(rated[:, column],
+                                                       all_ratings[:, column], 0), len(charts))
+                         for column in range(len(RATING_NAMES))]).T[inverse[own]]
+        counts = np.array([np.bincount(inverse, rated[:, column], len(charts))
+                           for column in range(len(RATING_NAMES))]).T[inverse[own]]
+        reviews = [row[2:4] for row, is_own in zip(rows, own) if is_own]
+        ratings = all_ratings[own]
+    games = np.array([game for game, _ in reviews])
+    masks = np.array([techniques_to_mask(characteristics or [])
+                      for _, characteristics in reviews], dtype=np.int64)
+    return games, masks, ratings, _other_averages(sums, counts, ratings)
+
+
+def compute_calibration(user_id):
+    """
+    Compare a user's ratings to other reviewers' mean ratings of the same charts
+    :param int user_id:     The user
+    :rtype dict:            Game -> {'reviews': number compared, 'ratings': [{'rating',
+                            'count', 'offset', 'mae'}], 'techniques': [{'technique',
+                            'count', 'offsets'}]}, for games the user has compared reviews in
+    """
+    loaded = _load_reviews(user_id)
+    if loaded is None:
+        return {}
+    games, masks, ratings, averages = loaded
+    offsets = ratings - averages
+    compared = ~np.isnan(offsets)
+    offsets = np.where(compared, offsets, 0)
+
+    calibration = {}
+    for game in sorted(set(games.tolist())):
+        in_game = games == game
+        columns = [RATING_NAMES.index(name) for name in SCORE_CATEGORY_NAMES[game]]
+        game_offsets = offsets[in_game][:, columns]
+        game_compared = compared[in_game][:, columns]
+        if not game_compared.any():
+            continue
+        counts = game_compared.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_offsets = game_offsets.sum(axis=0) / counts
+            maes = np.abs(game_offsets).sum(axis=0) / counts
+
+        techniques = [value for value, _ in TECHNIQUE_CHOICES[game]]
+        bits = np.array([technique_bit(value) for value in techniques], dtype=np.int64)
+        # reviews x techniques
+        tagged = ((masks[in_game][:, np.newaxis] >> bits) & 1).astype(float)
+        technique_counts = tagged.T.dot(game_compared)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            technique_offsets = tagged.T.dot(game_offsets) / technique_counts
+
+        calibration[game] = {
+            'reviews': int(game_compared.any(axis=1).sum()),
+            'ratings': [{'rating': name, 'count': int(count),
+                         'offset': _round(offset), 'mae': _round(mae)}
+                        for name, count, offset, mae in zip(
+                            SCORE_CATEGORY_NAMES[game], counts, mean_offsets, maes)],
+            'techniques': [{'technique': technique, 'count': int(tagged_counts.max()),
+                            'offsets': [_round(offset) for offset in tagged_offsets]}
+                           for technique, tagged_counts, tagged_offsets in zip(
+                               techniques, technique_counts, technique_offsets)
+                           if tagged_counts.max()]}
+    return calibration
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def get_user_calibration(user_id):
+    """
+    compute_calibration, cached until the user's next review
+    :param int user_id:     The user
+    :rtype dict:
+    """
+    key = _calibration_key(user_id)
+    calibration = cache.get(key)
+    if calibration is None:
+        calibration = compute_calibration(user_id)
+        cache.set(key, calibration, CALIBRATION_TTL)
+    return calibration
+
+
+def invalidate_calibration(user_id):
+    """
+    Drop a user's cached calibration after they changed a review
+    :param int user_id:     The user
+    """
+    cache.delete(_calibration_key(user_id))
+
+
+def format_calibration(calibration):
+    """
+    Label a calibration for templates and JSON
+    :param dict calibration:    Result of get_user_calibration
+    :rtype dict:                Game name -> calibration with 'label' added to each
+                                rating and technique
+    """
+    game_names = {value: name for name, value in GAMES.items()}
+    formatted = {}
+    for game, data in calibration.items():
+        rating_labels = dict(zip(SCORE_CATEGORY_NAMES[game],
+                                 (label for _, label in SCORE_CATEGORY_CHOICES[game])))
+        technique_labels = get_label_table(game).techniques
+        formatted[game_names[game]] = {
+            'reviews': data['reviews'],
+            'ratings': [dict(rating, label=rating_labels[rating['rating']])
+                        for rating in data['ratings']],
+            'techniques': [dict(technique, label=technique_labels[technique['technique']])
+                           for technique in data['techniques']]}
+    return formatted
@@ -5,19 +5,41 @@ import random
 import statistics
 
 import elo
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, F, IntegerField, ExpressionWrapper
 from django.utils.translation import ugettext as _
 
-from statistik.constants import (SCORE_CATEGORY_NAMES, TECHNIQUE_CHOICES,
+from statistik.calibration import invalidate_calibration
+from statistik.constants import (SCORE_CATEGORY_NAMES,
                                  RECOMMENDED_OPTIONS_CHOICES,
                                  FULL_VERSION_NAMES, SCORE_CATEGORY_CHOICES,
                                  localize_choices, VERSION_CHOICES, IIDX, DDR, GAMES, GAME_CHOICES, SINGLES_LEVELS,
                                  RATING_AVERAGE_THRESHOLD)
+from statistik.elo_history import ratings_as_of, movers_since
+from statistik.elo_queue import (enqueue_vote, apply_votes, record_votes,
+                                 start_applier)
+from statistik.fields import technique_bit
 from statistik.forms import RegisterForm, DDRReviewForm, IIDXReviewForm
-from statistik.models import Chart, Review, UserProfile, EloReview
+from statistik.labels import get_label_table
+from statistik.leaderboard import get_leaderboard, chart_url
+from statistik.loaders import get_identity_map
+from statistik.matchmaking import make_information_matchup, record_vote
+from statistik.matviews import matviews_enabled, schedule_refresh
+from statistik.models import (Chart, Review, UserProfile, EloReview, PendingEloVote,
+                              ChartAverage, ChartConsensus)
+from statistik.review_events import save_review, remove_review
+from statistik.rows import CHART_ROW_FIELDS, TYPE_DISPLAY, build_chart_rows
+from statistik.seen_pairs import get_seen_pairs, mark_seen
+from statistik.serializers import (serialize_reviews, CHART_PAGE_FIELDS, USER_PAGE_FIELDS,
+                                   JSON_FIELDS)
+
+# seconds to cache the chart lists of each level for
+CHART_DATA_TTL = 120
+CHART_DATA_VERSION_KEY = 'chart_data_version'
 
 
 def organize_reviews(matched_reviews, user_id):
@@ -44,7 +66,8 @@ def organize_reviews(matched_reviews, user_id):
     return review_dict, user_reviewed
 
 
-def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False):
+def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False,
+                    review_fields=JSON_FIELDS):
     """
     Get average ratings for all charts.
     :param list chart_ids:  List of chart ids to retrieve ratings for
@@ -52,11 +75,28 @@ def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False):
     :param int user_id:     User id to identify which charts that user has
                             rated
 
+    :param bool include_reviews:    Include the reviews for each chart
+    :param tuple review_fields:     Review fields to include (see serializers.py)
+
     :rtype dict:            Dict mapping chart ids to a dict of the average
                             ratings for that chart as well as a has_reviewed
                             boolean.
     """
-    matched_reviews = Review.objects.filter(chart__in=chart_ids).prefetch_related('user__userprofile')
+    matched_reviews = Review.objects.filter(chart__in=chart_ids)
+    if include_reviews:
+        serialized_reviews = {}
+        for review in serialize_reviews(matched_reviews, ('chart_id',) + tuple(review_fields)):
+            review.fields = review_fields
+            serialized_reviews.setdefault(review.chart_id, []).append(review)
+    if matviews_enabled():
+        ret = _get_materialized_avg_ratings(chart_ids, game, user_id)
+        if include_reviews:
+            for chart, ratings in ret.items():
+                if ratings:
+                    ratings['reviews'] = serialized_reviews.get(chart, [])
+        return ret
+    # only the ratings are needed for averaging
+    matched_reviews = matched_reviews.only('chart', 'user', *SCORE_CATEGORY_NAMES[game])
     organized_reviews, reviewed_charts = organize_reviews(matched_reviews,
                                                           user_id=user_id)
     ret = {}
@@ -68,19 +108,9 @@ def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False):
         if specific_reviews:
             # for each rating type, average the scores in matched reviews
             for rating_type in SCORE_CATEGORY_NAMES[game]:
-                # Attempt to ignore outlier reviews by calculating the average, then removing reviews
-                # with a score beyond some threshold away from that average
-                rating_reviews = [getattr(review, rating_type)
-                                  for review in specific_reviews
-                                  if getattr(review, rating_type) is not None] or [0]
-                # If there are fewer than three reviews, don't bother eliminating outliers
-                if len(rating_reviews) < 3:
-                    filtered_reviews = rating_reviews
-                else:
-                    initial_avg_rating = round(statistics.mean(rating_reviews), 1)
-                    filtered_reviews = [review for review in rating_reviews
-                                        if abs(review - initial_avg_rating) < RATING_AVERAGE_THRESHOLD]
-                avg_rating = round(statistics.mean(filtered_reviews or [0]), 1)
+                avg_rating = _trimmed_average([getattr(review, rating_type)
+                                               for review in specific_reviews
+                                               if getattr(review, rating_type) is not None])
 
                 # if average is '0.0', normalize that to 0
                 if avg_rating != 0:
@@ -93,28 +123,7 @@ def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False):
 
             # include reviews if requested
             if include_reviews:
-                ret[chart]['reviews'] = [
-                    {
-                        'user': review.user.get_username(),
-                        'user_id': review.user.id,
-                        'playside': review.user.userprofile.get_play_side_display(),
-
-                        'text': review.text,
-                        'clear_rating': review.clear_rating,
-                        'hc_rating': review.hc_rating,
-                        'exhc_rating': review.exhc_rating,
-                        'score_rating': review.score_rating,
-
-                        'characteristics': [
-                            (_(TECHNIQUE_CHOICES[game][x][1]), '#187638')
-                            if x in review.user.userprofile.best_techniques
-                            else (_(TECHNIQUE_CHOICES[game][x][1]), '#000')
-                            for x in review.characteristics],
-
-                        'recommended_options': ', '.join([
-                            _(RECOMMENDED_OPTIONS_CHOICES[game][x][1])
-                            for x in review.recommended_options])
-                    } for review in specific_reviews]
+                ret[chart]['reviews'] = serialized_reviews.get(chart, [])
 
         # winding up here means no reviews were found for one of the charts
         # which means the template will just use '--' for all the ratings
@@ -124,13 +133,82 @@ def get_avg_ratings(chart_ids, game=IIDX, user_id=None, include_reviews=False):
     return ret
 
 
+def _trimmed_average(ratings):
+    """
+    Average one type of rating of a chart, ignoring outliers
+    :param list ratings:    The chart's ratings of that type
+    :rtype float:           The average rounded to one decimal, or 0 without ratings
+    """
+    ratings = ratings or [0]
+    # Attempt to ignore outlier reviews by calculating the average, then removing reviews
+    # with a score beyond some threshold away from that average
+    # If there are fewer than three reviews, don't bother eliminating outliers
+    if len(ratings) < 3:
+        filtered_reviews = ratings
+    else:
+        initial_avg_rating = round(statistics.mean(ratings), 1)
+        filtered_reviews = [review for review in ratings
+                            if abs(review - initial_avg_rating) < RATING_AVERAGE_THRESHOLD]
+    return round(statistics.mean(filtered_reviews or [0]), 1)
+
+
+def _get_materialized_avg_ratings(chart_ids, game, user_id=None):
+    """
+    get_avg_ratings without the reviews, averaging the ratings stored in
+    statistik_chart_avg_mv here so they round exactly like get_avg_ratings
+    """
+    return _get_stored_ratings(
+        ChartAverage, chart_ids, game, user_id,
+        get_rating=lambda average, name: _trimmed_average(getattr(average, name + 's')))
+
+
+def get_consensus_ratings(chart_ids, game=IIDX, user_id=None):
+    """
+    get_avg_ratings without the reviews, but with the reviewer bias-corrected
+    ratings last fit by consensus.py instead of trimmed means
+    :param list chart_ids:  List of chart ids to retrieve ratings for
+    :param int user_id:     User id to identify which charts that user has rated
+    :rtype dict:            Same as get_avg_ratings
+    """
+    return _get_stored_ratings(ChartConsensus, chart_ids, game, user_id)
+
+
+def _get_stored_ratings(model, chart_ids, game, user_id=None, get_rating=getattr):
+    """
+    get_avg_ratings from a model with a row of ratings per chart, read from
+    each row with get_rating(row, rating name)
+    """
+    averages = {average.chart_id: average
+                for average in model.objects.filter(chart__in=chart_ids)}
+    reviewed_charts = set()
+    if user_id:
+        reviewed_charts = set(Review.objects.filter(
+            chart__in=chart_ids, user=user_id).values_list('chart_id', flat=True))
+    ret = {}
+    for chart in chart_ids:
+        ret[chart] = {}
+        average = averages.get(chart)
+        if average:
+            for rating_type in SCORE_CATEGORY_NAMES[game]:
+                # consensus ratings are missing for rating types nobody rated
+                avg_rating = get_rating(average, rating_type) or 0
+                # if average is '0.0', normalize that to 0
+                if avg_rating != 0:
+                    ret[chart][rating_type] = "%.1f" % avg_rating
+                else:
+                    ret[chart][rating_type] = 0.0
+            ret[chart]['has_reviewed'] = (chart in reviewed_charts)
+    return ret
+
+
 def get_charts_by_ids(ids):
     """
-    Chart lookup by id
+    Chart lookup by id, served from the request's identity map when possible
     :param list ids: List of int ids
-    :rtype Queryset: Queryset containing matched charts
+    :rtype list:     List of matched charts (with their songs loaded)
     """
-    return Chart.objects.filter(pk__in=ids)
+    return [chart for chart in get_identity_map().charts.load_many(ids)
+            if chart is not None]
 
 
 def get_charts_by_query(game=IIDX, versions=None, difficulty=None, play_style=None,
@@ -191,14 +269,20 @@ def get_charts_by_query(game=IIDX, versions=None, difficulty=None, play_style=No
         ret = ret.filter(artist_query)
     if 'techs' in params:
         for tech in params['techs']:
-            tech_query = Q(review__characteristics__icontains=tech)
-            ret = ret.filter(tech_query)
+            # charts with a review tagging this technique, tested with a bitwise AND
+            bit = 1 << technique_bit(tech)
+            tagged = Review.objects.annotate(
+                has_tech=ExpressionWrapper(F('characteristics').bitand(bit),
+                                           output_field=IntegerField())
+            ).filter(has_tech=bit).values('chart_id')
+            ret = ret.filter(id__in=tagged)
 
     return ret
 
 
 def get_chart_data(game=IIDX, versions=None, difficulty=None, play_style=None, user=None,
-                   params=None, include_reviews=False):
+                   params=None, include_reviews=False, review_fields=JSON_FIELDS,
+                   consensus=False):
     """
     Retrieve chart data acc to specified params and format chart data for
     usage in templates.
@@ -207,76 +291,81 @@ def get_chart_data(game=IIDX, versions=None, difficulty=None, play_style=None, u
     :param str play_style:  Play style to filter by (from PLAYSIDE_CHOICES)
     :param int user:        Mark charts that have been rated by this user
     :param params           Extra search parameters to filter by
-    :rtype list:            List of dicts containing chart data
+    :param review_fields:   Review fields to include if including reviews
+    :param bool consensus:  Show bias-corrected consensus ratings instead of
+                            averages (see consensus.py), without reviews
+    :rtype list:            List of ChartRow objects containing chart data
     """
 
+    if difficulty and not (versions or params or include_reviews):
+        # plain level pages are cached, see get_level_chart_data
+        return get_level_chart_data(game, int(difficulty), play_style, user, consensus)
+
     matched_charts = get_charts_by_query(game, versions, difficulty, play_style, params)
-    matched_chart_ids = [chart.id for chart in matched_charts]
+    # fetch plain tuples (song joined in) rather than building Chart and Song models
+    rows = list(matched_charts.prefetch_related(None).values_list(*CHART_ROW_FIELDS))
 
     # get avg ratings for the charts in the returned queryset
-    avg_ratings = get_avg_ratings(matched_chart_ids, game, user, include_reviews)
+    if consensus:
+        avg_ratings = get_consensus_ratings([row[0] for row in rows], game, user)
+        include_reviews = False
+    else:
+        avg_ratings = get_avg_ratings([row[0] for row in rows], game, user, include_reviews,
+                                      review_fields)
 
-    chart_data = []
-    for chart in matched_charts:
-        # use clickagain rating if we don't have a NC rating for this chart
-        clickagain_nc = False
-        clickagain_hc = False
-        if not avg_ratings[chart.id].get('clear_rating'):
-            if chart.clickagain_nc:
-                avg_ratings[chart.id]['clear_rating'] = chart.clickagain_nc
-                clickagain_nc = True
-            if chart.clickagain_nc:
-                avg_ratings[chart.id]['hc_rating'] = chart.clickagain_hc
-                clickagain_hc = True
-
-        data = {
-            'id': chart.id,
-            'title': chart.song.title,
-            'alt_title': chart.song.alt_title or chart.song.title,
-            'note_count': chart.note_count or '--',
-            'bpm_min': chart.song.bpm_min or '--',
-            'bpm_max': chart.song.bpm_max or '--',
-            'difficulty': chart.difficulty,
-
-            'avg_clear_rating': str(avg_ratings[chart.id].get(
-                'clear_rating') or ""),
-            'avg_hc_rating': str(avg_ratings[chart.id].get(
-                'hc_rating') or ""),
-            'avg_exhc_rating': str(avg_ratings[chart.id].get(
-                'exhc_rating') or ""),
-            'avg_score_rating': str(avg_ratings[chart.id].get(
-                'score_rating') or ""),
-
-            'game_version': chart.song.game_version,
-            'game_version_display': chart.song.get_game_version_display(),
-            'type_display': chart.get_type_display(),
-            'clickagain_nc': clickagain_nc,
-            'clickagain_hc': clickagain_hc
-        }
+    return build_chart_rows(rows, avg_ratings, include_reviews, params)
 
-        if include_reviews:
-            data['reviews'] = avg_ratings[chart.id].get('reviews')
-        else:
-            data['has_reviewed'] = avg_ratings[chart.id].get('has_reviewed')
-
-        # need to filter by avg ratings here since it isn't stored in the database
-        to_add = True
-        if params:
-            for (min_rating, max_rating, rating) in [
-                ('min_nc', 'max_nc', 'avg_clear_rating'),
-                ('min_hc', 'max_hc', 'avg_hc_rating'),
-                ('min_exhc', 'max_exhc', 'avg_exhc_rating'),
-                ['min_score', 'max_score', 'avg_score_rating']
-            ]:
-                if min_rating in params and params[min_rating]:
-                    if data[rating] == '' or float(params[min_rating]) > float(data[rating]):
-                        to_add = False
-                if max_rating in params and params[max_rating]:
-                    if data[rating] == '' or float(params[max_rating]) < float(data[rating]):
-                        to_add = False
-        if to_add:
-            chart_data.append(data)
-    return chart_data
+
+def _chart_data_key(game, level, play_style, consensus=False):
+    version = cache.get(CHART_DATA_VERSION_KEY) or 0
+    return 'chart_data:%d:%d:%s:%s:%d' % (game, level, play_style or 'SP',
+                                          'consensus' if consensus else 'average', version)
+
+
+def get_level_chart_data(game, level, play_style=None, user=None, consensus=False):
+    """
+    get_chart_data for all charts of a level. With a cache shared by all
+    processes (SHARED_CACHE), the rows are cached for CHART_DATA_TTL seconds
+    without the user's reviews, which are marked on each request. A per-process
+    cache would keep serving old averages after other processes' writes.
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Difficulty of the charts
+    :param str play_style:  'SP' or 'DP'
+    :param int user:        Mark charts that have been rated by this user
+    :param bool consensus:  Show bias-corrected consensus ratings instead of averages
+    :rtype list:            List of ChartRow
+    """
+    shared = getattr(settings, 'SHARED_CACHE', False)
+    key = _chart_data_key(game, level, play_style, consensus) if shared else None
+    rows = cache.get(key) if shared else None
+    if rows is None:
+        matched_charts = get_charts_by_query(game, difficulty=level, play_style=play_style)
+        chart_tuples = list(matched_charts.prefetch_related(None).values_list(*CHART_ROW_FIELDS))
+        chart_ids = [row[0] for row in chart_tuples]
+        rows = build_chart_rows(chart_tuples, get_consensus_ratings(chart_ids, game)
+                                if consensus else get_avg_ratings(chart_ids, game))
+        if shared:
+            cache.set(key, rows, CHART_DATA_TTL)
+
+    if user:
+        reviewed = set(Review.objects.filter(user=user, chart__in=[row.id for row in rows])
+                       .values_list('chart_id', flat=True))
+        for row in rows:
+            if row.id in reviewed:
+                row.has_reviewed = True
+                row.difficulty_display = str(row.difficulty) + "★"
+    return rows
+
+
+def invalidate_chart_data():
+    """
+    Drop cached chart lists after their average ratings changed. Only affects
+    other processes if they share the cache (see CACHES in settings.py).
+    """
+    try:
+        cache.incr(CHART_DATA_VERSION_KEY)
+    except ValueError:
+        cache.set(CHART_DATA_VERSION_KEY, 1, None)
 
 
 def generate_review_form(user, chart_id, form_data=None):
@@ -287,11 +376,14 @@ def generate_review_form(user, chart_id, form_data=None):
     :param dict form_data:  Form data to process as a POST request
     :rtype tuple:           (ReviewForm, bool indicating if user reviewed chart)
     """
-    chart = Chart.objects.get(pk=chart_id)
+    identity_map = get_identity_map()
+    chart = identity_map.charts.load(chart_id)
+    if chart is None:
+        raise Chart.DoesNotExist()
     game = chart.song.game
     # if user is authenticated and can review this chart, display review form
     if user.is_authenticated():
-        user_profile = UserProfile.objects.filter(user=user).first()
+        user_profile = identity_map.profiles.load(user.id)
         if user_profile:
             has_reviewed = False
 
@@ -302,9 +394,10 @@ def generate_review_form(user, chart_id, form_data=None):
                 else:
                     form = DDRReviewForm(form_data)
                 if form.is_valid(difficulty=chart.difficulty):
-                    Review.objects.update_or_create(chart=chart,
-                                                    user=user,
-                                                    defaults=form.cleaned_data)
+                    save_review(chart, user, form.cleaned_data)
+                    invalidate_chart_data()
+                    invalidate_calibration(user.id)
+                    schedule_refresh()
                     has_reviewed = True
             # handle regular page requests
             else:
@@ -359,7 +452,7 @@ def generate_review_form(user, chart_id, form_data=None):
 # TODO fix this garbage up
 def generate_user_form(user, form_data=None):
     form = RegisterForm(form_data) if form_data else RegisterForm()
-    up = user.userprofile
+    up = get_identity_map().profiles.load(user.id)
 
     form.fields.pop('username')
     for field in form.fields.values():
@@ -406,87 +499,21 @@ def get_reviews_for_chart(chart_id):
     """
     Get reviews for a chart and format for usage in template
     :param int chart_id:    ID of chart to get reviews for
-    :rtype list:            List of dicts with review info
-    """
-    chart_reviews = Review.objects.filter(chart=chart_id).prefetch_related(
-        'user__userprofile')
-
-    game = Chart.objects.get(id=chart_id).song.game
-
-    # collect info to display for each review
-    review_data = []
-    for review in chart_reviews:
-        review_data.append({
-            'user': review.user.get_username(),
-            'user_id': review.user.id,
-            'playside': review.user.userprofile.get_play_side_display(),
-
-            'text': review.text,
-            'clear_rating': str(review.clear_rating or ""),
-            'hc_rating': str(review.hc_rating or ""),
-            'exhc_rating': str(review.exhc_rating or ""),
-            'score_rating': str(review.score_rating or ""),
-
-            'characteristics': [
-                (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#187638')
-                if x in review.user.userprofile.best_techniques
-                else (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#000')
-                for x in review.characteristics],
-
-            'recommended_options': ', '.join([
-                 _(RECOMMENDED_OPTIONS_CHOICES[game][x][1])
-                for x in review.recommended_options])
-        })
-        if review.difficulty_spike:
-            review_data[-1]['characteristics'].append(
-                (_('Difficult ' + review.get_difficulty_spike_display()),
-                 '#000'))
-
-    return review_data
+    :rtype list:            List of ReviewRow objects with review info
+    """
+    return serialize_reviews(Review.objects.filter(chart=chart_id), CHART_PAGE_FIELDS)
 
 
 def get_reviews_for_user(user_id):
     """
     Get reviews written by a user and format for use in template
     :param int user_id:     User to query reviews by
-    :rtype dict:            A dict mapping each game to a list of dicts containing user's reviews for that game
+    :rtype dict:            A dict mapping each game to a list of ReviewRow objects
+                            containing user's reviews for that game
     """
-    # get all reviews created by this user
-    matched_reviews = Review.objects.filter(user=user_id).prefetch_related(
-        'chart__song')
-    techniques = UserProfile.objects.get(user=user_id).best_techniques
-    # assemble display info for these reviews
     review_data = {game: list() for game in GAMES.values()}
-    for review in matched_reviews:
-        game = review.chart.song.game
-        review_data[game].append({
-            'title': review.chart.song.title,
-            'text': review.text,
-            'chart_id': review.chart.id,
-            'type_display': review.chart.get_type_display(),
-            'difficulty': review.chart.difficulty,
-
-            'clear_rating': str(review.clear_rating or ""),
-            'hc_rating': str(review.hc_rating or ""),
-            'exhc_rating': str(review.exhc_rating or ""),
-            'score_rating': str(review.score_rating or ""),
-
-            'characteristics': [
-                (TECHNIQUE_CHOICES[game][x % 100][1], '#187638')
-                if x in techniques
-                else (_(TECHNIQUE_CHOICES[game][x % 100][1]), '#000')
-                for x in review.characteristics],
-
-            'recommended_options': ', '.join([
-                 _(RECOMMENDED_OPTIONS_CHOICES[game][x][1])
-                 for x in review.recommended_options])
-        })
-
-        if review.difficulty_spike:
-            review_data[game][-1]['characteristics'].append(
-                (_('Difficult ' + review.get_difficulty_spike_display()),
-                 '#000'))
-
+    for review in serialize_reviews(Review.objects.filter(user=user_id), USER_PAGE_FIELDS):
+        review_data[review.game].append(review)
     return review_data
 
 
@@ -500,13 +527,14 @@ def get_user_list():
         'userprofile').order_by('username')
 
     # assemble display info for users
+    labels = {game: get_label_table(GAMES[game]) for game in GAMES}
     user_data = []
     for user in users:
         try:
             techs = {}
             for game in GAMES:
-                game_techs = [_(x[1]) for x in TECHNIQUE_CHOICES[GAMES[game]]
-                              if x[0] in user.userprofile.best_techniques]
+                game_techs = [label for value, label in labels[game].techniques.items()
+                              if value in user.userprofile.best_techniques]
                 if len(game_techs) > 0:
                     techs[game] = ', '.join(game_techs)
 
@@ -559,6 +587,11 @@ def elo_rate_charts(chart1_id, chart2_id, user, draw=False, rate_type=0):
     :param bool draw:       True if match was a draw
     :param int rate_type:   Rating type (refer to Chart model for options)
     """
+    if getattr(settings, 'ELO_WRITE_BEHIND', False):
+        enqueue_vote(chart1_id, chart2_id, user, draw, rate_type)
+        mark_seen(user, rate_type, [(chart1_id, chart2_id)])
+        return
+
     rate_type_display = 'elo_rating_hc' if rate_type else 'elo_rating'
     with transaction.atomic():
         win_chart = Chart.objects.get(pk=chart1_id)
@@ -585,20 +618,52 @@ def elo_rate_charts(chart1_id, chart2_id, user, draw=False, rate_type=0):
                                  type=rate_type,
                                  created_by=user)
 
+    # don't serve the old ratings for the rest of the request
+    identity_map = get_identity_map()
+    identity_map.charts.clear(chart1_id)
+    identity_map.charts.clear(chart2_id)
+    record_vote(rate_type, chart1_id, win_rating, chart2_id, lose_rating)
+    mark_seen(user, rate_type, [(chart1_id, chart2_id)])
+    schedule_refresh()
 
-def get_elo_rankings(game, level, rate_type):
+
+def get_elo_rankings(game, level, rate_type, model='elo', as_of=None):
     """
     Get songs ranked by Elo ranking, formatted for template usage
     :param int game:        The game to get songs from (0-1)
     :param int level:       Level of songs to sort by (1-12) for IIDX, (1-19) for DDR
     :param str rate_type:   Rating type (refer to Chart model for options)
+    :param str model:       'elo' for online Elo ratings, 'bt' for the Bradley-Terry fit
+    :param datetime as_of:  Show Elo rankings as they were at this time
     :rtype list:            List of dicts containing chart/ranking data
     """
+    if model == 'elo' and as_of is None:
+        # ranked in the database and cached, see leaderboard.py
+        return [{
+            'index': rank,
+            'id': chart_id,
+            'title': title,
+            'type': TYPE_DISPLAY.get(chart_type),
+            'rating': round(rating, 3),
+            'link': chart_url(chart_id)
+        } for rank, chart_id, title, chart_type, rating
+            in get_leaderboard(game, level, rate_type).rows]
+
+    deviation_column = None
+    if model == 'bt':
+        rate_type = rate_type.replace('elo_rating', 'bt_rating')
+        deviation_column = rate_type.replace('bt_rating', 'bt_rd')
     # singles difficulties only
     singles = [str(i) for i in SINGLES_LEVELS[game]]
     matched_charts = Chart.objects.filter(difficulty=int(level), type__in=singles,
                                           song__game=game).prefetch_related('song').order_by(
                                           '-' + rate_type)
+    ratings = None
+    if as_of is not None and model == 'elo':
+        # rebuilt from the nearest snapshot, see elo_history.py
+        ratings = ratings_as_of(game, level, 1 if rate_type == 'elo_rating_hc' else 0, as_of)
+        matched_charts = sorted(matched_charts, key=lambda chart: ratings[chart.id],
+                                reverse=True)
 
     # assemble displayed elo info for matched charts
     # TODO add link to 'normal' chart reviews
@@ -609,29 +674,76 @@ def get_elo_rankings(game, level, rate_type):
             'id': chart.id,
             'title': chart.song.title,
             'type': chart.get_type_display(),
-            'rating': round(getattr(chart, rate_type), 3),
-            'link': reverse('chart', kwargs={'chart_id': chart.id})
+            'rating': round(ratings[chart.id] if ratings else getattr(chart, rate_type), 3),
+            'link': chart_url(chart.id)
         })
+        if deviation_column and getattr(chart, deviation_column) is not None:
+            chart_data[-1]['deviation'] = round(getattr(chart, deviation_column), 1)
     return chart_data
 
 
-def make_elo_matchup(game, level):
+def get_elo_movers(game, level, rate_type, since):
     """
-    Match two charts for an Elo ranking and format the data for template usage
-    :param int game:    The game to match songs from (0-1)
-    :param int level:   Level of songs to match (1-12) for IIDX, (1-19) for DDR
-    :rtype list:        List of dicts of chart info
+    Get the charts whose Elo ranking changed most since a point in time,
+    formatted for template usage
+    :param int game:        The game to get songs from (0-1)
+    :param int level:       Level of songs to compare (1-12) for IIDX, (1-19) for DDR
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param datetime since:  Time to compare current rankings against
+    :rtype list:            List of dicts containing chart/ranking change data
     """
-    elo_diff = 9001
-    chart1 = chart2 = None
+    movers = movers_since(game, level, rate_type, since)
+    charts = Chart.objects.filter(id__in=[mover['id'] for mover in movers]).values_list(
+        'id', 'song__title', 'type')
+    display = {chart_id: (title, chart_type) for chart_id, title, chart_type in charts}
+    for mover in movers:
+        mover['title'], chart_type = display[mover['id']]
+        mover['type'] = TYPE_DISPLAY.get(chart_type)
+        mover['link'] = chart_url(mover['id'])
+    return movers
+
+
+def make_elo_matchup(game, level, rate_type=0, user=None, seen=None):
+    """
+    Match two charts for an Elo ranking and format the data for template usage
+    :param int game:        The game to match songs from (0-1)
+    :param int level:       Level of songs to match (1-12) for IIDX, (1-19) for DDR
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param User user:       Avoid pairs this user has already voted on
+    :param seen:            The user's seen pairs, if already loaded
+    :rtype list:            List of dicts of chart info
+    """
+    if seen is None and user is not None and user.is_authenticated():
+        seen = get_seen_pairs(user, rate_type)
+    if getattr(settings, 'ELO_MATCHUP_STRATEGY', 'random') == 'information':
+        return [{
+            'title': title,
+            'type': TYPE_DISPLAY.get(chart_type),
+            'id': chart_id
+        } for chart_id, title, chart_type in make_information_matchup(game, level, rate_type,
+                                                                      seen)]
+
     # singles difficulties only
     sng = {IIDX: [str(i) for i in range(0, 3)], DDR: [str(i) for i in range(100, 105)]}
     charts = list(Chart.objects.filter(difficulty=int(level), type__in=sng[game], song__game=game))
+    return _make_random_elo_matchup(charts, seen)
 
-    # only return closely-matched charts for better rankings
-    while elo_diff > 50:
+
+def _make_random_elo_matchup(charts, seen=None):
+    """
+    Pick two random charts within 50 points of each other
+    :param list charts: Chart objects to choose from
+    :param seen:        Chart ID pairs to avoid if possible, or None
+    :rtype list:        List of dicts of chart info
+    """
+    chart1 = chart2 = None
+    # only return closely-matched charts for better rankings, preferring ones
+    # the user hasn't voted on
+    for _ in range(1000):
         [chart1, chart2] = random.sample(charts, 2)
-        elo_diff = abs(chart1.elo_rating - chart2.elo_rating)
+        if abs(chart1.elo_rating - chart2.elo_rating) <= 50 and \
+                (seen is None or (chart1.id, chart2.id) not in seen):
+            break
 
     # assemble display info for these two charts
     return [{
@@ -641,6 +753,83 @@ def make_elo_matchup(game, level):
     } for chart in [chart1, chart2]]
 
 
+def make_elo_matchups(game, level, rate_type=0, count=10, user=None):
+    """
+    Make several distinct Elo matchups at once, for batched voting
+    :param int game:        The game to match songs from (0-1)
+    :param int level:       Level of songs to match (1-12) for IIDX, (1-19) for DDR
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param int count:       Number of matchups to make
+    :param User user:       Avoid pairs this user has already voted on
+    :rtype list:            List of matchups, each a list of dicts of chart info
+    """
+    seen = None
+    if user is not None and user.is_authenticated():
+        seen = get_seen_pairs(user, rate_type)
+    if getattr(settings, 'ELO_MATCHUP_STRATEGY', 'random') == 'information':
+        make_matchup = lambda: make_elo_matchup(game, level, rate_type, seen=seen)
+    else:
+        sng = [str(i) for i in SINGLES_LEVELS[game]]
+        charts = list(Chart.objects.filter(difficulty=int(level), type__in=sng,
+                                           song__game=game).select_related('song'))
+        make_matchup = lambda: _make_random_elo_matchup(charts, seen)
+
+    matchups = []
+    handed_out = set()
+    # small levels may not have enough distinct pairs, so don't try forever
+    for _ in range(count * 3):
+        matchup = make_matchup()
+        pair = frozenset(chart['id'] for chart in matchup)
+        if pair not in handed_out:
+            handed_out.add(pair)
+            matchups.append(matchup)
+            if len(matchups) == count:
+                break
+    return matchups
+
+
+def elo_rate_batch(results, user, rate_type=0):
+    """
+    Add Elo ratings for a batch of matchups in one transaction
+    :param list results:    Dicts with the 'first' and 'second' chart IDs of a
+                            matchup and its 'result': 'first' or 'second' for
+                            the harder chart, 'draw' or 'pass'
+    :param User user:       User who created the reviews
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :rtype int:             Number of votes recorded
+    """
+    votes = []
+    for result in results:
+        outcome = result.get('result')
+        if outcome == 'pass':
+            continue
+        if outcome not in ('first', 'second', 'draw'):
+            raise ValueError('Unknown result %r' % outcome)
+        first, second = int(result['first']), int(result['second'])
+        if first == second:
+            raise ValueError('Chart %d matched against itself' % first)
+        if outcome == 'second':
+            first, second = second, first
+        votes.append(PendingEloVote(first_id=first, second_id=second, drawn=outcome == 'draw',
+                                    type=rate_type, created_by=user))
+    if not votes:
+        return 0
+
+    if getattr(settings, 'ELO_WRITE_BEHIND', False):
+        PendingEloVote.objects.bulk_create(votes)
+        start_applier()
+    else:
+        with transaction.atomic():
+            ratings = apply_votes(votes)
+        record_votes(votes, ratings)
+        # don't serve the old ratings for the rest of the request
+        identity_map = get_identity_map()
+        for chart_id in ratings:
+            identity_map.charts.clear(chart_id)
+    mark_seen(user, rate_type, [(vote.first_id, vote.second_id) for vote in votes])
+    return len(votes)
+
+
 def create_page_title(context, title_elements):
     """
     Assemble title elements into title and page title, and update context
@@ -721,6 +910,7 @@ def delete_review(user_id, chart_id):
     :param int user_id:
     :param chart_id:
     """
-    review = Review.objects.filter(chart_id=chart_id, user_id=user_id).first()
-    if review:
-        review.delete()
+    if remove_review(chart_id, user_id):
+        invalidate_chart_data()
+        invalidate_calibration(user_id)
+        schedule_refresh()
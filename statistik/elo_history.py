@@ -0,0 +1,201 @@
+"""
+Elo rating history: periodic snapshots and rankings at any point in time.
+
+Chart.elo_rating/elo_rating_hc are overwritten by each vote, so past rankings
+are kept as EloSnapshots of each (game, level, type), taken periodically by
+the snapshot_elo command. A snapshot stores its chart IDs delta-encoded and its
+ratings (in hundredths of a point) as changes since the previous snapshot of
+the level, both zlib-compressed; most charts don't move between snapshots, so
+these are mostly zeros. Every KEYFRAME_INTERVAL-th snapshot stores full
+ratings so decoding never walks back far.
+
+Ratings at an arbitrary time are the nearest earlier snapshot plus a replay of
+the votes cast between it and that time.
+"""
+import zlib
+
+import elo
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from statistik.constants import SINGLES_LEVELS
+from statistik.models import Chart, EloReview, EloSnapshot
+
+KEYFRAME_INTERVAL = 10
+DEFAULT_RATING = 1000
+# ratings are stored as integers in units of 1/RATING_SCALE points
+RATING_SCALE = 100
+
+
+def rating_column(rate_type):
+    return 'elo_rating_hc' if rate_type else 'elo_rating'
+
+
+def encode_snapshot(chart_ids, ratings, previous=None):
+    """
+    :param np.ndarray chart_ids:    Sorted chart IDs
+    :param np.ndarray ratings:      Rating of each chart
+    :param tuple previous:          (chart_ids, ratings) of the previous snapshot
+                                    to encode changes against, or None for a keyframe
+    :rtype bytes:
+    """
+    scaled = np.round(ratings * RATING_SCALE).astype(np.int64)
+    if previous is not None:
+        scaled -= _scaled_base(chart_ids, *previous)
+    ids = np.diff(np.concatenate([[0], chart_ids]))
+    return zlib.compress(np.concatenate([[len(chart_ids)], ids, scaled]).astype('<i4')
+                         .tobytes())
+
+
+def decode_snapshot(data, previous=None):
+    """
+    :param bytes data:          Encoded snapshot
+    :param tuple previous:      Decoded (chart_ids, ratings) of the previous
+                                snapshot, or None for a keyframe
+    :rtype tuple:               (chart_ids, ratings) as arrays
+    """
+    values = np.frombuffer(zlib.decompress(bytes(data)), dtype='<i4').astype(np.int64)
+    count = values[0]
+    chart_ids = np.cumsum(values[1:count + 1])
+    scaled = values[count + 1:]
+    if previous is not None:
+        scaled = scaled + _scaled_base(chart_ids, *previous)
+    return chart_ids, scaled / RATING_SCALE
+
+
+def _scaled_base(chart_ids, previous_ids, previous_ratings):
+    # previous ratings of the same charts, DEFAULT_RATING for new ones
+    base = np.full(len(chart_ids), DEFAULT_RATING * RATING_SCALE, dtype=np.int64)
+    if len(previous_ids):
+        position = np.searchsorted(previous_ids, chart_ids).clip(0, len(previous_ids) - 1)
+        found = previous_ids[position] == chart_ids
+        base[found] = np.round(previous_ratings[position[found]] * RATING_SCALE)
+    return base
+
+
+def level_charts(game, level):
+    return Chart.objects.filter(difficulty=int(level), song__game=game,
+                                type__in=[str(i) for i in SINGLES_LEVELS[game]])
+
+
+def take_snapshot(game, level, rate_type):
+    """
+    Snapshot the current ratings of a level
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the charts
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :rtype EloSnapshot:
+    """
+    with transaction.atomic():
+        # lock the level's charts so no vote lands between reading ratings and
+        # reading the last vote ID
+        rows = list(level_charts(game, level).select_for_update().order_by('id').values_list(
+            'id', rating_column(rate_type)))
+        last_vote_id = EloReview.objects.aggregate(last=Max('id'))['last'] or 0
+        chart_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        ratings = np.array([row[1] for row in rows], dtype=float)
+
+        previous = EloSnapshot.objects.filter(game=game, level=level, type=rate_type).order_by(
+            '-created_at', '-id').first()
+        keyframe = previous is None or _frames_since_keyframe(previous) + 1 >= KEYFRAME_INTERVAL
+        data = encode_snapshot(chart_ids, ratings,
+                               None if keyframe else load_snapshot(previous))
+        return EloSnapshot.objects.create(game=game, level=level, type=rate_type,
+                                          created_at=timezone.now(),
+                                          last_vote_id=last_vote_id, keyframe=keyframe,
+                                          data=data)
+
+
+def _frames_since_keyframe(snapshot):
+    return EloSnapshot.objects.filter(game=snapshot.game, level=snapshot.level,
+                                      type=snapshot.type,
+                                      created_at__gt=_keyframe_of(snapshot).created_at,
+                                      created_at__lte=snapshot.created_at).count()
+
+
+def _keyframe_of(snapshot):
+    return EloSnapshot.objects.filter(game=snapshot.game, level=snapshot.level,
+                                      type=snapshot.type, keyframe=True,
+                                      created_at__lte=snapshot.created_at).order_by(
+        '-created_at', '-id').first()
+
+
+def load_snapshot(snapshot):
+    """
+    Decode a snapshot, applying changes since its keyframe
+    :param EloSnapshot snapshot:
+    :rtype tuple:   (chart_ids, ratings) as arrays
+    """
+    chain = list(EloSnapshot.objects.filter(
+        game=snapshot.game, level=snapshot.level, type=snapshot.type,
+        created_at__gte=_keyframe_of(snapshot).created_at,
+        created_at__lte=snapshot.created_at).order_by('created_at', 'id').only('keyframe',
+                                                                              'data'))
+    decoded = None
+    for frame in chain:
+        decoded = decode_snapshot(frame.data, None if frame.keyframe else decoded)
+    return decoded
+
+
+def ratings_as_of(game, level, rate_type, when):
+    """
+    Reconstruct the ratings of a level at a point in time from the nearest
+    earlier snapshot and the votes cast since
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the charts
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param datetime when:   Time to get ratings at
+    :rtype dict:            Chart ID -> rating, for charts at the level
+    """
+    chart_ids = list(level_charts(game, level).values_list('id', flat=True))
+    ratings = dict.fromkeys(chart_ids, DEFAULT_RATING)
+    votes = EloReview.objects.filter(type=rate_type, first__in=chart_ids, second__in=chart_ids,
+                                     created_at__lte=when)
+
+    snapshot = EloSnapshot.objects.filter(game=game, level=level, type=rate_type,
+                                          created_at__lte=when).order_by('-created_at',
+                                                                         '-id').first()
+    if snapshot is not None:
+        snapshot_ids, snapshot_ratings = load_snapshot(snapshot)
+        ratings.update((chart_id, rating) for chart_id, rating
+                       in zip(snapshot_ids.tolist(), snapshot_ratings.tolist())
+                       if chart_id in ratings)
+        votes = votes.filter(id__gt=snapshot.last_vote_id)
+
+    # same as elo_rate_charts
+    elo_env = elo.Elo(k_factor=20)
+    for first, second, drawn in votes.order_by('id').values_list('first_id', 'second_id',
+                                                                 'drawn'):
+        ratings[first], ratings[second] = elo_env.rate_1vs1(ratings[first], ratings[second],
+                                                            drawn=drawn)
+    return ratings
+
+
+def movers_since(game, level, rate_type, since, limit=20):
+    """
+    Find the charts whose ranking changed most since a point in time
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the charts
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param datetime since:  Time to compare current rankings against
+    :param int limit:       Maximum number of charts to return
+    :rtype list:            List of dicts of chart ID, ranks and rating change
+    """
+    then = ratings_as_of(game, level, rate_type, since)
+    now = dict(level_charts(game, level).values_list('id', rating_column(rate_type)))
+    rank_then = {chart_id: rank + 1 for rank, chart_id
+                 in enumerate(sorted(then, key=then.get, reverse=True))}
+    rank_now = {chart_id: rank + 1 for rank, chart_id
+                in enumerate(sorted(now, key=now.get, reverse=True))}
+
+    movers = [{
+        'id': chart_id,
+        'rank_then': rank_then[chart_id],
+        'rank_now': rank_now[chart_id],
+        'rank_change': rank_then[chart_id] - rank_now[chart_id],
+        'rating_change': round(now[chart_id] - then[chart_id], 3)
+    } for chart_id in now if chart_id in then]
+    movers.sort(key=lambda mover: (-abs(mover['rank_change']), -abs(mover['rating_change'])))
+    return movers[:limit]
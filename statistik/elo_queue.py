@@ -0,0 +1,195 @@
+"""
+Write-behind queue for Elo votes.
+
+With ELO_WRITE_BEHIND on, elo_rate_charts only inserts a PendingEloVote and
+returns, instead of locking and updating both charts while the voter waits.
+An applier thread in each process drains the queue every
+ELO_WRITE_BEHIND_INTERVAL seconds: it takes the oldest votes in ID order,
+replays them against the current ratings in memory and writes all changed
+charts with one UPDATE and all EloReviews with one INSERT, in one transaction.
+
+Votes are applied at most ELO_WRITE_BEHIND_MAX_STALENESS seconds late: a vote
+that finds an older unapplied vote in the queue applies the queue itself. The
+queue is also flushed when the process exits, and can be drained from outside
+the web processes with the apply_elo_votes command.
+"""
+import atexit
+import datetime
+import logging
+import threading
+
+import elo
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import Case, When, FloatField
+from django.utils import timezone
+
+from statistik.matchmaking import record_vote
+from statistik.matviews import schedule_refresh
+from statistik.models import Chart, EloReview, PendingEloVote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_STALENESS = 10.0
+BATCH_SIZE = 500
+
+_applier = None
+_applier_lock = threading.Lock()
+
+
+def enqueue_vote(chart1_id, chart2_id, user, draw=False, rate_type=0):
+    """
+    Queue an Elo vote to be applied in the background
+    :param int chart1_id:   ID of winning chart
+    :param int chart2_id:   ID of losing chart
+    :param User user:       User who created the review
+    :param bool draw:       True if match was a draw
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    """
+    PendingEloVote.objects.create(first_id=chart1_id, second_id=chart2_id, drawn=draw,
+                                  type=rate_type, created_by=user)
+    start_applier()
+
+    # don't let votes sit in the queue longer than promised, e.g. if the
+    # applier thread died or is far behind
+    max_staleness = getattr(settings, 'ELO_WRITE_BEHIND_MAX_STALENESS', DEFAULT_MAX_STALENESS)
+    cutoff = timezone.now() - datetime.timedelta(seconds=max_staleness)
+    if PendingEloVote.objects.filter(created_at__lt=cutoff).exists():
+        flush_votes()
+
+
+def apply_votes(votes):
+    """
+    Apply votes in order, updating all their charts with one query and
+    recording them as EloReviews. Must be called in a transaction.
+    :param list votes:  PendingEloVote objects (need not be saved)
+    :rtype dict:        Chart ID -> [elo_rating, elo_rating_hc] after the votes
+    """
+    chart_ids = sorted({vote.first_id for vote in votes} |
+                       {vote.second_id for vote in votes})
+    # lock in ID order, like any other writer of several charts should
+    ratings = {chart_id: [elo_rating, elo_rating_hc] for chart_id, elo_rating, elo_rating_hc
+               in Chart.objects.select_for_update().filter(id__in=chart_ids).order_by(
+                   'id').values_list('id', 'elo_rating', 'elo_rating_hc')}
+    if len(ratings) != len(chart_ids):
+        raise Chart.DoesNotExist('Votes for unknown charts %s' %
+                                 sorted(set(chart_ids) - set(ratings)))
+
+    # same rating as elo_rate_charts, in vote order
+    elo_env = elo.Elo(k_factor=20)
+    for vote in votes:
+        column = 1 if vote.type else 0
+        first, second = ratings[vote.first_id], ratings[vote.second_id]
+        first[column], second[column] = elo_env.rate_1vs1(first[column], second[column],
+                                                          drawn=vote.drawn)
+
+    Chart.objects.filter(id__in=chart_ids).update(
+        elo_rating=Case(*[When(id=chart_id, then=rating[0])
+                          for chart_id, rating in ratings.items()],
+                        output_field=FloatField()),
+        elo_rating_hc=Case(*[When(id=chart_id, then=rating[1])
+                             for chart_id, rating in ratings.items()],
+                           output_field=FloatField()))
+    EloReview.objects.bulk_create([
+        EloReview(first_id=vote.first_id, second_id=vote.second_id, drawn=vote.drawn,
+                  type=vote.type, created_by_id=vote.created_by_id)
+        for vote in votes])
+    return ratings
+
+
+def record_votes(votes, ratings):
+    """
+    Update cached matchmaking state and rankings once applied votes are committed
+    :param list votes:  The applied votes
+    :param dict ratings: Ratings returned by apply_votes
+    """
+    for vote in votes:
+        column = 1 if vote.type else 0
+        record_vote(vote.type, vote.first_id, ratings[vote.first_id][column],
+                    vote.second_id, ratings[vote.second_id][column])
+    schedule_refresh()
+
+
+def apply_pending_votes(batch_size=BATCH_SIZE):
+    """
+    Apply the oldest queued votes in one transaction
+    :param int batch_size:  Maximum number of votes to apply
+    :rtype int:             Number of votes applied
+    """
+    with transaction.atomic():
+        # concurrent appliers wait here, then find these votes gone
+        votes = list(PendingEloVote.objects.select_for_update().order_by('id')[:batch_size])
+        if not votes:
+            return 0
+        ratings = apply_votes(votes)
+        PendingEloVote.objects.filter(id__in=[vote.id for vote in votes]).delete()
+
+    record_votes(votes, ratings)
+    return len(votes)
+
+
+def flush_votes():
+    """
+    Apply every queued vote
+    :rtype int: Number of votes applied
+    """
+    total = 0
+    while True:
+        applied = apply_pending_votes()
+        total += applied
+        if applied < BATCH_SIZE:
+            return total
+
+
+class VoteApplier(threading.Thread):
+    """
+    Background thread that periodically drains the vote queue
+    """
+
+    def __init__(self, interval):
+        super(VoteApplier, self).__init__(name='elo-vote-applier')
+        self.daemon = True
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        # this thread keeps its own connection open between intervals, since no
+        # request closes it
+        while not self.stopping.wait(self.interval):
+            try:
+                flush_votes()
+            except Exception:
+                logger.exception('Applying queued Elo votes failed')
+                # reconnect next time, in case the connection is what failed
+                connection.close()
+        connection.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+def start_applier():
+    """
+    Start this process's applier thread, if it isn't running yet
+    """
+    global _applier
+    if _applier is not None and _applier.is_alive():
+        return
+    with _applier_lock:
+        if _applier is None or not _applier.is_alive():
+            _applier = VoteApplier(getattr(settings, 'ELO_WRITE_BEHIND_INTERVAL',
+                                           DEFAULT_INTERVAL))
+            _applier.start()
+
+
+@atexit.register
+def _flush_on_exit():
+    if _applier is None:
+        return
+    _applier.stop()
+    try:
+        flush_votes()
+    except Exception:
+        logger.exception('Flushing queued Elo votes on exit failed')
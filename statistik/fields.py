@@ -0,0 +1,146 @@
+"""
+Model fields that store small sets of choices as integer bitmasks.
+
+Techniques, recommended options and best techniques are each at most a couple
+dozen small ints, so storing them as one integer is much more compact than an
+array, works on any database, and lets queries test for a technique with a
+bitwise AND. The fields still read and write lists of ints.
+"""
+from django import forms
+from django.db import models
+from django.utils.text import capfirst
+
+from statistik.constants import TECHNIQUE_CHOICES, RECOMMENDED_OPTIONS_CHOICES, IIDX
+
+# each game's techniques get their own block of bits (IIDX 0-15, DDR 16-31)
+TECHNIQUE_BITS_PER_GAME = 16
+
+
+def technique_bit(technique):
+    """
+    :param int technique:   Technique value (from TECHNIQUE_CHOICES)
+    :rtype int:             Bit index of the technique in a technique mask
+    """
+    technique = int(technique)
+    return (technique // 100) * TECHNIQUE_BITS_PER_GAME + technique % 100
+
+
+def techniques_to_mask(techniques):
+    """
+    :param list techniques: Technique values (from TECHNIQUE_CHOICES)
+    :rtype int:             Bitmask of the techniques
+    """
+    mask = 0
+    for technique in techniques:
+        mask |= 1 << technique_bit(technique)
+    return mask
+
+
+def mask_to_techniques(mask):
+    """
+    :param int mask:    Bitmask of techniques
+    :rtype list:        Technique values in ascending order
+    """
+    return [(bit // TECHNIQUE_BITS_PER_GAME) * 100 + bit % TECHNIQUE_BITS_PER_GAME
+            for bit in _set_bits(mask)]
+
+
+def options_to_mask(options):
+    """
+    :param list options:    Option values (from RECOMMENDED_OPTIONS_CHOICES)
+    :rtype int:             Bitmask of the options
+    """
+    mask = 0
+    for option in options:
+        mask |= 1 << int(option)
+    return mask
+
+
+def mask_to_options(mask):
+    """
+    :param int mask:    Bitmask of options
+    :rtype list:        Option values in ascending order
+    """
+    return list(_set_bits(mask))
+
+
+def _set_bits(mask):
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+
+class BitmaskListField(models.IntegerField):
+    """
+    Stores a list of small ints as an integer bitmask. Subclasses define how
+    list items map to bits.
+    """
+    item_choices = []
+
+    @staticmethod
+    def to_mask(values):
+        raise NotImplementedError
+
+    @staticmethod
+    def to_list(mask):
+        raise NotImplementedError
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is None:
+            return value
+        return self.to_list(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, list):
+            return value
+        if isinstance(value, (tuple, set)):
+            return list(value)
+        return self.to_list(int(value))
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, int):
+            # already a mask, e.g. from a bitwise query
+            return value
+        return self.to_mask(value or [])
+
+    def value_to_string(self, obj):
+        return str(self.get_prep_value(self._get_val_from_obj(obj)))
+
+    def run_validators(self, value):
+        # range validators apply to the stored mask, not the list
+        super(BitmaskListField, self).run_validators(self.get_prep_value(value))
+
+    def formfield(self, **kwargs):
+        defaults = {
+            'choices': self.item_choices,
+            'coerce': int,
+            'required': not self.blank,
+            'label': capfirst(self.verbose_name),
+            'help_text': self.help_text
+        }
+        defaults.update(kwargs)
+        form_class = defaults.pop('form_class', forms.TypedMultipleChoiceField)
+        return form_class(**defaults)
+
+
+class TechniqueMaskField(BitmaskListField):
+    """
+    List of techniques (from TECHNIQUE_CHOICES of any game) stored as a bitmask
+    """
+    item_choices = [choice for choices in TECHNIQUE_CHOICES.values() for choice in choices]
+    to_mask = staticmethod(techniques_to_mask)
+    to_list = staticmethod(mask_to_techniques)
+
+
+class OptionMaskField(BitmaskListField):
+    """
+    List of recommended options stored as a bitmask
+    """
+    item_choices = RECOMMENDED_OPTIONS_CHOICES[IIDX]
+    to_mask = staticmethod(options_to_mask)
+    to_list = staticmethod(mask_to_options)
@@ -0,0 +1,68 @@
+"""
+Jinja2 environment for the table partials in templates/jinja2/ (see
+templatetags/tables.py).
+
+Values are output the way Django's {{ }} outputs them: localized, then
+escaped with Django's escape(), which writes quotes differently from Jinja2's
+own autoescaping. Jinja2's autoescaping is turned off in favour of that, so
+both engines render the same bytes. Translations of template literals are
+marked safe, like {% trans 'literal' %}, since some of them contain markup.
+"""
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.core.urlresolvers import reverse
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from django.utils.timezone import template_localtime
+from django.utils.translation import ugettext, ungettext
+from jinja2 import Environment
+
+from statistik.templatetags.tables import jinja2_chart_rows
+
+
+def finalize(value):
+    """
+    :param value:   Value of a {{ }} expression
+    :rtype str:     The value as the Django template engine would output it
+    """
+    return conditional_escape(localize(template_localtime(value)))
+
+
+def gettext(message):
+    """
+    Same as {% trans message %} with a literal message
+    :rtype SafeText:
+    """
+    return mark_safe(ugettext(message))
+
+
+def ngettext(singular, plural, number):
+    """
+    Same as {% blocktrans count %} with literal messages
+    :rtype SafeText:
+    """
+    return mark_safe(ungettext(singular, plural, number))
+
+
+def url(name, **kwargs):
+    """
+    Same as {% url name key=value %}
+    :rtype str:
+    """
+    return reverse(name, kwargs=kwargs)
+
+
+def environment(**options):
+    """
+    :rtype Environment:
+    """
+    options['autoescape'] = False
+    options['finalize'] = finalize
+    # keep templates' trailing newlines, like Django
+    options['keep_trailing_newline'] = True
+    options['extensions'] = list(options.get('extensions', [])) + [
+        'jinja2.ext.i18n', 'sass_processor.jinja2.ext.SassSrc']
+    env = Environment(**options)
+    env.install_gettext_callables(gettext, ngettext, newstyle=True)
+    env.globals.update({'url': url, 'static': static, 'chart_rows': jinja2_chart_rows})
+    return env
@@ -0,0 +1,199 @@
+"""
+Database-backed background jobs.
+
+Functions decorated with @job (see tasks.py) can be queued with enqueue() and
+are run by `manage.py run_worker`, which claims queued jobs and runs them in a
+process pool, so Elo replays, imports and aggregate rebuilds don't run in web
+requests or have to be started by hand.
+
+- Queueing a job whose key matches a job that is still queued returns the
+  queued job instead, so e.g. many votes ask for one refit. Enqueues of a key
+  take a transaction-level advisory lock on it, so concurrent ones can't both
+  insert.
+- Workers claim a job by moving it from queued to running with a conditional
+  UPDATE, so several workers can share the queue.
+- A job that raises is retried after RETRY_DELAY * 2^(attempts - 1) seconds,
+  up to its max_attempts, and then marked failed with its traceback.
+- Jobs report progress with set_progress(). Running jobs whose worker stops
+  sending heartbeats for STALE_AFTER seconds are requeued.
+"""
+import datetime
+import hashlib
+import importlib
+import json
+import traceback
+
+from django.db import transaction, connection
+from django.db.models import F
+from django.utils import timezone
+
+from statistik.models import Job
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 30
+STALE_AFTER = 300
+TASK_MODULES = ('statistik.tasks',)
+# arbitrary first key for pg_advisory_xact_lock(namespace, hash of the job key)
+ENQUEUE_LOCK_ID = 0x10b
+
+# name -> (function, max attempts)
+JOBS = {}
+
+_current_job = None
+
+
+def job(name=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Register a function as a job. Its keyword arguments must be JSON serializable.
+    :param str name:            Name to queue the job by, defaults to the function's
+    :param int max_attempts:    Number of times to try the job before failing it
+    """
+    def register(func):
+        JOBS[name or func.__name__] = (func, max_attempts)
+        return func
+    return register
+
+
+def load_jobs():
+    """
+    Import the modules defining jobs
+    :rtype dict:    Registered jobs
+    """
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+    return JOBS
+
+
+def _lock_key(key):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, hashtext(%s))',
+                           [ENQUEUE_LOCK_ID, key])
+
+
+def enqueue(name, key=None, **kwargs):
+    """
+    Queue a job, unless one with the same key is already waiting to run
+    :param str name:    Name of the registered job
+    :param str key:     De-duplication key, defaults to the name and arguments
+    :param kwargs:      Arguments to call the job with
+    :rtype Job:         The queued job
+    """
+    if name not in load_jobs():
+        raise KeyError('Unknown job %r' % name)
+    arguments = json.dumps(kwargs, sort_keys=True)
+    if key is None:
+        key = '%s:%s' % (name, hashlib.md5(arguments.encode('utf-8')).hexdigest())
+    with transaction.atomic():
+        # held until commit, so a concurrent enqueue of the key sees this one's job
+        _lock_key(key)
+        queued = Job.objects.filter(key=key, state=Job.QUEUED).first()
+        if queued:
+            return queued
+        return Job.objects.create(name=name, key=key, arguments=arguments,
+                                  max_attempts=JOBS[name][1])
+
+
+def claim_jobs(limit):
+    """
+    Mark up to limit runnable jobs as running
+    :param int limit:   Maximum number of jobs to claim
+    :rtype list:        IDs of the claimed jobs, oldest first
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    candidates = Job.objects.filter(state=Job.QUEUED, run_after__lte=now).order_by(
+        'id').values_list('id', flat=True)[:limit]
+    claimed = []
+    for job_id in candidates:
+        # another worker may have claimed it since
+        if Job.objects.filter(id=job_id, state=Job.QUEUED).update(
+                state=Job.RUNNING, attempts=F('attempts') + 1, progress=0, message='',
+                started_at=now, finished_at=None, heartbeat_at=now):
+            claimed.append(job_id)
+    return claimed
+
+
+def heartbeat(job_ids):
+    """
+    Mark jobs as still being worked on
+    :param list job_ids:    IDs of running jobs
+    """
+    if job_ids:
+        Job.objects.filter(id__in=list(job_ids), state=Job.RUNNING).update(
+            heartbeat_at=timezone.now())
+
+
+def requeue_stale(after=STALE_AFTER):
+    """
+    Requeue (or fail) running jobs whose worker has stopped sending heartbeats
+    :param int after:   Seconds without a heartbeat before a job is stale
+    :rtype int:         Number of jobs requeued or failed
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=after)
+    stale = Job.objects.filter(state=Job.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        state=Job.FAILED, error='Worker stopped responding', finished_at=timezone.now())
+    return failed + stale.update(state=Job.QUEUED, run_after=timezone.now())
+
+
+def set_progress(fraction, message=''):
+    """
+    Report the progress of the running job. Does nothing outside of jobs, so
+    job functions can also be called directly.
+    :param float fraction:  Fraction of the job done (0-1)
+    :param str message:     What the job is doing
+    """
+    if _current_job is None:
+        return
+    Job.objects.filter(id=_current_job).update(progress=fraction, message=message[:256],
+                                               heartbeat_at=timezone.now())
+
+
+def run_job(job_id):
+    """
+    Run a claimed job, then mark it done, or queue a retry or mark it failed
+    if it raised
+    :param int job_id:  ID of the job
+    :rtype int:         The job's new state
+    """
+    global _current_job
+    job = Job.objects.get(id=job_id)
+    _current_job = job.id
+    try:
+        func = load_jobs()[job.name][0]
+        func(**json.loads(job.arguments))
+    except Exception:
+        now = timezone.now()
+        update = {'error': traceback.format_exc(), 'heartbeat_at': now}
+        if job.attempts < job.max_attempts:
+            delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+            update.update(state=Job.QUEUED, run_after=now + datetime.timedelta(seconds=delay))
+        else:
+            update.update(state=Job.FAILED, finished_at=now)
+    else:
+        update = {'state': Job.DONE, 'progress': 1, 'finished_at': timezone.now()}
+    finally:
+        _current_job = None
+    Job.objects.filter(id=job.id).update(**update)
+    return update['state']
+
+
+def init_worker_process():
+    """
+    Set up Django in a pool process started by run_worker
+    """
+    import django
+    django.setup()
+
+
+def run_job_in_worker(job_id):
+    """
+    run_job for pool processes, which don't have requests to close their
+    database connections
+    """
+    try:
+        return run_job(job_id)
+    finally:
+        connection.close()
@@ -0,0 +1,91 @@
+"""
+Precomputed localized labels for formatting reviews.
+
+Looking up translations for every characteristic and option of every review
+dominates the time spent rendering pages with hundreds of reviews, so the
+labels for each (language, game) are translated once per process and the
+review formatters below just do table lookups.
+"""
+from django.utils import translation
+from django.utils.translation import ugettext as _
+
+from statistik.constants import (TECHNIQUE_CHOICES, RECOMMENDED_OPTIONS_CHOICES,
+                                 DIFFICULTY_SPIKE_CHOICES)
+from statistik.fields import technique_bit
+
+HIGHLIGHT_COLOR = '#187638'
+DEFAULT_COLOR = '#000'
+
+_label_tables = {}
+
+
+class LabelTable(object):
+    """
+    Translated labels for one game in one language
+    """
+    __slots__ = ('techniques', 'highlighted_bits', 'plain_bits', 'options', 'spikes')
+
+    def __init__(self, game):
+        # techniques are keyed by their stored value (e.g. 100+ for DDR)
+        self.techniques = {value: _(label) for value, label in TECHNIQUE_CHOICES[game]}
+        # (label, color) pairs keyed by bit index in a technique mask
+        self.highlighted_bits = {technique_bit(value): (label, HIGHLIGHT_COLOR)
+                                 for value, label in self.techniques.items()}
+        self.plain_bits = {technique_bit(value): (label, DEFAULT_COLOR)
+                           for value, label in self.techniques.items()}
+        self.options = {value: _(label) for value, label in RECOMMENDED_OPTIONS_CHOICES[game]}
+        self.spikes = {value: (_('Difficult ' + str(label)), DEFAULT_COLOR)
+                       for value, label in DIFFICULTY_SPIKE_CHOICES if value}
+
+
+def get_label_table(game, language=None):
+    """
+    Get the label table for a game, building it on first use
+    :param int game:        The game to get labels for (from GAME_CHOICES)
+    :param str language:    Language code, defaults to the active language
+    :rtype LabelTable:
+    """
+    language = language or translation.get_language()
+    table = _label_tables.get((language, game))
+    if table is None:
+        with translation.override(language):
+            table = _label_tables[(language, game)] = LabelTable(game)
+    return table
+
+
+def format_options(table, recommended_options):
+    """
+    Format a review's recommended options as a comma separated string
+    :param LabelTable table:            Labels to use
+    :param list recommended_options:    Option values from the review
+    :rtype str:
+    """
+    options = table.options
+    return ', '.join([options[x] for x in recommended_options or ()])
+
+
+def format_characteristics_mask(table, characteristics, best_techniques=0, difficulty_spike=0):
+    """
+    Format a review's characteristics as (label, color) pairs for templates,
+    taking the raw technique masks (see fields.TechniqueMaskField)
+    :param LabelTable table:        Labels to use
+    :param int characteristics:     Technique mask from the review
+    :param int best_techniques:     Reviewer's best techniques mask, highlighted
+    :param int difficulty_spike:    Difficulty spike to append, if any
+    :rtype list:                    List of (label, color) tuples
+    """
+    highlighted = table.highlighted_bits
+    plain = table.plain_bits
+    mask = characteristics or 0
+    best = mask & (best_techniques or 0)
+    items = []
+    bit = 0
+    while mask:
+        if mask & 1:
+            items.append(highlighted[bit] if best & 1 else plain[bit])
+        mask >>= 1
+        best >>= 1
+        bit += 1
+    if difficulty_spike:
+        items.append(table.spikes[difficulty_spike])
+    return items
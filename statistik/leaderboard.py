@@ -0,0 +1,144 @@
+"""
+Elo leaderboards: each level's singles charts ranked by Elo rating.
+
+Rankings are read with one query over the (difficulty, type, elo_rating[_hc])
+indexes, ranked in the database with a window function, and cached for
+LEADERBOARD_TTL seconds together with their JSON encoding. chart_rank looks a
+chart up in the cached leaderboard by bisection, or counts the charts ahead of
+it over the index if the level isn't cached, so chart pages can show a chart's
+rank without loading its level. With USE_MATERIALIZED_VIEWS, leaderboards are
+read pre-ranked from statistik_elo_ranking_mv instead (see matviews.py).
+"""
+import bisect
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import Q
+
+from statistik.constants import SINGLES_LEVELS
+from statistik.matviews import matviews_enabled
+from statistik.models import Chart, EloRanking
+from statistik.rows import TYPE_DISPLAY
+from statistik.serializers import encode_json
+
+LEADERBOARD_TTL = 30
+RATING_COLUMNS = ('elo_rating', 'elo_rating_hc')
+
+_chart_url_prefix = None
+
+
+def chart_url(chart_id):
+    """
+    Same as reverse('chart', kwargs={'chart_id': chart_id}), without the
+    per-call URL resolver work
+    :rtype str:
+    """
+    global _chart_url_prefix
+    if _chart_url_prefix is None:
+        _chart_url_prefix = reverse('chart', kwargs={'chart_id': ''})
+    return _chart_url_prefix + str(chart_id)
+
+
+class Leaderboard(object):
+    """
+    Ranked charts of one level, with the ratings kept sorted for rank lookups
+    """
+    __slots__ = ('rows', 'keys', 'json')
+
+    def __init__(self, rows):
+        """
+        :param list rows:   (rank, chart id, title, type, rating) tuples, best first
+        """
+        self.rows = rows
+        # sort keys matching the ORDER BY of load_leaderboard
+        self.keys = [(-row[4], row[1]) for row in rows]
+        self.json = encode_json({'data': [{
+            'rank': rank,
+            'id': chart_id,
+            'title': title,
+            'type': TYPE_DISPLAY.get(chart_type),
+            'rating': round(rating, 3)
+        } for rank, chart_id, title, chart_type, rating in rows]})
+
+    def rank_of(self, chart_id, rating):
+        """
+        :param int chart_id:    Chart to look up
+        :param float rating:    Its rating
+        :rtype int:             Its rank
+        """
+        return bisect.bisect_left(self.keys, (-rating, chart_id)) + 1
+
+
+def _cache_key(game, level, rating_column):
+    return 'elo_leaderboard:%d:%d:%s' % (game, int(level), rating_column)
+
+
+def _singles(game):
+    return [int(i) for i in SINGLES_LEVELS[game]]
+
+
+def load_leaderboard(game, level, rating_column):
+    """
+    Rank a level's singles charts in the database
+    :param int game:            The game (from GAME_CHOICES)
+    :param int level:           Level of the charts
+    :param str rating_column:   'elo_rating' or 'elo_rating_hc'
+    :rtype Leaderboard:
+    """
+    assert rating_column in RATING_COLUMNS
+    if matviews_enabled():
+        # already ranked in statistik_elo_ranking_mv
+        rank_column = 'rank' if rating_column == 'elo_rating' else 'rank_hc'
+        return Leaderboard(list(EloRanking.objects.filter(
+            game=game, difficulty=int(level)).order_by(rank_column).values_list(
+            rank_column, 'chart_id', 'title', 'type', rating_column)))
+    singles = _singles(game)
+    sql = ('SELECT ROW_NUMBER() OVER (ORDER BY c.{column} DESC, c.id), '
+           'c.id, s.title, c.type, c.{column} '
+           'FROM statistik_chart c JOIN statistik_song s ON s.id = c.song_id '
+           'WHERE c.difficulty = %s AND c.type IN ({types}) AND s.game = %s '
+           'ORDER BY c.{column} DESC, c.id').format(
+        column=rating_column, types=', '.join(['%s'] * len(singles)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [int(level)] + singles + [game])
+        return Leaderboard(cursor.fetchall())
+
+
+def get_leaderboard(game, level, rating_column):
+    """
+    Get a level's leaderboard from the cache, loading it if needed
+    :param int game:            The game (from GAME_CHOICES)
+    :param int level:           Level of the charts
+    :param str rating_column:   'elo_rating' or 'elo_rating_hc'
+    :rtype Leaderboard:
+    """
+    key = _cache_key(game, level, rating_column)
+    leaderboard = cache.get(key)
+    if leaderboard is None:
+        leaderboard = load_leaderboard(game, level, rating_column)
+        cache.set(key, leaderboard, LEADERBOARD_TTL)
+    return leaderboard
+
+
+def chart_rank(chart, game, rating_column):
+    """
+    Find a chart's rank on its level's leaderboard
+    :param Chart chart:         The chart
+    :param int game:            The chart's game (from GAME_CHOICES)
+    :param str rating_column:   'elo_rating' or 'elo_rating_hc'
+    :rtype tuple:               (rank, number of ranked charts), or None for
+                                charts that aren't ranked (doubles)
+    """
+    if chart.type not in _singles(game):
+        return None
+    rating = getattr(chart, rating_column)
+    leaderboard = cache.get(_cache_key(game, chart.difficulty, rating_column))
+    if leaderboard is not None:
+        return leaderboard.rank_of(chart.id, rating), len(leaderboard.rows)
+
+    charts = Chart.objects.filter(difficulty=chart.difficulty, type__in=_singles(game),
+                                  song__game=game)
+    ahead = charts.filter(Q(**{rating_column + '__gt': rating}) |
+                          Q(**{rating_column: rating, 'id__lt': chart.id})).count()
+    return ahead + 1, charts.count()
@@ -0,0 +1,117 @@
+"""
+Request-scoped identity map for Chart, Song and UserProfile lookups.
+
+Each request gets its own IdentityMap (set up by IdentityMapMiddleware), so
+repeated lookups of the same object across controller functions are served
+from memory. Keys queued with Loader.want() are fetched together with the next
+lookup, which lets helpers batch their lookups into a single IN query.
+"""
+import threading
+
+from statistik.models import Chart, Song, UserProfile
+
+_local = threading.local()
+
+
+class Loader(object):
+    """
+    Caches model instances by key and batches lookups of uncached keys
+    """
+
+    def __init__(self, queryset, key='pk', on_load=None):
+        """
+        :param Queryset queryset:   Queryset to load objects from
+        :param str key:             Field to look objects up by
+        :param on_load:             Optional callback run for each loaded object
+        """
+        self.queryset = queryset
+        self.key = key
+        self.on_load = on_load
+        self._cache = {}
+        self._queue = set()
+
+    def want(self, *keys):
+        """
+        Queue keys to be fetched along with the next lookup
+        """
+        self._queue.update(key for key in keys if key not in self._cache)
+
+    def load_many(self, keys):
+        """
+        Look up objects by key, fetching all uncached and queued keys at once
+        :param list keys:   Keys to look up
+        :rtype list:        Objects in the same order as keys, None if missing
+        """
+        keys = list(keys)
+        missing = (self._queue | set(keys)) - set(self._cache)
+        self._queue.clear()
+        if missing:
+            for obj in self.queryset.filter(**{self.key + '__in': missing}):
+                self.prime(getattr(obj, self.key), obj)
+            for key in missing:
+                self._cache.setdefault(key, None)
+        return [self._cache[key] for key in keys]
+
+    def load(self, key):
+        """
+        Look up a single object by key
+        :rtype Model:   The object, or None if it doesn't exist
+        """
+        return self.load_many([key])[0]
+
+    def prime(self, key, obj):
+        """
+        Add an already loaded object to the cache
+        """
+        self._cache[key] = obj
+        self._queue.discard(key)
+        if obj is not None and self.on_load:
+            self.on_load(obj)
+
+    def clear(self, key=None):
+        """
+        Forget a cached object, or all of them if no key is given
+        """
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+class IdentityMap(object):
+    """
+    Loaders for the models that get looked up repeatedly within a request
+    """
+
+    def __init__(self):
+        self.songs = Loader(Song.objects.all())
+        self.profiles = Loader(UserProfile.objects.all(), key='user_id')
+        # charts are always loaded with their song, so share it with the song loader
+        self.charts = Loader(Chart.objects.select_related('song'),
+                             on_load=lambda chart: self.songs.prime(chart.song_id, chart.song))
+
+
+def get_identity_map():
+    """
+    Get the identity map for the current request. Outside of a request a new,
+    empty map is returned so nothing is cached between calls.
+    :rtype IdentityMap:
+    """
+    identity_map = getattr(_local, 'identity_map', None)
+    return identity_map if identity_map is not None else IdentityMap()
+
+
+class IdentityMapMiddleware(object):
+    """
+    Give each request a fresh identity map
+    """
+
+    def process_request(self, request):
+        _local.identity_map = IdentityMap()
+
+    def process_response(self, request, response):
+        _local.identity_map = None
+        return response
+
+    def process_exception(self, request, exception):
+        _local.identity_map = None
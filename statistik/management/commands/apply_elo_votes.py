@@ -0,0 +1,27 @@
+"""
+Apply Elo votes queued by the write-behind mode
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from statistik.elo_queue import flush_votes
+
+
+class Command(BaseCommand):
+    help = 'Apply queued Elo votes (once, or continuously with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep applying votes as they come in')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between checks with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = flush_votes()
+            if applied:
+                self.stdout.write('Applied %d votes' % applied)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,93 @@
+"""
+Export the site's data to an indexed SQLite file for statistik.settings_sqlite
+"""
+import os
+
+from django.contrib.auth.models import User, Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from statistik.models import (Song, Chart, Review, EloReview, UserProfile, ChartConsensus,
+                              EloSnapshot)
+
+SNAPSHOT_ALIAS = 'sqlite_snapshot'
+
+# in dependency order
+EXPORTED_MODELS = [ContentType, Permission, Group, User, UserProfile, Song, Chart, Review,
+                   EloReview, EloSnapshot, ChartConsensus]
+
+
+class Command(BaseCommand):
+    help = 'Export songs, charts, reviews and users to an SQLite snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='SQLite file to write')
+        parser.add_argument('--force', action='store_true',
+                            help='Overwrite the file if it already exists')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of rows to copy at a time')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if os.path.exists(path):
+            if not options['force']:
+                raise CommandError('%s already exists (use --force to overwrite)' % path)
+            os.remove(path)
+
+        connections.databases[SNAPSHOT_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path
+        }
+        connections.ensure_defaults(SNAPSHOT_ALIAS)
+        snapshot = connections[SNAPSHOT_ALIAS]
+        try:
+            # create tables without indexes, load them, then index
+            with snapshot.schema_editor() as editor:
+                for model in EXPORTED_MODELS:
+                    editor.create_model(model)
+                deferred_sql = editor.deferred_sql
+                editor.deferred_sql = []
+
+            with transaction.atomic(using=SNAPSHOT_ALIAS):
+                for model in EXPORTED_MODELS:
+                    count = self.copy_rows(model, options['chunk_size'])
+                    self.stdout.write('%-14s %8d rows' % (model.__name__, count))
+
+            cursor = snapshot.cursor()
+            for statement in deferred_sql:
+                cursor.execute(str(statement))
+            cursor.execute('ANALYZE')
+            cursor.execute('VACUUM')
+        finally:
+            snapshot.close()
+            del connections[SNAPSHOT_ALIAS]
+            del connections.databases[SNAPSHOT_ALIAS]
+
+        self.stdout.write('Wrote %s (%.1f MB)' % (path, os.path.getsize(path) / 1e6))
+
+    def copy_rows(self, model, chunk_size):
+        """
+        Copy all rows of a model to the snapshot in primary key order
+        :param model:           Model class to copy
+        :param int chunk_size:  Number of rows to read and insert at a time
+        :rtype int:             Number of rows copied
+        """
+        fields = [field.attname for field in model._meta.concrete_fields]
+        queryset = model._default_manager.using('default').order_by('pk').values_list(*fields)
+        count = 0
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                return count
+            objects = [model(**dict(zip(fields, row))) for row in rows]
+            if model is User:
+                # snapshots are read-only; don't ship credentials or contact details
+                for user in objects:
+                    user.set_unusable_password()
+                    user.email = ''
+            model._default_manager.using(SNAPSHOT_ALIAS).bulk_create(objects)
+            count += len(objects)
+            last_pk = rows[-1][fields.index(model._meta.pk.attname)]
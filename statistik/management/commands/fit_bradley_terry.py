@@ -0,0 +1,37 @@
+"""
+Refit Bradley-Terry ratings from the full Elo vote history
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from statistik.bradley_terry import fit_level, save_ratings, RATING_COLUMNS
+from statistik.constants import GAMES, SCORE_CATEGORY_CHOICES
+from statistik.models import Chart
+
+
+class Command(BaseCommand):
+    help = 'Fit Bradley-Terry ratings and rating deviations for Elo-ranked charts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=list(GAMES), default='IIDX')
+        parser.add_argument('--level', type=int, action='append',
+                            help='Level to fit (can be repeated, defaults to all)')
+        parser.add_argument('--type', type=int, action='append', choices=list(RATING_COLUMNS),
+                            help='Rating type to fit (can be repeated, defaults to all)')
+
+    def handle(self, *args, **options):
+        game = GAMES[options['game']]
+        levels = options['level'] or sorted(set(Chart.objects.filter(
+            song__game=game).values_list('difficulty', flat=True)))
+        rate_types = options['type'] or sorted(RATING_COLUMNS)
+
+        for level in levels:
+            for rate_type in rate_types:
+                start = time.time()
+                chart_ids, ratings, deviations = fit_level(game, level, rate_type)
+                fitted = time.time()
+                save_ratings(chart_ids, ratings, deviations, rate_type)
+                self.stdout.write('%s %d %s: %d charts, fit %.2fs, saved %.2fs' % (
+                    options['game'], level, SCORE_CATEGORY_CHOICES[game][rate_type][1],
+                    len(chart_ids), fitted - start, time.time() - fitted))
@@ -0,0 +1,29 @@
+"""
+Refit the reviewer bias-corrected consensus ratings from all reviews
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from statistik.consensus import fit_game, save_consensus
+from statistik.constants import GAMES
+from statistik.controller import invalidate_chart_data
+
+
+class Command(BaseCommand):
+    help = 'Fit consensus ratings with each reviewer\'s bias taken out (see consensus.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=list(GAMES), action='append',
+                            help='Game to fit (can be repeated, defaults to all)')
+
+    def handle(self, *args, **options):
+        for game_name in options['game'] or sorted(GAMES):
+            start = time.time()
+            chart_ids, consensus, review_counts = fit_game(GAMES[game_name])
+            fitted = time.time()
+            changed = save_consensus(GAMES[game_name], chart_ids, consensus, review_counts)
+            self.stdout.write('%s: %d reviews of %d charts, %d changed, fit %.2fs, saved %.2fs'
+                              % (game_name, review_counts.sum(), len(chart_ids), changed,
+                                 fitted - start, time.time() - fitted))
+        invalidate_chart_data()
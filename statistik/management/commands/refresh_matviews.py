@@ -0,0 +1,32 @@
+"""
+Refresh the materialized views, or report how long refreshes have been taking
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Avg, Max, Count
+
+from statistik.matviews import refresh_matviews
+from statistik.models import MatviewRefresh
+
+
+class Command(BaseCommand):
+    help = 'Refresh the materialized views (Postgres only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', action='store_true',
+                            help="Summarize recorded refresh durations instead of refreshing")
+
+    def handle(self, *args, **options):
+        if options['report']:
+            stats = MatviewRefresh.objects.values('view').annotate(
+                count=Count('id'), avg=Avg('duration_ms'),
+                max=Max('duration_ms'), last=Max('started_at')).order_by('view')
+            for row in stats:
+                self.stdout.write('%-28s %6d refreshes  avg %8.1f ms  max %8.1f ms  last %s' % (
+                    row['view'], row['count'], row['avg'], row['max'], row['last']))
+            return
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('Materialized views need a Postgres database')
+        for view, duration in sorted(refresh_matviews().items()):
+            self.stdout.write('Refreshed %s in %.1f ms' % (view, duration))
@@ -0,0 +1,49 @@
+"""
+Run queued background jobs (see statistik/jobs.py)
+"""
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+
+from statistik.jobs import (claim_jobs, heartbeat, requeue_stale, init_worker_process,
+                            run_job_in_worker, load_jobs)
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Number of jobs to run at once')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds to wait between checks for new jobs')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no jobs are left to run')
+
+    def handle(self, *args, **options):
+        load_jobs()
+        processes = options['processes']
+        # spawned processes don't share this process's database connection
+        pool = multiprocessing.get_context('spawn').Pool(processes,
+                                                         initializer=init_worker_process)
+        running = {}
+        try:
+            while True:
+                for job_id, result in list(running.items()):
+                    if result.ready():
+                        del running[job_id]
+                        self.stdout.write('Job %d finished' % job_id)
+                heartbeat(running)
+                requeue_stale()
+
+                claimed = claim_jobs(processes - len(running))
+                for job_id in claimed:
+                    self.stdout.write('Job %d started' % job_id)
+                    running[job_id] = pool.apply_async(run_job_in_worker, (job_id,))
+                if options['once'] and not running and not claimed:
+                    return
+                time.sleep(options['poll'])
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,42 @@
+"""
+Summarize the slow query log by query fingerprint
+"""
+import glob
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from statistik.querylog import read_slow_query_log, summarize_slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Summarize the worst offenders in the slow query log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Number of fingerprints to show')
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG,
+                            help='Slow query log to read (rotated files are included)')
+        parser.add_argument('--plans', action='store_true',
+                            help='Show the query plan of the slowest example')
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(options['log'] + '.*')) + [options['log']]
+        summary = summarize_slow_queries(read_slow_query_log(paths))
+        if not summary:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        for rank, group in enumerate(summary[:options['limit']]):
+            self.stdout.write('#%d  total %.1fms  count %d  mean %.1fms  max %.1fms' % (
+                rank + 1, group['total_ms'], group['count'], group['mean_ms'],
+                group['max_ms']))
+            self.stdout.write('    from: %s' % ', '.join(sorted(group['origins'])))
+            self.stdout.write('    %s' % group['fingerprint'])
+            self.stdout.write('    slowest params: %s' % (group['example'].get('params'),))
+            if options['plans'] and group['example'].get('plan'):
+                plan = group['example']['plan'][0]['Plan']
+                self.stdout.write('    plan: %s on %s (cost %s, rows %s)' % (
+                    plan.get('Node Type'), plan.get('Relation Name', '-'),
+                    plan.get('Total Cost'), plan.get('Plan Rows')))
+            self.stdout.write('')
@@ -0,0 +1,25 @@
+"""
+Snapshot the current Elo ratings of every level, for rankings over time
+"""
+from django.core.management.base import BaseCommand
+
+from statistik.constants import GAMES, SINGLES_LEVELS
+from statistik.elo_history import take_snapshot
+from statistik.models import Chart
+
+
+class Command(BaseCommand):
+    help = 'Store compressed snapshots of the Elo ratings of each level (run periodically)'
+
+    def handle(self, *args, **options):
+        for game_name, game in sorted(GAMES.items()):
+            levels = sorted(set(Chart.objects.filter(
+                song__game=game, type__in=[str(i) for i in SINGLES_LEVELS[game]]).values_list(
+                'difficulty', flat=True)))
+            for level in levels:
+                # only NC and HC have online Elo ratings
+                for rate_type in (0, 1):
+                    snapshot = take_snapshot(game, level, rate_type)
+                    self.stdout.write('%s %d type %d: %d bytes%s' % (
+                        game_name, level, rate_type, len(snapshot.data),
+                        ' (keyframe)' if snapshot.keyframe else ''))
@@ -0,0 +1,22 @@
+"""
+Warm the caches of the most requested pages (see statistik/warmup.py)
+"""
+from django.core.management.base import BaseCommand
+
+from statistik.warmup import warm_caches
+
+
+class Command(BaseCommand):
+    help = ('Precompute chart lists and Elo rankings of the most requested pages. Only '
+            'useful to web processes with a shared cache (STATISTIK_CACHE_DIR).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, help='Number of pages to warm')
+        parser.add_argument('--threads', type=int, help='Number of pages to warm at once')
+
+    def handle(self, *args, **options):
+        for (kind, game, level, variant), seconds in warm_caches(options['pages'],
+                                                                 options['threads']):
+            self.stdout.write('%s game %d level %d %s: %s' % (
+                kind, game, level, variant,
+                'failed' if seconds is None else '%.2fs' % seconds))
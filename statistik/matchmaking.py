@@ -0,0 +1,207 @@
+"""
+Elo matchup selection.
+
+Each vote tells us the most about two charts when the outcome is uncertain
+(ratings close together) and the charts' ratings themselves are uncertain
+(few votes so far). For charts i and j with win probability p, the expected
+information gain of a vote is taken as
+
+    p * (1 - p) * (var_i + var_j)
+
+where a chart's rating variance shrinks with the number of votes it has been
+in. Ratings, vote counts and chart display info for each (game, level, type)
+are cached per process and updated as votes come in, so picking a matchup
+doesn't need to query the database. Rewriting ratings wholesale (e.g. replaying
+every vote) calls invalidate_level_states, which bumps a version in the shared
+cache so every process reloads its levels.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count
+
+from statistik.constants import SINGLES_LEVELS
+from statistik.models import Chart, EloReview
+
+# prior rating deviation of a chart nobody has voted on, in Elo points
+INITIAL_RD = 350
+# information about a rating gained from one evenly matched vote
+VOTE_INFORMATION = 0.25 * (math.log(10) / 400) ** 2
+# number of charts considered as the first half of a matchup, and how many of
+# the best pairs one is picked from, so concurrent voters see different pairs
+CANDIDATES = 32
+TOP_PAIRS = 5
+# cached level state is reloaded from the database after this many seconds
+STATE_TTL = 300
+LEVEL_STATE_VERSION_KEY = 'level_state_version'
+
+_level_states = {}
+# version of LEVEL_STATE_VERSION_KEY the cached level states were loaded under
+_version = None
+_lock = threading.Lock()
+
+
+def rating_variance(votes):
+    """
+    :param np.ndarray votes:    Number of votes each chart has been in
+    :rtype np.ndarray:          Approximate variance of each chart's rating
+    """
+    return 1 / (1 / INITIAL_RD ** 2 + votes * VOTE_INFORMATION)
+
+
+def win_probability(rating, other_rating):
+    """
+    :rtype np.ndarray:  Elo probability of the first chart winning
+    """
+    return 1 / (1 + 10 ** ((other_rating - rating) / 400))
+
+
+def choose_pair(ratings, votes, rng=np.random, candidates=CANDIDATES, top_pairs=TOP_PAIRS,
+                exclude=None):
+    """
+    Pick a pair with high expected information gain
+    :param np.ndarray ratings:  Current rating of each chart
+    :param np.ndarray votes:    Number of votes each chart has been in
+    :param rng:                 numpy RandomState (or the np.random module)
+    :param int candidates:      Number of charts to consider as the first chart
+    :param int top_pairs:       Pick randomly from this many of the best pairs
+    :param exclude:             Function of two chart indices, true for pairs to
+                                skip unless there are no others
+    :rtype tuple:               Indices of the two charts
+    """
+    n = len(ratings)
+    variance = rating_variance(votes)
+    # uncertain charts are more likely to be considered first
+    first = rng.choice(n, size=min(candidates, n), replace=False, p=variance / variance.sum())
+
+    p = win_probability(ratings[first, None], ratings[None, :])
+    gain = p * (1 - p) * (variance[first, None] + variance[None, :])
+    gain[np.arange(len(first)), first] = -1
+
+    gain = gain.ravel()
+    if exclude is None:
+        best = np.argpartition(gain, -top_pairs)[-top_pairs:] \
+            if gain.size > top_pairs else np.arange(gain.size)
+        best = best[gain[best] >= 0]
+    else:
+        best = []
+        for flat in np.argsort(gain)[::-1]:
+            if gain[flat] < 0:
+                break
+            if not exclude(first[flat // n], flat % n):
+                best.append(flat)
+                if len(best) == top_pairs:
+                    break
+        if not best:
+            return choose_pair(ratings, votes, rng, candidates, top_pairs)
+    row, column = np.unravel_index(rng.choice(best), (len(first), n))
+    return first[row], column
+
+
+class LevelState(object):
+    """
+    Charts of one level with their current ratings and vote counts
+    """
+    __slots__ = ('rating_column', 'chart_ids', 'index', 'ratings', 'votes', 'display',
+                 'loaded_at')
+
+    def __init__(self, game, level, rate_type):
+        self.rating_column = 'elo_rating_hc' if rate_type else 'elo_rating'
+        charts = list(Chart.objects.filter(
+            difficulty=int(level), type__in=[str(i) for i in SINGLES_LEVELS[game]],
+            song__game=game).values_list('id', self.rating_column, 'song__title', 'type'))
+        self.chart_ids = [chart[0] for chart in charts]
+        self.index = {chart_id: i for i, chart_id in enumerate(self.chart_ids)}
+        self.ratings = np.array([chart[1] for chart in charts], dtype=float)
+        self.display = [(chart[2], chart[3]) for chart in charts]
+
+        self.votes = np.zeros(len(charts))
+        reviews = EloReview.objects.filter(type=rate_type, first__in=self.chart_ids)
+        for column in ('first', 'second'):
+            for chart_id, count in reviews.values_list(column).annotate(n=Count('id')):
+                if chart_id in self.index:
+                    self.votes[self.index[chart_id]] += count
+        self.loaded_at = time.time()
+
+
+def get_level_state(game, level, rate_type=0):
+    """
+    Get the cached state of a level, loading it if missing or stale
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the charts
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :rtype LevelState:
+    """
+    global _version
+    version = cache.get(LEVEL_STATE_VERSION_KEY)
+    if version != _version:
+        clear_level_states()
+        _version = version
+    key = (game, int(level), rate_type)
+    state = _level_states.get(key)
+    if state is None or time.time() - state.loaded_at > STATE_TTL:
+        state = _level_states[key] = LevelState(game, level, rate_type)
+    return state
+
+
+def clear_level_states():
+    """
+    Drop all cached level states, e.g. after charts are added
+    """
+    with _lock:
+        _level_states.clear()
+
+
+def invalidate_level_states():
+    """
+    Drop cached level states in every process after charts' ratings were
+    rewritten. Only affects other processes if they share the cache (see CACHES
+    in settings.py).
+    """
+    try:
+        cache.incr(LEVEL_STATE_VERSION_KEY)
+    except ValueError:
+        cache.set(LEVEL_STATE_VERSION_KEY, 1, None)
+    clear_level_states()
+
+
+def record_vote(rate_type, first_id, first_rating, second_id, second_rating):
+    """
+    Update cached level states after an Elo vote
+    :param int rate_type:       Rating type (refer to Chart model for options)
+    :param int first_id:        ID of the winning chart
+    :param float first_rating:  Its new rating
+    :param int second_id:       ID of the losing chart
+    :param float second_rating: Its new rating
+    """
+    with _lock:
+        for (game, level, state_type), state in _level_states.items():
+            if state_type != rate_type:
+                continue
+            for chart_id, rating in ((first_id, first_rating), (second_id, second_rating)):
+                i = state.index.get(chart_id)
+                if i is not None:
+                    state.ratings[i] = rating
+                    state.votes[i] += 1
+
+
+def make_information_matchup(game, level, rate_type=0, seen=None):
+    """
+    Match the two charts whose vote is expected to tell us the most
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the charts
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param seen:            Chart ID pairs to avoid (see seen_pairs.py), or None
+    :rtype list:            (chart id, title, type) of the two charts
+    """
+    state = get_level_state(game, level, rate_type)
+    exclude = None
+    if seen is not None:
+        ids = state.chart_ids
+        exclude = lambda i, j: (ids[i], ids[j]) in seen
+    with _lock:
+        pair = choose_pair(state.ratings, state.votes, exclude=exclude)
+    return [(state.chart_ids[i],) + state.display[i] for i in pair]
@@ -0,0 +1,130 @@
+"""
+Postgres materialized views for read-heavy pages.
+
+statistik_elo_ranking_mv ranks every level's singles charts by both Elo
+ratings, and statistik_chart_avg_mv collects each reviewed chart's ratings into
+arrays, which get_avg_ratings averages in Python so they round the same way as
+averages of the reviews themselves. They are read through the unmanaged
+EloRanking and ChartAverage models when USE_MATERIALIZED_VIEWS is on.
+
+Writes schedule a refresh with schedule_refresh(), which runs
+REFRESH MATERIALIZED VIEW CONCURRENTLY (readers aren't blocked) in a timer
+thread at most once every MATERIALIZED_VIEW_REFRESH_INTERVAL seconds, so
+pages lag writes by up to that long. Each refresh's duration is recorded in
+MatviewRefresh and reported by the refresh_matviews command.
+
+Charts' aggregate_version is bumped when their reviews change, before the
+averages view catches up, so after refreshing it the charts whose reviews
+changed since the last refresh are bumped again (tracked with an
+EventCursor), and their cached table rows re-rendered with the new averages.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from statistik.models import Chart, EventCursor, MatviewRefresh, ReviewEvent
+
+logger = logging.getLogger(__name__)
+
+ELO_RANKING_VIEW = 'statistik_elo_ranking_mv'
+CHART_AVERAGE_VIEW = 'statistik_chart_avg_mv'
+VIEWS = (ELO_RANKING_VIEW, CHART_AVERAGE_VIEW)
+DEFAULT_REFRESH_INTERVAL = 10
+# EventCursor of the last event included in the averages view
+CHART_AVERAGE_CURSOR = 'chart_average_view'
+
+_last_refresh = 0
+_pending = None
+_pending_lock = threading.Lock()
+
+
+def matviews_enabled():
+    """
+    :rtype bool:    Whether pages should read from the materialized views
+    """
+    return getattr(settings, 'USE_MATERIALIZED_VIEWS', False) and \
+        connection.vendor == 'postgresql'
+
+
+def refresh_matviews(views=VIEWS):
+    """
+    Refresh materialized views now, recording how long each took
+    :param tuple views: Names of the views to refresh
+    :rtype dict:        View name -> refresh duration in milliseconds
+    """
+    global _last_refresh
+    _last_refresh = time.time()
+    durations = {}
+    with connection.cursor() as cursor:
+        for view in views:
+            if view == CHART_AVERAGE_VIEW:
+                # events up to here are committed, so the refresh includes them
+                last_event = ReviewEvent.objects.aggregate(last=Max('id'))['last']
+            started_at = timezone.now()
+            start = time.time()
+            cursor.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY ' + view)
+            durations[view] = (time.time() - start) * 1000
+            MatviewRefresh.objects.create(view=view, started_at=started_at,
+                                          duration_ms=durations[view])
+            if view == CHART_AVERAGE_VIEW and last_event is not None:
+                _bump_refreshed_charts(last_event)
+    return durations
+
+
+def _bump_refreshed_charts(last_event):
+    """
+    Bump the aggregate_version of charts whose reviews changed since the
+    previous refresh of the averages view
+    :param int last_event:  ID of the last ReviewEvent included in the refresh
+    """
+    # imported here, controller imports this module
+    from statistik.controller import invalidate_chart_data
+    with transaction.atomic():
+        EventCursor.objects.get_or_create(name=CHART_AVERAGE_CURSOR)
+        cursor = EventCursor.objects.select_for_update().get(name=CHART_AVERAGE_CURSOR)
+        if cursor.position >= last_event:
+            return
+        chart_ids = set(ReviewEvent.objects.filter(
+            id__gt=cursor.position, id__lte=last_event).values_list('chart_id', flat=True))
+        Chart.objects.filter(id__in=chart_ids).update(
+            aggregate_version=F('aggregate_version') + 1)
+        cursor.position = last_event
+        cursor.save()
+    invalidate_chart_data()
+
+
+def _run_pending_refresh():
+    global _pending
+    with _pending_lock:
+        _pending = None
+    try:
+        refresh_matviews()
+    except Exception:
+        logger.exception('Refreshing materialized views failed')
+    finally:
+        # this thread's connection isn't closed by any request
+        connection.close()
+
+
+def schedule_refresh():
+    """
+    Refresh the materialized views soon, debounced so they're refreshed at
+    most once per MATERIALIZED_VIEW_REFRESH_INTERVAL seconds
+    """
+    global _pending
+    if not matviews_enabled():
+        return
+    interval = getattr(settings, 'MATERIALIZED_VIEW_REFRESH_INTERVAL',
+                       DEFAULT_REFRESH_INTERVAL)
+    with _pending_lock:
+        if _pending is not None:
+            return
+        delay = max(0, _last_refresh + interval - time.time())
+        _pending = threading.Timer(delay, _run_pending_refresh)
+        _pending.daemon = True
+        _pending.start()
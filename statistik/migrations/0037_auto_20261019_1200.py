@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0036_auto_20170519_1909'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='chart',
+            index_together=set([('difficulty', 'type')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='song',
+            index_together=set([('game', 'game_version')]),
+        ),
+    ]
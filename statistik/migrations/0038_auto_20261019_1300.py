@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import statistik.fields
+
+
+class Migration(migrations.Migration):
+
+    def arrays_to_masks(apps, schema_editor):
+        Review = apps.get_model("statistik", "Review")
+        UserProfile = apps.get_model("statistik", "UserProfile")
+        for review in Review.objects.all():
+            review.characteristics_mask = review.characteristics
+            review.recommended_options_mask = review.recommended_options
+            review.save(update_fields=['characteristics_mask', 'recommended_options_mask'])
+        for profile in UserProfile.objects.all():
+            profile.best_techniques_mask = profile.best_techniques or []
+            profile.save(update_fields=['best_techniques_mask'])
+
+    def masks_to_arrays(apps, schema_editor):
+        Review = apps.get_model("statistik", "Review")
+        UserProfile = apps.get_model("statistik", "UserProfile")
+        for review in Review.objects.all():
+            review.characteristics = review.characteristics_mask
+            review.recommended_options = review.recommended_options_mask
+            review.save(update_fields=['characteristics', 'recommended_options'])
+        for profile in UserProfile.objects.all():
+            profile.best_techniques = profile.best_techniques_mask
+            profile.save(update_fields=['best_techniques'])
+
+    dependencies = [
+        ('statistik', '0037_auto_20261019_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='characteristics_mask',
+            field=statistik.fields.TechniqueMaskField(null=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='recommended_options_mask',
+            field=statistik.fields.OptionMaskField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='best_techniques_mask',
+            field=statistik.fields.TechniqueMaskField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(arrays_to_masks, masks_to_arrays),
+        migrations.RemoveField(
+            model_name='review',
+            name='characteristics',
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='recommended_options',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='best_techniques',
+        ),
+        migrations.RenameField(
+            model_name='review',
+            old_name='characteristics_mask',
+            new_name='characteristics',
+        ),
+        migrations.RenameField(
+            model_name='review',
+            old_name='recommended_options_mask',
+            new_name='recommended_options',
+        ),
+        migrations.RenameField(
+            model_name='userprofile',
+            old_name='best_techniques_mask',
+            new_name='best_techniques',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0038_auto_20261019_1300'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chart',
+            name='bt_rating',
+            field=models.FloatField(default=1000),
+        ),
+        migrations.AddField(
+            model_name='chart',
+            name='bt_rating_hc',
+            field=models.FloatField(default=1000),
+        ),
+        migrations.AddField(
+            model_name='chart',
+            name='bt_rd',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chart',
+            name='bt_rd_hc',
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0039_auto_20261019_1400'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EloSnapshot',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('game', models.SmallIntegerField(choices=[(0, 'IIDX'), (1, 'DDR')])),
+                ('level', models.SmallIntegerField()),
+                ('type', models.SmallIntegerField(choices=[(0, 'NC'), (1, 'HC'), (2, 'EXHC'), (3, 'SCORE')])),
+                ('created_at', models.DateTimeField()),
+                ('last_vote_id', models.IntegerField()),
+                ('keyframe', models.BooleanField()),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='elosnapshot',
+            index_together=set([('game', 'level', 'type', 'created_at')]),
+        ),
+    ]
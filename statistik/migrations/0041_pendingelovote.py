@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('statistik', '0040_elosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingEloVote',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('drawn', models.BooleanField()),
+                ('type', models.SmallIntegerField(choices=[(0, 'NC'), (1, 'HC'), (2, 'EXHC'), (3, 'SCORE')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(to=settings.AUTH_USER_MODEL, null=True, related_name='+')),
+                ('first', models.ForeignKey(to='statistik.Chart', related_name='+')),
+                ('second', models.ForeignKey(to='statistik.Chart', related_name='+')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('statistik', '0041_pendingelovote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EloSeenPairs',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('type', models.SmallIntegerField(choices=[(0, 'NC'), (1, 'HC'), (2, 'EXHC'), (3, 'SCORE')])),
+                ('count', models.IntegerField()),
+                ('capacity', models.IntegerField()),
+                ('bits', models.BinaryField()),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='eloseenpairs',
+            unique_together=set([('user', 'type')]),
+        ),
+    ]
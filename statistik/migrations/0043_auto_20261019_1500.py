@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0042_eloseenpairs'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='chart',
+            index_together=set([('difficulty', 'type', 'elo_rating'), ('difficulty', 'type', 'elo_rating_hc')]),
+        ),
+    ]
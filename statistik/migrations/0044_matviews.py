@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+RATING_COLUMNS = ['clear_rating', 'hc_rating', 'exhc_rating', 'score_rating']
+
+# round() to one decimal like Python's round(), which rounds ties to even
+CREATE_ROUND_FUNCTION = """
+CREATE FUNCTION statistik_round1(x numeric) RETURNS numeric AS $$
+    SELECT CASE WHEN x * 10 - trunc(x * 10) = 0.5 AND mod(trunc(x * 10), 2) = 0
+                THEN trunc(x * 10) / 10
+                ELSE round(x, 1) END
+$$ LANGUAGE SQL IMMUTABLE
+"""
+
+CREATE_ELO_RANKING_VIEW = """
+CREATE MATERIALIZED VIEW statistik_elo_ranking_mv AS
+SELECT c.id AS chart_id, s.game, c.difficulty, c.type, s.title, c.elo_rating, c.elo_rating_hc,
+       row_number() OVER (PARTITION BY s.game, c.difficulty
+                          ORDER BY c.elo_rating DESC, c.id) AS rank,
+       row_number() OVER (PARTITION BY s.game, c.difficulty
+                          ORDER BY c.elo_rating_hc DESC, c.id) AS rank_hc
+FROM statistik_chart c JOIN statistik_song s ON s.id = c.song_id
+WHERE c.type IN (0, 1, 2, 100, 101, 102, 103, 104)
+"""
+
+# same as get_avg_ratings: with three or more ratings, drop those at least
+# RATING_AVERAGE_THRESHOLD (0.5) away from the rounded mean and average the rest
+CREATE_CHART_AVERAGE_VIEW = """
+CREATE MATERIALIZED VIEW statistik_chart_avg_mv AS
+WITH stats AS (
+    SELECT chart_id, {stats}
+    FROM statistik_review GROUP BY chart_id
+)
+SELECT r.chart_id, {averages}, count(*) AS review_count
+FROM statistik_review r JOIN stats s ON s.chart_id = r.chart_id
+GROUP BY r.chart_id, {group_by}
+""".format(
+    stats=', '.join(
+        'count({0}) AS {0}_n, statistik_round1(avg({0})::numeric) AS {0}_mean'.format(column)
+        for column in RATING_COLUMNS),
+    averages=', '.join(
+        'statistik_round1(CASE WHEN s.{0}_n < 3 THEN coalesce(avg(r.{0})::numeric, 0) '
+        'ELSE coalesce(avg(CASE WHEN abs(r.{0}::numeric - s.{0}_mean) < 0.5 '
+        'THEN r.{0} END)::numeric, 0) END)::float AS {0}'.format(column)
+        for column in RATING_COLUMNS),
+    group_by=', '.join('s.{0}_n, s.{0}_mean'.format(column) for column in RATING_COLUMNS))
+
+CREATE_INDEXES = [
+    'CREATE UNIQUE INDEX statistik_elo_ranking_mv_chart ON statistik_elo_ranking_mv (chart_id)',
+    'CREATE INDEX statistik_elo_ranking_mv_rank '
+    'ON statistik_elo_ranking_mv (game, difficulty, rank)',
+    'CREATE INDEX statistik_elo_ranking_mv_rank_hc '
+    'ON statistik_elo_ranking_mv (game, difficulty, rank_hc)',
+    'CREATE UNIQUE INDEX statistik_chart_avg_mv_chart ON statistik_chart_avg_mv (chart_id)',
+]
+
+
+class Migration(migrations.Migration):
+
+    def create_views(apps, schema_editor):
+        # materialized views are Postgres only; other databases compute these on the fly
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in [CREATE_ROUND_FUNCTION, CREATE_ELO_RANKING_VIEW,
+                          CREATE_CHART_AVERAGE_VIEW] + CREATE_INDEXES:
+            schema_editor.execute(statement)
+
+    def drop_views(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute('DROP MATERIALIZED VIEW statistik_chart_avg_mv')
+        schema_editor.execute('DROP MATERIALIZED VIEW statistik_elo_ranking_mv')
+        schema_editor.execute('DROP FUNCTION statistik_round1(numeric)')
+
+    dependencies = [
+        ('statistik', '0043_auto_20261019_1500'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_views, drop_views),
+        migrations.CreateModel(
+            name='EloRanking',
+            fields=[
+                ('chart', models.OneToOneField(primary_key=True, serialize=False, to='statistik.Chart', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('game', models.SmallIntegerField(choices=[(0, 'IIDX'), (1, 'DDR')])),
+                ('difficulty', models.SmallIntegerField()),
+                ('type', models.SmallIntegerField()),
+                ('title', models.CharField(max_length=64)),
+                ('elo_rating', models.FloatField()),
+                ('elo_rating_hc', models.FloatField()),
+                ('rank', models.IntegerField()),
+                ('rank_hc', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'statistik_elo_ranking_mv',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ChartAverage',
+            fields=[
+                ('chart', models.OneToOneField(primary_key=True, serialize=False, to='statistik.Chart', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING)),
+                ('clear_rating', models.FloatField()),
+                ('hc_rating', models.FloatField()),
+                ('exhc_rating', models.FloatField()),
+                ('score_rating', models.FloatField()),
+                ('review_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'statistik_chart_avg_mv',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MatviewRefresh',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('view', models.CharField(max_length=64)),
+                ('started_at', models.DateTimeField()),
+                ('duration_ms', models.FloatField()),
+            ],
+        ),
+    ]
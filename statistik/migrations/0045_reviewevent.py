@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+import statistik.fields
+
+RATING_NAMES = ['clear_rating', 'hc_rating', 'exhc_rating', 'score_rating']
+
+
+class Migration(migrations.Migration):
+
+    def log_existing_reviews(apps, schema_editor):
+        # start the log with a 'created' event for every existing review, so
+        # consumers replaying it from the start see every review
+        Review = apps.get_model('statistik', 'Review')
+        ReviewEvent = apps.get_model('statistik', 'ReviewEvent')
+        events = []
+        for review in Review.objects.order_by('id').iterator():
+            event = ReviewEvent(review_id=review.id, chart_id=review.chart_id,
+                                user_id=review.user_id, action=0,
+                                new_characteristics=review.characteristics)
+            for name in RATING_NAMES:
+                setattr(event, 'new_' + name, getattr(review, name))
+            events.append(event)
+            if len(events) == 1000:
+                ReviewEvent.objects.bulk_create(events)
+                events = []
+        ReviewEvent.objects.bulk_create(events)
+
+    def clear_events(apps, schema_editor):
+        apps.get_model('statistik', 'ReviewEvent').objects.all().delete()
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('statistik', '0044_matviews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCursor',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('position', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReviewEvent',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('review_id', models.IntegerField()),
+                ('action', models.SmallIntegerField(choices=[(0, 'created'), (1, 'updated'), (2, 'deleted')])),
+                ('old_clear_rating', models.FloatField(null=True)),
+                ('new_clear_rating', models.FloatField(null=True)),
+                ('old_hc_rating', models.FloatField(null=True)),
+                ('new_hc_rating', models.FloatField(null=True)),
+                ('old_exhc_rating', models.FloatField(null=True)),
+                ('new_exhc_rating', models.FloatField(null=True)),
+                ('old_score_rating', models.FloatField(null=True)),
+                ('new_score_rating', models.FloatField(null=True)),
+                ('old_characteristics', statistik.fields.TechniqueMaskField(null=True)),
+                ('new_characteristics', statistik.fields.TechniqueMaskField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chart', models.ForeignKey(to='statistik.Chart', related_name='+')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL, related_name='+')),
+            ],
+        ),
+        migrations.RunPython(log_existing_reviews, clear_events),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0046_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageAccess',
+            fields=[
+                ('id', models.AutoField(serialize=False, primary_key=True, auto_created=True, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('game', models.SmallIntegerField(choices=[(0, 'IIDX'), (1, 'DDR')])),
+                ('level', models.SmallIntegerField()),
+                ('variant', models.CharField(max_length=8)),
+                ('count', models.IntegerField(default=0)),
+                ('last_accessed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pageaccess',
+            unique_together=set([('kind', 'game', 'level', 'variant')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0047_pageaccess'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chart',
+            name='aggregate_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('statistik', '0048_chart_aggregate_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartConsensus',
+            fields=[
+                ('chart', models.OneToOneField(serialize=False, primary_key=True, to='statistik.Chart')),
+                ('clear_rating', models.FloatField(null=True)),
+                ('hc_rating', models.FloatField(null=True)),
+                ('exhc_rating', models.FloatField(null=True)),
+                ('score_rating', models.FloatField(null=True)),
+                ('review_count', models.IntegerField()),
+                ('fitted_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+RATING_COLUMNS = ['clear_rating', 'hc_rating', 'exhc_rating', 'score_rating']
+
+# Averages rounded in SQL can't match get_avg_ratings, which takes the exact
+# mean of the binary floats and rounds it with Python's round(): numeric keeps
+# only 15 significant digits of a float8, and float8 sums lose the exactness
+# that decides ties. So the view collects each chart's ratings and
+# get_avg_ratings averages them in Python.
+CREATE_CHART_AVERAGE_VIEW = """
+CREATE MATERIALIZED VIEW statistik_chart_avg_mv AS
+SELECT chart_id, {ratings}, count(*) AS review_count
+FROM statistik_review GROUP BY chart_id
+""".format(ratings=', '.join(
+    'array_remove(array_agg({0} ORDER BY id), NULL) AS {0}s'.format(column)
+    for column in RATING_COLUMNS))
+
+CREATE_INDEX = ('CREATE UNIQUE INDEX statistik_chart_avg_mv_chart '
+                'ON statistik_chart_avg_mv (chart_id)')
+
+
+class Migration(migrations.Migration):
+
+    def create_view(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute('DROP MATERIALIZED VIEW statistik_chart_avg_mv')
+        schema_editor.execute('DROP FUNCTION statistik_round1(numeric)')
+        schema_editor.execute(CREATE_CHART_AVERAGE_VIEW)
+        schema_editor.execute(CREATE_INDEX)
+
+    def restore_view(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        previous = import_module('statistik.migrations.0044_matviews')
+        schema_editor.execute('DROP MATERIALIZED VIEW statistik_chart_avg_mv')
+        schema_editor.execute(previous.CREATE_ROUND_FUNCTION)
+        schema_editor.execute(previous.CREATE_CHART_AVERAGE_VIEW)
+        schema_editor.execute(CREATE_INDEX)
+
+    dependencies = [
+        ('statistik', '0049_chartconsensus'),
+    ]
+
+    # ChartAverage is unmanaged, so the field changes only update its state
+    operations = [migrations.RunPython(create_view, restore_view)] + [
+        migrations.RemoveField(model_name='chartaverage', name=column)
+        for column in RATING_COLUMNS] + [
+        migrations.AddField(model_name='chartaverage', name=column + 's',
+                            field=django.contrib.postgres.fields.ArrayField(
+                                base_field=models.FloatField(), size=None))
+        for column in RATING_COLUMNS]
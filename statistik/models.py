@@ -2,11 +2,12 @@ from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 from statistik.constants import (CHART_TYPE_CHOICES,
-                                 TECHNIQUE_CHOICES, VERSION_CHOICES, PLAYSIDE_CHOICES,
-                                 RECOMMENDED_OPTIONS_CHOICES,
+                                 VERSION_CHOICES, PLAYSIDE_CHOICES,
                                  RATING_VALIDATORS, SCORE_CATEGORY_CHOICES,
                                  DIFFICULTY_SPIKE_CHOICES, IIDX, GAMES, GAME_CHOICES)
+from statistik.fields import TechniqueMaskField, OptionMaskField
 
 
 class Song(models.Model):
@@ -26,6 +27,7 @@ class Song(models.Model):
 
     class Meta:
         ordering = ['title']
+        index_together = [('game', 'game_version')]
 
 
 class Chart(models.Model):
@@ -38,15 +40,27 @@ class Chart(models.Model):
     note_count = models.SmallIntegerField(null=True)
     elo_rating = models.FloatField(default=1000)
     elo_rating_hc = models.FloatField(default=1000)
+    # Bradley-Terry fit of all Elo votes and its rating deviation (see bradley_terry.py)
+    bt_rating = models.FloatField(default=1000)
+    bt_rating_hc = models.FloatField(default=1000)
+    bt_rd = models.FloatField(null=True)
+    bt_rd_hc = models.FloatField(null=True)
 
     clickagain_nc = models.FloatField(blank=True, null=True)
     clickagain_hc = models.FloatField(blank=True, null=True)
 
+    # bumped whenever the chart's average ratings may have changed, to key
+    # cached renderings of its row (see templatetags/tables.py)
+    aggregate_version = models.IntegerField(default=0)
+
     def __str__(self):
         return "%s [%s]" % (self.song_id, self.get_type_display())
 
     class Meta:
         unique_together = ('song', 'type')
+        # also serve Elo leaderboards (see leaderboard.py)
+        index_together = [('difficulty', 'type', 'elo_rating'),
+                          ('difficulty', 'type', 'elo_rating_hc')]
 
 # TODO: see if this can be made to not use IIDX specifically, for now it works
 class EloReview(models.Model):
@@ -72,10 +86,9 @@ class Review(models.Model):
                                      validators=RATING_VALIDATORS[IIDX])
     difficulty_spike = models.SmallIntegerField(default=0,
                                                 choices=DIFFICULTY_SPIKE_CHOICES)
-    characteristics = ArrayField(
-        models.IntegerField(choices=TECHNIQUE_CHOICES[IIDX]), null=True)
-    recommended_options = ArrayField(models.IntegerField(
-        choices=RECOMMENDED_OPTIONS_CHOICES[IIDX]), null=True)
+    # lists of choices, stored as bitmasks (see fields.py)
+    characteristics = TechniqueMaskField(null=True)
+    recommended_options = OptionMaskField(null=True)
     created_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -91,8 +104,7 @@ class UserProfile(models.Model):
     dancer_name = models.CharField(max_length=8, null=True)
     location = models.CharField(max_length=64)
     play_side = models.SmallIntegerField(choices=PLAYSIDE_CHOICES)
-    best_techniques = ArrayField(
-        models.IntegerField(choices=TECHNIQUE_CHOICES[IIDX]), size=3)
+    best_techniques = TechniqueMaskField()
     max_reviewable = models.SmallIntegerField(validators=[
         MaxValueValidator(12),
         MinValueValidator(0)
@@ -104,3 +116,210 @@ class UserProfile(models.Model):
         else:
             return 'DJ %s' % self.dj_name
 
+
+
+class EloSnapshot(models.Model):
+    """
+    Compressed Elo ratings of one level's charts at a point in time
+    (see elo_history.py for the encoding)
+    """
+    game = models.SmallIntegerField(choices=GAME_CHOICES)
+    level = models.SmallIntegerField()
+    type = models.SmallIntegerField(choices=SCORE_CATEGORY_CHOICES[IIDX])
+    created_at = models.DateTimeField()
+    # ratings include every vote up to and including this one
+    last_vote_id = models.IntegerField()
+    # keyframes hold full ratings, others hold changes since the previous snapshot
+    keyframe = models.BooleanField()
+    data = models.BinaryField()
+
+    class Meta:
+        index_together = [('game', 'level', 'type', 'created_at')]
+
+
+class PendingEloVote(models.Model):
+    """
+    Elo vote waiting to be applied, when votes are written behind (see elo_queue.py)
+    """
+    first = models.ForeignKey(Chart, related_name='+')
+    second = models.ForeignKey(Chart, related_name='+')
+    drawn = models.BooleanField()
+    type = models.SmallIntegerField(choices=SCORE_CATEGORY_CHOICES[IIDX])
+    created_by = models.ForeignKey(User, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class EloSeenPairs(models.Model):
+    """
+    Bloom filter of the chart pairs a user has voted on (see seen_pairs.py)
+    """
+    user = models.ForeignKey(User)
+    type = models.SmallIntegerField(choices=SCORE_CATEGORY_CHOICES[IIDX])
+    # number of pairs added, and the number the filter was sized for
+    count = models.IntegerField()
+    capacity = models.IntegerField()
+    bits = models.BinaryField()
+
+    class Meta:
+        unique_together = ('user', 'type')
+
+
+class EloRanking(models.Model):
+    """
+    Singles charts ranked within their level by Elo rating, read from a
+    materialized view (see matviews.py)
+    """
+    chart = models.OneToOneField(Chart, primary_key=True, db_constraint=False,
+                                 on_delete=models.DO_NOTHING)
+    game = models.SmallIntegerField(choices=GAME_CHOICES)
+    difficulty = models.SmallIntegerField()
+    type = models.SmallIntegerField()
+    title = models.CharField(max_length=64)
+    elo_rating = models.FloatField()
+    elo_rating_hc = models.FloatField()
+    rank = models.IntegerField()
+    rank_hc = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'statistik_elo_ranking_mv'
+
+
+class ChartAverage(models.Model):
+    """
+    Ratings of a reviewed chart, collected by a materialized view (see
+    matviews.py) and averaged as get_avg_ratings does when read
+    """
+    chart = models.OneToOneField(Chart, primary_key=True, db_constraint=False,
+                                 on_delete=models.DO_NOTHING)
+    clear_ratings = ArrayField(models.FloatField())
+    hc_ratings = ArrayField(models.FloatField())
+    exhc_ratings = ArrayField(models.FloatField())
+    score_ratings = ArrayField(models.FloatField())
+    review_count = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'statistik_chart_avg_mv'
+
+
+class MatviewRefresh(models.Model):
+    """
+    How long a materialized view refresh took
+    """
+    view = models.CharField(max_length=64)
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+
+
+class ReviewEvent(models.Model):
+    """
+    Append-only record of a review being created, updated or deleted, with
+    its ratings before and after (see review_events.py)
+    """
+    CREATED, UPDATED, DELETED = range(3)
+    ACTION_CHOICES = [(CREATED, 'created'), (UPDATED, 'updated'), (DELETED, 'deleted')]
+
+    # not a foreign key, deleted reviews keep their events
+    review_id = models.IntegerField()
+    chart = models.ForeignKey(Chart, related_name='+')
+    user = models.ForeignKey(User, related_name='+')
+    action = models.SmallIntegerField(choices=ACTION_CHOICES)
+    old_clear_rating = models.FloatField(null=True)
+    new_clear_rating = models.FloatField(null=True)
+    old_hc_rating = models.FloatField(null=True)
+    new_hc_rating = models.FloatField(null=True)
+    old_exhc_rating = models.FloatField(null=True)
+    new_exhc_rating = models.FloatField(null=True)
+    old_score_rating = models.FloatField(null=True)
+    new_score_rating = models.FloatField(null=True)
+    old_characteristics = TechniqueMaskField(null=True)
+    new_characteristics = TechniqueMaskField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return 'ReviewEvent %s: %s %s' % (self.id, self.get_action_display(), self.review_id)
+
+
+class EventCursor(models.Model):
+    """
+    How far a consumer of the review event log has read
+    """
+    name = models.CharField(max_length=64, unique=True)
+    # ID of the last consumed ReviewEvent
+    position = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Job(models.Model):
+    """
+    Background job, run by the run_worker command (see jobs.py)
+    """
+    QUEUED, RUNNING, DONE, FAILED = range(4)
+    STATE_CHOICES = [(QUEUED, 'queued'), (RUNNING, 'running'), (DONE, 'done'),
+                     (FAILED, 'failed')]
+
+    name = models.CharField(max_length=64)
+    # queued jobs with the same key are only run once
+    key = models.CharField(max_length=128, db_index=True)
+    # JSON encoded keyword arguments
+    arguments = models.TextField(default='{}')
+    state = models.SmallIntegerField(choices=STATE_CHOICES, default=QUEUED)
+    attempts = models.SmallIntegerField(default=0)
+    max_attempts = models.SmallIntegerField(default=3)
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=256, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # updated by the worker while it runs the job
+    heartbeat_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return 'Job %s: %s (%s)' % (self.id, self.name, self.get_state_display())
+
+    @property
+    def duration(self):
+        """
+        :rtype timedelta:   How long the job ran (or has been running) for
+        """
+        if self.started_at is None:
+            return None
+        return (self.finished_at or timezone.now()) - self.started_at
+
+    class Meta:
+        index_together = [('state', 'run_after')]
+
+
+class PageAccess(models.Model):
+    """
+    How often a ratings or Elo page has been requested, to choose which
+    pages to warm caches for (see warmup.py)
+    """
+    # 'ratings' or 'elo'
+    kind = models.CharField(max_length=16)
+    game = models.SmallIntegerField(choices=GAME_CHOICES)
+    level = models.SmallIntegerField()
+    # play style for ratings pages, rating type for Elo pages
+    variant = models.CharField(max_length=8)
+    count = models.IntegerField(default=0)
+    last_accessed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'game', 'level', 'variant')
+
+
+class ChartConsensus(models.Model):
+    """
+    Ratings of a chart with each reviewer's overall bias taken out, fit over
+    all reviews (see consensus.py)
+    """
+    chart = models.OneToOneField(Chart, primary_key=True)
+    clear_rating = models.FloatField(null=True)
+    hc_rating = models.FloatField(null=True)
+    exhc_rating = models.FloatField(null=True)
+    score_rating = models.FloatField(null=True)
+    review_count = models.IntegerField()
+    fitted_at = models.DateTimeField()
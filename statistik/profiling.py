@@ -0,0 +1,135 @@
+"""
+On-demand cProfile profiling of individual requests.
+
+Staff users can profile a single request by adding ?profile=true to the URL or
+by sending an X-Statistik-Profile header; a fraction of all requests can also
+be sampled via PROFILE_SAMPLE_RATE. Profiles are written to PROFILE_DIR and
+listed on the admin profiles page. If PROFILE_DIR isn't set the middleware
+removes itself from the chain, so there is no overhead when profiling is off.
+"""
+import cProfile
+import os
+import pstats
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_STATISTIK_PROFILE'
+PROFILE_EXTENSION = '.prof'
+
+# number of profiles to keep on disk before the oldest are deleted
+DEFAULT_PROFILE_KEEP = 200
+
+
+def _profile_filename(request):
+    """
+    Build a profile filename that encodes when and where the request was made
+    :param request: Request that was profiled
+    :rtype str:     Filename of format <epoch ms>__<method>__<path>.prof
+    """
+    path = re.sub(r'[^A-Za-z0-9_.-]', '~', request.path.strip('/')) or 'index'
+    return '%d__%s__%s%s' % (time.time() * 1000, request.method, path[:100],
+                             PROFILE_EXTENSION)
+
+
+def _wants_profile(request, sample_rate):
+    """
+    Check if a request should be profiled
+    :param request:             Request to check
+    :param float sample_rate:   Fraction of all requests to profile (0-1)
+    :rtype bool:
+    """
+    if request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER):
+        return request.user.is_authenticated() and request.user.is_staff
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class RequestProfilerMiddleware(object):
+    """
+    Profile requests with cProfile and dump the results into PROFILE_DIR.
+    Must come after AuthenticationMiddleware so request.user is available.
+    """
+
+    def __init__(self):
+        self.profile_dir = getattr(settings, 'PROFILE_DIR', None)
+        if not self.profile_dir:
+            raise MiddlewareNotUsed()
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.keep = getattr(settings, 'PROFILE_KEEP', DEFAULT_PROFILE_KEEP)
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    def process_request(self, request):
+        if _wants_profile(request, self.sample_rate):
+            request._profiler = cProfile.Profile()
+            request._profiler.enable()
+
+    def process_response(self, request, response):
+        profiler = getattr(request, '_profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        filename = _profile_filename(request)
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+        response['X-Statistik-Profile'] = filename
+        _prune_profiles(self.profile_dir, self.keep)
+        return response
+
+
+def _prune_profiles(profile_dir, keep):
+    """
+    Delete all but the newest profiles in a directory
+    :param str profile_dir: Directory containing profiles
+    :param int keep:        Number of profiles to keep
+    """
+    names = sorted(name for name in os.listdir(profile_dir)
+                   if name.endswith(PROFILE_EXTENSION))
+    for name in names[:-keep]:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except OSError:
+            # another worker may have pruned it already
+            pass
+
+
+def list_profiles(limit=20, top=15):
+    """
+    Summarize the most recent profiles for display on the admin profiles page
+    :param int limit:   Maximum number of profiles to summarize
+    :param int top:     Number of functions to list per profile
+    :rtype list:        List of dicts containing profile info, newest first
+    """
+    profile_dir = getattr(settings, 'PROFILE_DIR', None)
+    if not profile_dir or not os.path.isdir(profile_dir):
+        return []
+
+    names = sorted((name for name in os.listdir(profile_dir)
+                    if name.endswith(PROFILE_EXTENSION)), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            stats = pstats.Stats(os.path.join(profile_dir, name))
+        except (OSError, TypeError, EOFError):
+            continue
+        timestamp, method, path = name[:-len(PROFILE_EXTENSION)].split('__', 2)
+
+        # sort functions by cumulative time (index 3 of the stats tuple)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3],
+                           reverse=True)[:top]
+        profiles.append({
+            'name': name,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S',
+                                        time.gmtime(int(timestamp) / 1000)),
+            'request': '%s /%s' % (method, path.replace('~', '/')),
+            'total_time': round(stats.total_tt, 4),
+            'functions': [{
+                'function': pstats.func_std_string(func),
+                'calls': ncalls,
+                'total_time': round(tottime, 4),
+                'cumulative_time': round(cumtime, 4)
+            } for func, (_, ncalls, tottime, cumtime, _) in functions]
+        })
+    return profiles
@@ -0,0 +1,181 @@
+"""
+Slow query logging with controller/view attribution.
+
+The cursor wrappers here are installed by the statistik.backends.postgresql
+database backend. Queries slower than SLOW_QUERY_THRESHOLD_MS are tagged with
+the controller function and view that issued them, EXPLAINed, and written as
+JSON lines to the 'statistik.slow_queries' logger.
+"""
+import json
+import logging
+import re
+import sys
+import time
+
+from django.db.backends.utils import CursorWrapper, CursorDebugWrapper
+
+logger = logging.getLogger('statistik.slow_queries')
+
+CONTROLLER_MODULE = 'statistik.controller'
+VIEW_MODULE = 'statistik.views'
+ADMIN_MODULE_PREFIX = 'django.contrib.admin'
+
+
+def find_query_origin():
+    """
+    Walk up the stack to find which controller function and view issued a query
+    :rtype tuple:   (controller function name or None, view name or None)
+    """
+    controller = view = None
+    frame = sys._getframe(1)
+    while frame is not None and not (controller and view):
+        module = frame.f_globals.get('__name__', '')
+        if controller is None and module == CONTROLLER_MODULE:
+            controller = frame.f_code.co_name
+        if view is None:
+            if module == VIEW_MODULE:
+                view = frame.f_code.co_name
+            elif module.startswith(ADMIN_MODULE_PREFIX):
+                view = 'admin:' + frame.f_code.co_name
+        frame = frame.f_back
+    return controller, view
+
+
+def fingerprint_sql(sql):
+    """
+    Normalize a query so that queries differing only in literals or the number
+    of IN() placeholders are grouped together
+    :param str sql: SQL to normalize
+    :rtype str:     Normalized SQL
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _explain(db, sql, params):
+    """
+    Get the query plan for a statement without executing it
+    :param db:      DatabaseWrapper to run EXPLAIN with, on its own cursor so the
+                    explained query's cursor keeps its results
+    :rtype list:    The plan as returned by EXPLAIN (FORMAT JSON)
+    """
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN (ANALYZE off, FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    # psycopg2 only decodes json columns on newer versions
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def log_slow_query(db, sql, params, duration, many=False):
+    """
+    Write a slow query to the slow query log
+    :param db:              DatabaseWrapper that ran the query
+    :param str sql:         The SQL that was run
+    :param params:          Query parameters
+    :param float duration:  How long the query took in seconds
+    :param bool many:       True if the query was run with executemany
+    """
+    controller, view = find_query_origin()
+    entry = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'duration_ms': round(duration * 1000, 3),
+        'controller': controller,
+        'view': view,
+        'fingerprint': fingerprint_sql(sql),
+        'sql': sql,
+        'params': params if not many else None,
+        'plan': None
+    }
+
+    # EXPLAIN can fail (e.g. for DDL), which would break an open transaction,
+    # so only explain queries run in autocommit mode
+    if not many and not db.in_atomic_block:
+        try:
+            entry['plan'] = _explain(db, sql, params)
+        except Exception as e:
+            entry['plan_error'] = str(e)
+
+    logger.warning(json.dumps(entry, default=str))
+
+
+class SlowQueryMixin(object):
+    """
+    Times statements run through a Django cursor wrapper and logs slow ones
+    """
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        result = super(SlowQueryMixin, self).execute(sql, params)
+        duration = time.perf_counter() - start
+        if duration * 1000 >= self.db.slow_query_threshold_ms:
+            log_slow_query(self.db, sql, params, duration)
+        return result
+
+    def executemany(self, sql, param_list):
+        start = time.perf_counter()
+        result = super(SlowQueryMixin, self).executemany(sql, param_list)
+        duration = time.perf_counter() - start
+        if duration * 1000 >= self.db.slow_query_threshold_ms:
+            log_slow_query(self.db, sql, None, duration, many=True)
+        return result
+
+
+class SlowQueryCursorWrapper(SlowQueryMixin, CursorWrapper):
+    pass
+
+
+class SlowQueryCursorDebugWrapper(SlowQueryMixin, CursorDebugWrapper):
+    pass
+
+
+def read_slow_query_log(paths):
+    """
+    Parse slow query log entries, skipping any malformed lines
+    :param list paths:  Log files to read (rotated files included)
+    :rtype generator:   Generator of log entry dicts
+    """
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as log_file:
+                for line in log_file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def summarize_slow_queries(entries):
+    """
+    Group slow query log entries by fingerprint
+    :param entries: Iterable of log entry dicts
+    :rtype list:    List of dicts with per-fingerprint stats, worst total first
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'origins': set(),
+            'example': entry
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] > group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['example'] = entry
+        group['origins'].add('%s/%s' % (entry.get('view') or '-',
+                                        entry.get('controller') or '-'))
+
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
@@ -0,0 +1,20 @@
+"""
+Middleware for serving a read-only copy of the site (see settings_sqlite.py)
+"""
+from django.http import HttpResponseNotAllowed
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadOnlyMiddleware(object):
+    """
+    Reject requests that would write to the database
+    """
+
+    def process_request(self, request):
+        if request.method not in SAFE_METHODS:
+            return HttpResponseNotAllowed(SAFE_METHODS)
+        # Elo votes and review deletion still come in as GETs
+        if ('win' in request.GET and 'lose' in request.GET) or \
+                request.GET.get('delete') == 'true':
+            return HttpResponseNotAllowed(SAFE_METHODS)
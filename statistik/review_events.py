@@ -0,0 +1,125 @@
+"""
+Append-only log of review changes.
+
+Reviews are only written through save_review and remove_review, which record
+a ReviewEvent with the ratings before and after the change in the same
+transaction as the change itself. Anything derived from reviews (averages,
+technique tallies, caches, feeds) can then follow the log with
+consume_events, which hands each new batch of events to a handler and
+advances a named EventCursor, instead of rescanning Review.
+
+Event IDs come from a sequence, so a transaction that started later could
+commit a lower ID after a consumer has read past it. Writers take a
+transaction-level advisory lock before logging, so events commit in ID order.
+"""
+from django.db import transaction, connection
+from django.db.models import F
+
+from statistik.models import Chart, Review, ReviewEvent, EventCursor
+
+RATING_NAMES = ('clear_rating', 'hc_rating', 'exhc_rating', 'score_rating')
+BATCH_SIZE = 500
+
+# arbitrary key for pg_advisory_xact_lock
+EVENT_LOCK_ID = 0x5e7e
+
+
+def _lock_log():
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [EVENT_LOCK_ID])
+
+
+def _log(action, review, old=None, new=None):
+    event = ReviewEvent(review_id=review.id, chart_id=review.chart_id, user_id=review.user_id,
+                        action=action)
+    for name in RATING_NAMES:
+        setattr(event, 'old_' + name, getattr(old, name) if old else None)
+        setattr(event, 'new_' + name, getattr(new, name) if new else None)
+    event.old_characteristics = old.characteristics if old else None
+    event.new_characteristics = new.characteristics if new else None
+    _lock_log()
+    event.save()
+    # re-render the chart's cached table row (see templatetags/tables.py)
+    Chart.objects.filter(id=review.chart_id).update(
+        aggregate_version=F('aggregate_version') + 1)
+    return event
+
+
+def save_review(chart, user, data):
+    """
+    Create or update a user's review of a chart, logging the change
+    :param Chart chart:     The reviewed chart
+    :param User user:       The reviewer
+    :param dict data:       Review fields to set
+    :rtype Review:
+    """
+    with transaction.atomic():
+        old = Review.objects.select_for_update().filter(chart=chart, user=user).first()
+        if old is None:
+            review = Review.objects.create(chart=chart, user=user, **data)
+            _log(ReviewEvent.CREATED, review, new=review)
+            return review
+        review = Review.objects.get(pk=old.pk)
+        for key, value in data.items():
+            setattr(review, key, value)
+        review.save()
+        _log(ReviewEvent.UPDATED, review, old=old, new=review)
+        return review
+
+
+def remove_review(chart_id, user_id):
+    """
+    Delete a user's review of a chart, if there is one, logging the deletion
+    :param int chart_id:
+    :param int user_id:
+    :rtype bool:    Whether there was a review to delete
+    """
+    with transaction.atomic():
+        review = Review.objects.select_for_update().filter(chart_id=chart_id,
+                                                           user_id=user_id).first()
+        if review is None:
+            return False
+        review_id = review.id
+        review.delete()
+        review.id = review_id
+        _log(ReviewEvent.DELETED, review, old=review)
+        return True
+
+
+def rating_delta(event, name):
+    """
+    How an event changed a chart's sum and count of one rating
+    :param ReviewEvent event:
+    :param str name:    Rating name, e.g. 'clear_rating'
+    :rtype tuple:       (change in sum, change in number of ratings)
+    """
+    old = getattr(event, 'old_' + name)
+    new = getattr(event, 'new_' + name)
+    return (new or 0) - (old or 0), (new is not None) - (old is not None)
+
+
+def consume_events(name, handler, batch_size=BATCH_SIZE):
+    """
+    Pass the events a consumer hasn't seen yet to its handler, in batches.
+    Each batch is handled in the same transaction that advances the cursor,
+    so a handler writing to the database sees each event exactly once.
+    :param str name:            Name of the consumer's cursor
+    :param function handler:    Called with each list of ReviewEvents, oldest first
+    :param int batch_size:      Maximum number of events per batch
+    :rtype int:                 Number of events consumed
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            EventCursor.objects.get_or_create(name=name)
+            # concurrent consumers of the same cursor wait here
+            cursor = EventCursor.objects.select_for_update().get(name=name)
+            events = list(ReviewEvent.objects.filter(
+                id__gt=cursor.position).order_by('id')[:batch_size])
+            if not events:
+                return total
+            handler(events)
+            cursor.position = events[-1].id
+            cursor.save()
+        total += len(events)
@@ -0,0 +1,130 @@
+"""
+Compact row objects for chart lists, built straight from values_list() tuples
+"""
+from statistik.constants import VERSION_CHOICES, CHART_TYPE_CHOICES
+
+# display strings for every game, precomputed instead of get_FOO_display() per row
+VERSION_DISPLAY = {version: name for versions in VERSION_CHOICES.values()
+                   for version, name in versions}
+TYPE_DISPLAY = {chart_type: name for types in CHART_TYPE_CHOICES.values()
+                for chart_type, name in types}
+
+# order matches the tuples unpacked in build_chart_rows
+CHART_ROW_FIELDS = ('id', 'song__title', 'song__alt_title', 'note_count',
+                    'song__bpm_min', 'song__bpm_max', 'difficulty',
+                    'song__game_version', 'type', 'clickagain_nc', 'clickagain_hc',
+                    'aggregate_version')
+
+# min/max search params checked against each average rating
+RATING_FILTERS = [('min_nc', 'max_nc', 'avg_clear_rating'),
+                  ('min_hc', 'max_hc', 'avg_hc_rating'),
+                  ('min_exhc', 'max_exhc', 'avg_exhc_rating'),
+                  ('min_score', 'max_score', 'avg_score_rating')]
+
+
+class ChartRow(object):
+    """
+    Display data for one chart in a chart list
+    """
+    __slots__ = ('id', 'title', 'alt_title', 'note_count', 'bpm_min', 'bpm_max',
+                 'bpm', 'difficulty', 'difficulty_display',
+                 'avg_clear_rating', 'avg_hc_rating', 'avg_exhc_rating',
+                 'avg_score_rating', 'game_version', 'game_version_display',
+                 'type_display', 'clickagain_nc', 'clickagain_hc',
+                 'has_reviewed', 'reviews', 'aggregate_version')
+
+    # fields included in the JSON output, in the order they were historically
+    JSON_FIELDS = ('id', 'title', 'alt_title', 'note_count', 'bpm_min', 'bpm_max',
+                   'difficulty', 'avg_clear_rating', 'avg_hc_rating',
+                   'avg_exhc_rating', 'avg_score_rating', 'game_version',
+                   'game_version_display', 'type_display', 'clickagain_nc',
+                   'clickagain_hc')
+
+    def as_dict(self, include_reviews=False):
+        """
+        :param bool include_reviews:    Include reviews instead of has_reviewed
+        :rtype dict:                    Dict of this row's data for JSON output
+        """
+        data = {field: getattr(self, field) for field in self.JSON_FIELDS}
+        if include_reviews:
+            data['reviews'] = self.reviews
+        else:
+            data['has_reviewed'] = self.has_reviewed
+        return data
+
+
+def _passes_rating_filters(row, params):
+    """
+    Check a row's average ratings against min/max search params
+    :param ChartRow row:    Row to check
+    :param dict params:     Search params
+    :rtype bool:
+    """
+    for min_rating, max_rating, rating in RATING_FILTERS:
+        value = getattr(row, rating)
+        if params.get(min_rating):
+            if value == '' or float(params[min_rating]) > float(value):
+                return False
+        if params.get(max_rating):
+            if value == '' or float(params[max_rating]) < float(value):
+                return False
+    return True
+
+
+def build_chart_rows(rows, avg_ratings, include_reviews=False, params=None):
+    """
+    Turn chart tuples and their average ratings into display rows in one pass
+    :param rows:                Iterable of tuples in CHART_ROW_FIELDS order
+    :param dict avg_ratings:    Average ratings as returned by get_avg_ratings
+    :param bool include_reviews: Attach reviews instead of has_reviewed
+    :param dict params:         Extra search params to filter average ratings by
+    :rtype list:                List of ChartRow
+    """
+    chart_rows = []
+    append = chart_rows.append
+    for (chart_id, title, alt_title, note_count, bpm_min, bpm_max, difficulty,
+         game_version, chart_type, clickagain_nc, clickagain_hc, aggregate_version) in rows:
+        ratings = avg_ratings[chart_id]
+        row = ChartRow()
+
+        # use clickagain rating if we don't have a NC rating for this chart
+        clear_rating = ratings.get('clear_rating')
+        hc_rating = ratings.get('hc_rating')
+        row.clickagain_nc = row.clickagain_hc = False
+        if not clear_rating and clickagain_nc:
+            clear_rating = clickagain_nc
+            hc_rating = clickagain_hc
+            row.clickagain_nc = row.clickagain_hc = True
+
+        row.avg_clear_rating = str(clear_rating or "")
+        row.avg_hc_rating = str(hc_rating or "")
+        row.avg_exhc_rating = str(ratings.get('exhc_rating') or "")
+        row.avg_score_rating = str(ratings.get('score_rating') or "")
+
+        # need to filter by avg ratings here since it isn't stored in the database
+        if params and not _passes_rating_filters(row, params):
+            continue
+
+        row.id = chart_id
+        row.title = title
+        row.alt_title = alt_title or title
+        row.note_count = note_count or '--'
+        row.bpm_min = bpm_min or '--'
+        row.bpm_max = bpm_max or '--'
+        row.bpm = (str(row.bpm_min) if row.bpm_min == row.bpm_max
+                   else "{0} - {1}".format(row.bpm_min, row.bpm_max))
+        row.difficulty = difficulty
+        row.game_version = game_version
+        row.game_version_display = VERSION_DISPLAY.get(game_version, game_version)
+        row.type_display = TYPE_DISPLAY.get(chart_type, chart_type)
+        row.aggregate_version = aggregate_version
+
+        if include_reviews:
+            row.reviews = ratings.get('reviews')
+            row.has_reviewed = None
+        else:
+            row.reviews = None
+            row.has_reviewed = ratings.get('has_reviewed')
+        row.difficulty_display = str(difficulty) + ("★" if row.has_reviewed else "☆")
+        append(row)
+    return chart_rows
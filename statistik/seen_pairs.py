@@ -0,0 +1,139 @@
+"""
+Per-user record of the chart pairs a user has already voted on, so Elo
+matchmaking can avoid showing them the same matchup again.
+
+Each user's pairs for a rating type are kept in a Bloom filter persisted in
+EloSeenPairs. Chart IDs already identify the game and level, so one filter per
+(user, type) covers every level. A filter sized for 10k votes at a 1% false
+positive rate is about 12KB; a false positive only means a pair the user
+hasn't seen is skipped. Filters are built from EloReview the first time they
+are needed and rebuilt at twice the size when they fill up.
+"""
+import math
+
+from django.db import transaction, IntegrityError
+
+from statistik.models import EloReview, EloSeenPairs, PendingEloVote
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 256
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(value):
+    # splitmix64 finalizer
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def pair_key(chart1_id, chart2_id):
+    """
+    :rtype int: Key of an unordered pair of charts
+    """
+    if chart1_id > chart2_id:
+        chart1_id, chart2_id = chart2_id, chart1_id
+    return (chart1_id << 32) | chart2_id
+
+
+class BloomFilter(object):
+    """
+    Bloom filter over chart pairs
+    """
+    __slots__ = ('bits', 'size', 'hashes')
+
+    def __init__(self, capacity, bits=None):
+        """
+        :param int capacity:    Number of pairs to size the filter for
+        :param bits:            Existing filter contents, or None for an empty filter
+        """
+        self.size = max(64, int(math.ceil(-capacity * math.log(FALSE_POSITIVE_RATE) /
+                                          math.log(2) ** 2)))
+        self.size += -self.size % 8
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray(bits) if bits is not None else bytearray(self.size // 8)
+
+    def _positions(self, chart1_id, chart2_id):
+        # double hashing: positions h1 + i * h2
+        hashed = _mix64(pair_key(chart1_id, chart2_id))
+        first, second = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, chart1_id, chart2_id):
+        for position in self._positions(chart1_id, chart2_id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, pair):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(*pair))
+
+
+def _voted_pairs(user_id, rate_type):
+    for model in (EloReview, PendingEloVote):
+        for pair in model.objects.filter(created_by=user_id, type=rate_type).values_list(
+                'first_id', 'second_id').iterator():
+            yield pair
+
+
+def _build(record, capacity):
+    bloom = BloomFilter(capacity)
+    count = 0
+    for pair in _voted_pairs(record.user_id, record.type):
+        bloom.add(*pair)
+        count += 1
+    record.capacity = capacity
+    record.count = count
+    record.bits = bytes(bloom.bits)
+    return bloom
+
+
+def get_seen_pairs(user, rate_type):
+    """
+    Load a user's seen pairs, building them from their votes if needed
+    :param User user:       The user
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :rtype BloomFilter:     Filter to test (chart1_id, chart2_id) pairs against
+    """
+    record = EloSeenPairs.objects.filter(user=user, type=rate_type).first()
+    if record is None:
+        record = EloSeenPairs(user=user, type=rate_type)
+        bloom = _build(record, MIN_CAPACITY)
+        while record.count > record.capacity:
+            bloom = _build(record, record.capacity * 2)
+        try:
+            with transaction.atomic():
+                record.save()
+        except IntegrityError:
+            # built concurrently by another request
+            pass
+        return bloom
+    return BloomFilter(record.capacity, record.bits)
+
+
+def mark_seen(user, rate_type, pairs):
+    """
+    Add newly voted pairs to a user's seen pairs
+    :param User user:       The user who voted
+    :param int rate_type:   Rating type (refer to Chart model for options)
+    :param list pairs:      (chart1_id, chart2_id) tuples
+    """
+    if not user.is_authenticated():
+        return
+    with transaction.atomic():
+        record = EloSeenPairs.objects.select_for_update().filter(user=user,
+                                                                 type=rate_type).first()
+        if record is None:
+            # built from the votes, which include these ones
+            get_seen_pairs(user, rate_type)
+            return
+        record.count += len(pairs)
+        if record.count > record.capacity:
+            _build(record, record.capacity * 2)
+        else:
+            bloom = BloomFilter(record.capacity, record.bits)
+            for pair in pairs:
+                bloom.add(*pair)
+            record.bits = bytes(bloom.bits)
+        record.save()
@@ -0,0 +1,167 @@
+"""
+Compact review serialization shared by chart pages, user pages and the JSON API.
+
+Reviews are fetched as values_list() tuples (with the reviewer's profile and
+the chart joined in) and turned into ReviewRow objects, which templates can
+read directly and encode_json can write out without building a dict per review.
+Only the columns needed for the requested fields are fetched.
+"""
+import json
+
+from django.db.models import F, IntegerField, ExpressionWrapper
+
+from statistik.constants import PLAYSIDE_CHOICES
+from statistik.labels import get_label_table, format_characteristics_mask, format_options
+from statistik.rows import TYPE_DISPLAY
+
+PLAYSIDE_DISPLAY = dict(PLAYSIDE_CHOICES)
+
+# the columns each output field is built from
+FIELD_COLUMNS = {
+    'chart_id': ('chart_id',),
+    'user_id': ('user_id',),
+    'user': ('user__username',),
+    'playside': ('user__userprofile__play_side',),
+    'title': ('chart__song__title',),
+    'type_display': ('chart__type',),
+    'difficulty': ('chart__difficulty',),
+    'text': ('text',),
+    'clear_rating': ('clear_rating',),
+    'hc_rating': ('hc_rating',),
+    'exhc_rating': ('exhc_rating',),
+    'score_rating': ('score_rating',),
+    'characteristics': ('characteristics_mask', 'difficulty_spike', 'best_techniques_mask'),
+    'recommended_options': ('recommended_options',)
+}
+
+# fields used by each of the review listings
+CHART_PAGE_FIELDS = ('user', 'user_id', 'playside', 'text', 'clear_rating', 'hc_rating',
+                     'exhc_rating', 'score_rating', 'characteristics', 'recommended_options')
+USER_PAGE_FIELDS = ('title', 'text', 'chart_id', 'type_display', 'difficulty',
+                    'clear_rating', 'hc_rating', 'exhc_rating', 'score_rating',
+                    'characteristics', 'recommended_options')
+JSON_FIELDS = CHART_PAGE_FIELDS
+
+# technique masks are fetched as raw ints rather than decoded to lists, so
+# highlighting the reviewer's best techniques is a single AND
+MASK_ANNOTATIONS = {
+    'characteristics_mask': ExpressionWrapper(F('characteristics'),
+                                              output_field=IntegerField()),
+    'best_techniques_mask': ExpressionWrapper(F('user__userprofile__best_techniques'),
+                                              output_field=IntegerField())
+}
+
+
+class ReviewRow(object):
+    """
+    Display data for one review
+    """
+    __slots__ = ('game', 'fields') + tuple(FIELD_COLUMNS)
+
+    def json_items(self):
+        """
+        :rtype generator:   (key, value) pairs of the selected fields, for encode_json
+        """
+        for field in self.fields:
+            yield field, getattr(self, field)
+
+
+def parse_fields(requested, default=JSON_FIELDS):
+    """
+    Parse a comma separated list of review fields, ignoring unknown ones
+    :param str requested:   Comma separated field names, or None for the default
+    :param tuple default:   Fields to use if none are requested
+    :rtype tuple:
+    """
+    if not requested:
+        return default
+    return tuple(field for field in requested.split(',') if field in FIELD_COLUMNS)
+
+
+def serialize_reviews(reviews, fields=CHART_PAGE_FIELDS):
+    """
+    Fetch and format reviews
+    :param Queryset reviews:    Queryset of Review objects to serialize
+    :param tuple fields:        Fields to include in each ReviewRow
+    :rtype list:                List of ReviewRow
+    """
+    columns = ['chart__song__game']
+    for field in fields:
+        columns.extend(column for column in FIELD_COLUMNS[field] if column not in columns)
+    position = {column: i for i, column in enumerate(columns)}
+    annotations = {column: MASK_ANNOTATIONS[column] for column in columns
+                   if column in MASK_ANNOTATIONS}
+    if annotations:
+        reviews = reviews.annotate(**annotations)
+
+    # plain fields are copied straight from a single column
+    plain = [(field, position[FIELD_COLUMNS[field][0]]) for field in fields
+             if field in ('chart_id', 'user_id', 'user', 'title', 'difficulty', 'text',
+                          'clear_rating', 'hc_rating', 'exhc_rating', 'score_rating')]
+    playside = position.get('user__userprofile__play_side')
+    chart_type = position.get('chart__type')
+    options = position.get('recommended_options')
+    characteristics = position.get('characteristics_mask')
+    if characteristics is not None:
+        spike = position['difficulty_spike']
+        best_techniques = position['best_techniques_mask']
+
+    labels = {}
+    rows = []
+    for values in reviews.values_list(*columns):
+        row = ReviewRow()
+        row.fields = fields
+        row.game = game = values[0]
+        table = labels.get(game)
+        if table is None:
+            table = labels[game] = get_label_table(game)
+
+        for field, i in plain:
+            setattr(row, field, values[i])
+        if playside is not None:
+            row.playside = PLAYSIDE_DISPLAY.get(values[playside])
+        if chart_type is not None:
+            row.type_display = TYPE_DISPLAY.get(values[chart_type])
+        if characteristics is not None:
+            row.characteristics = format_characteristics_mask(
+                table, values[characteristics], values[best_techniques], values[spike])
+        if options is not None:
+            row.recommended_options = format_options(table, values[options])
+        rows.append(row)
+    return rows
+
+
+def encode_json(obj, indent=None, level=0):
+    """
+    Encode JSON like json.dumps(obj, indent=indent, ensure_ascii=False), but
+    also accept row objects with a json_items() method so they don't need to
+    be converted to dicts first.
+    :param obj:         Object to encode
+    :param int indent:  Number of spaces to indent by, or None for one line
+    :rtype str:
+    """
+    if hasattr(obj, 'json_items'):
+        obj = obj.json_items()
+    elif isinstance(obj, dict):
+        obj = obj.items()
+    elif not isinstance(obj, (list, tuple)):
+        return json.dumps(obj, ensure_ascii=False)
+    else:
+        if not obj:
+            return '[]'
+        return _encode_container([encode_json(item, indent, level + 1) for item in obj],
+                                 '[', ']', indent, level)
+
+    items = ['%s: %s' % (json.dumps(str(key), ensure_ascii=False),
+                         encode_json(value, indent, level + 1))
+             for key, value in obj]
+    if not items:
+        return '{}'
+    return _encode_container(items, '{', '}', indent, level)
+
+
+def _encode_container(items, start, end, indent, level):
+    if indent is None:
+        return start + ', '.join(items) + end
+    inner = '\n' + ' ' * (indent * (level + 1))
+    return start + inner + (',' + inner).join(items) + '\n' + ' ' * (indent * level) + end
@@ -55,6 +55,8 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.locale.LocaleMiddleware',
+    'statistik.loaders.IdentityMapMiddleware',
+    'statistik.profiling.RequestProfilerMiddleware',
 )
 
 ROOT_URLCONF = 'statistik.urls'
@@ -74,6 +76,14 @@ TEMPLATES = [
             ],
         },
     },
+    {
+        # only used for the table partials, see templatetags/tables.py
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'templates', 'jinja2')],
+        'OPTIONS': {
+            'environment': 'statistik.jinja2_env.environment',
+        },
+    },
 ]
 
 WSGI_APPLICATION = 'statistik.wsgi.application'
@@ -131,3 +141,76 @@ EMAIL_BACKEND = "sgbackend.SendGridBackend"
 SENDGRID_API_KEY = os.environ.get('SENDGRID_KEY')
 
 ADMINS = ('Ben', 'ben.green@inventati.org')
+
+# How Elo matchups are picked: 'random' pairs of charts within 50 points, or
+# 'information' to favor pairs whose votes say the most (see matchmaking.py).
+ELO_MATCHUP_STRATEGY = os.environ.get('STATISTIK_ELO_MATCHUP_STRATEGY', 'information')
+
+# Queue Elo votes and apply them in batches in the background instead of
+# while the voter waits (see elo_queue.py). Votes are applied within
+# ELO_WRITE_BEHIND_MAX_STALENESS seconds and flushed on shutdown.
+ELO_WRITE_BEHIND = bool(os.environ.get('STATISTIK_ELO_WRITE_BEHIND'))
+ELO_WRITE_BEHIND_INTERVAL = 1.0
+ELO_WRITE_BEHIND_MAX_STALENESS = 10.0
+
+# Serve Elo rankings and average ratings from Postgres materialized views,
+# refreshed at most once per interval (seconds) after writes. See matviews.py.
+USE_MATERIALIZED_VIEWS = bool(os.environ.get('STATISTIK_MATVIEWS'))
+MATERIALIZED_VIEW_REFRESH_INTERVAL = 10
+
+# Warm the caches of the most requested pages when a gunicorn worker starts
+# (see gunicorn.conf.py and warmup.py). Set STATISTIK_CACHE_DIR to share
+# caches between workers, and so with the warm_caches command.
+WARM_CACHES_ON_START = bool(os.environ.get('STATISTIK_WARM_CACHES'))
+WARM_CACHES_PAGES = 20
+WARM_CACHES_THREADS = 4
+# chart lists are only cached when invalidate_chart_data reaches every worker
+SHARED_CACHE = bool(os.environ.get('STATISTIK_CACHE_DIR'))
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['STATISTIK_CACHE_DIR'],
+        }
+    }
+
+# Render the large ratings, Elo and user tables with 'jinja2' or 'django'
+TABLE_TEMPLATE_ENGINE = os.environ.get('STATISTIK_TABLE_ENGINE', 'django')
+
+# On-demand request profiling, disabled unless a profile directory is set.
+# Staff can profile a request with ?profile=true; a fraction of all requests
+# can be sampled with STATISTIK_PROFILE_SAMPLE_RATE.
+PROFILE_DIR = os.environ.get('STATISTIK_PROFILE_DIR')
+PROFILE_SAMPLE_RATE = float(os.environ.get('STATISTIK_PROFILE_SAMPLE_RATE', 0))
+
+# Slow query logging, disabled unless a threshold is set. Slow queries are
+# attributed to the controller function/view that issued them, EXPLAINed, and
+# written as JSON lines to a rotating log; summarize with slow_query_report.
+SLOW_QUERY_THRESHOLD_MS = os.environ.get('STATISTIK_SLOW_QUERY_MS')
+SLOW_QUERY_LOG = os.environ.get('STATISTIK_SLOW_QUERY_LOG',
+                                os.path.join(BASE_DIR, 'slow_queries.log'))
+if SLOW_QUERY_THRESHOLD_MS:
+    DATABASES['default']['ENGINE'] = 'statistik.backends.postgresql'
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'json_lines': {'format': '%(message)s'}
+        },
+        'handlers': {
+            'slow_queries': {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': SLOW_QUERY_LOG,
+                'maxBytes': 10 * 1024 * 1024,
+                'backupCount': 5,
+                'formatter': 'json_lines'
+            }
+        },
+        'loggers': {
+            'statistik.slow_queries': {
+                'handlers': ['slow_queries'],
+                'level': 'WARNING',
+                'propagate': False
+            }
+        }
+    }
@@ -0,0 +1,32 @@
+"""
+Read-only settings for serving a snapshot made with `manage.py export_sqlite`.
+
+Ratings, Elo lists, chart and user pages are served from the local SQLite
+file, opened read-only, so no request needs a network database. Anything that
+would write (logging in, reviewing, Elo voting) is rejected.
+
+    STATISTIK_SQLITE_PATH=/srv/statistik.sqlite3 \
+        DJANGO_SETTINGS_MODULE=statistik.settings_sqlite gunicorn statistik.wsgi
+"""
+from statistik.settings import *
+
+SQLITE_PATH = os.environ.get('STATISTIK_SQLITE_PATH',
+                             os.path.join(BASE_DIR, 'statistik.sqlite3'))
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'file:%s?mode=ro' % SQLITE_PATH,
+        'OPTIONS': {'uri': True}
+    }
+}
+
+# there's no session table in the snapshot
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+# nowhere to store request counts for cache warm-up
+RECORD_PAGE_ACCESS = False
+
+MIDDLEWARE_CLASSES = ('statistik.readonly.ReadOnlyMiddleware',) + MIDDLEWARE_CLASSES
+
+ALLOWED_HOSTS = os.environ.get('STATISTIK_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)).split(',')
@@ -0,0 +1,118 @@
+"""
+Jobs that can be queued from the staff jobs page or by other code, and run by
+the run_worker command (see jobs.py)
+"""
+import os
+import runpy
+
+import elo
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Case, When, FloatField
+
+from statistik.bradley_terry import fit_level, save_ratings, RATING_COLUMNS
+from statistik.consensus import fit_game, save_consensus
+from statistik.constants import GAMES
+from statistik.controller import invalidate_chart_data
+from statistik.jobs import job, set_progress
+from statistik.matchmaking import invalidate_level_states
+from statistik.matviews import schedule_refresh
+from statistik.models import Chart, EloReview
+
+MISC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'misc')
+# catalog import scripts in misc/ that can be run as jobs
+CATALOG_SCRIPTS = ('import_music_csv.py', 'import_chart_csv.py', 'import_ddr_json.py',
+                   'import_clickagain_ratings.py')
+
+
+@job(max_attempts=1)
+def replay_elo(batch_size=500):
+    """
+    Recompute every chart's Elo ratings by replaying all Elo votes in order,
+    like misc/repeat_elo_ratings.py but in memory with one update per batch of charts
+    """
+    with transaction.atomic():
+        # block voting until the replayed ratings are saved
+        chart_ids = list(Chart.objects.select_for_update().order_by('id').values_list(
+            'id', flat=True))
+        ratings = {chart_id: [1000.0, 1000.0] for chart_id in chart_ids}
+        votes = EloReview.objects.order_by('id').values_list('first_id', 'second_id', 'drawn',
+                                                             'type')
+        total = votes.count()
+        # same rating as elo_rate_charts
+        elo_env = elo.Elo(k_factor=20)
+        for i, (first, second, drawn, rate_type) in enumerate(votes.iterator()):
+            column = 1 if rate_type else 0
+            first, second = ratings[first], ratings[second]
+            first[column], second[column] = elo_env.rate_1vs1(first[column], second[column],
+                                                              drawn=drawn)
+            if i % 10000 == 0:
+                set_progress(0.8 * i / total, 'Replayed %d of %d votes' % (i, total))
+
+        for start in range(0, len(chart_ids), batch_size):
+            batch = chart_ids[start:start + batch_size]
+            Chart.objects.filter(id__in=batch).update(
+                elo_rating=Case(*[When(id=chart_id, then=ratings[chart_id][0])
+                                  for chart_id in batch], output_field=FloatField()),
+                elo_rating_hc=Case(*[When(id=chart_id, then=ratings[chart_id][1])
+                                     for chart_id in batch], output_field=FloatField()))
+            set_progress(0.8 + 0.2 * start / len(chart_ids), 'Saving ratings')
+
+    # rankings and matchmaking would otherwise keep showing the old ratings
+    invalidate_level_states()
+    schedule_refresh()
+
+
+@job()
+def fit_bradley_terry(game='IIDX'):
+    """
+    Refit the Bradley-Terry ratings of every level of a game
+    """
+    game = GAMES[game]
+    levels = sorted(set(Chart.objects.filter(song__game=game).values_list('difficulty',
+                                                                          flat=True)))
+    steps = [(level, rate_type) for level in levels for rate_type in sorted(RATING_COLUMNS)]
+    for i, (level, rate_type) in enumerate(steps):
+        set_progress(i / len(steps), 'Fitting level %d type %d' % (level, rate_type))
+        save_ratings(*fit_level(game, level, rate_type), rate_type=rate_type)
+
+
+@job()
+def fit_consensus(game='IIDX'):
+    """
+    Refit a game's reviewer bias-corrected consensus ratings
+    """
+    set_progress(0, 'Fitting')
+    chart_ids, consensus, review_counts = fit_game(GAMES[game])
+    set_progress(0.5, 'Saving %d charts' % len(chart_ids))
+    save_consensus(GAMES[game], chart_ids, consensus, review_counts)
+    invalidate_chart_data()
+
+
+@job()
+def snapshot_elo():
+    call_command('snapshot_elo')
+
+
+@job()
+def refresh_matviews():
+    call_command('refresh_matviews')
+
+
+@job(max_attempts=1)
+def import_catalog(script):
+    """
+    Run one of the catalog import scripts in misc/
+    :param str script:  File name of the script (from CATALOG_SCRIPTS)
+    """
+    if script not in CATALOG_SCRIPTS:
+        raise ValueError('Not a catalog import script: %r' % script)
+    # the scripts read their data relative to the repository root, but the pool
+    # process goes on to run other jobs
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(MISC_DIRECTORY))
+    try:
+        runpy.run_path(os.path.join(MISC_DIRECTORY, script), run_name='__main__')
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,97 @@
+"""
+{% table %} renders one of the large table partials in templates/tables/,
+with Jinja2 (templates/jinja2/tables/) when TABLE_TEMPLATE_ENGINE is 'jinja2'.
+The two versions of each partial render byte-identical output.
+
+The ratings tables render their rows with {% chart_rows %} (chart_rows() in
+Jinja2), which caches each rendered row by chart ID, the chart's
+aggregate_version, the language and whether it shows consensus ratings
+(see consensus.py) instead of averages, so a page only renders the rows whose
+averages changed since it was last rendered. The difficulty column differs per
+user (★ on reviewed charts), so rows are cached with a placeholder there and
+each user's difficulty is filled in on output. Other chart fields aren't
+versioned; edits to them show up after ROW_CACHE_TTL, or bump
+ROW_TEMPLATE_VERSION along with changes to the row templates.
+"""
+import copy
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template import engines, Context
+from django.utils import translation
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+ROW_TEMPLATE_VERSION = 1
+ROW_CACHE_TTL = 24 * 60 * 60
+# stands in for difficulty_display in cached rows
+DIFFICULTY_PLACEHOLDER = '\x00difficulty\x00'
+
+
+@register.simple_tag(takes_context=True)
+def table(context, name):
+    """
+    :param Context context: Context of the including template
+    :param str name:        Partial to render, e.g. 'ratings_iidx'
+    :rtype str:
+    """
+    template_name = 'tables/%s.html' % name
+    if getattr(settings, 'TABLE_TEMPLATE_ENGINE', 'django') == 'jinja2':
+        return mark_safe(engines['jinja2'].get_template(template_name).render(
+            context.flatten(), context.get('request')))
+    return context.template.engine.get_template(template_name).render(context)
+
+
+def render_chart_rows(charts, render_row, consensus=False):
+    """
+    Render table rows, reusing cached renderings of charts whose
+    aggregate_version hasn't changed
+    :param list charts:             ChartRows to render
+    :param function render_row:     Renders one ChartRow
+    :param bool consensus:          Whether the rows show consensus ratings
+    :rtype str:
+    """
+    prefix = 'chart_row:%d:%s:%s' % (ROW_TEMPLATE_VERSION, translation.get_language(),
+                                     'consensus' if consensus else 'average')
+    keys = ['%s:%d:%d' % (prefix, chart.id, chart.aggregate_version) for chart in charts]
+    cached = cache.get_many(keys)
+    missing = {}
+    output = []
+    for key, chart in zip(keys, charts):
+        parts = cached.get(key)
+        if parts is None:
+            placeholder_chart = copy.copy(chart)
+            placeholder_chart.difficulty_display = DIFFICULTY_PLACEHOLDER
+            parts = missing[key] = render_row(placeholder_chart).split(DIFFICULTY_PLACEHOLDER)
+        output.append(conditional_escape(chart.difficulty_display).join(parts))
+    if missing:
+        cache.set_many(missing, ROW_CACHE_TTL)
+    return mark_safe(''.join(output))
+
+
+@register.simple_tag(takes_context=True)
+def chart_rows(context, name, charts, consensus=False):
+    """
+    :param Context context: Context of the including template
+    :param str name:        Row partial to render for each chart, e.g. 'ratings_iidx_row'
+    :param list charts:     ChartRows
+    :param bool consensus:  Whether the rows show consensus ratings
+    :rtype str:
+    """
+    row_template = context.template.engine.get_template('tables/%s.html' % name)
+    return render_chart_rows(charts, lambda chart: row_template.render(Context(
+        {'chart': chart}, autoescape=context.autoescape, use_l10n=context.use_l10n,
+        use_tz=context.use_tz)), consensus)
+
+
+def jinja2_chart_rows(name, charts, consensus=False):
+    """
+    chart_rows() for the Jinja2 table partials
+    :rtype str:
+    """
+    row_template = engines['jinja2'].env.get_template('tables/%s.html' % name)
+    return render_chart_rows(charts, lambda chart: row_template.render(chart=chart),
+                             consensus)
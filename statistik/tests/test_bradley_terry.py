@@ -0,0 +1,32 @@
+import numpy as np
+from django.test import TestCase
+
+from statistik.bradley_terry import fit_bradley_terry
+
+
+class BradleyTerryTest(TestCase):
+    def test_recovers_strength_order(self):
+        rng = np.random.RandomState(0)
+        true_strength = np.array([-1.0, 0.0, 0.5, 2.0])
+        first = rng.randint(0, 4, 4000)
+        second = (first + rng.randint(1, 4, 4000)) % 4
+        p_first = 1 / (1 + np.exp(true_strength[second] - true_strength[first]))
+        first_won = rng.rand(4000) < p_first
+        winners = np.where(first_won, first, second)
+        losers = np.where(first_won, second, first)
+
+        strength, error = fit_bradley_terry(winners, losers, np.zeros(4000, dtype=bool), 4)
+
+        self.assertEqual(list(np.argsort(strength)), [0, 1, 2, 3])
+        np.testing.assert_allclose(strength - strength.mean(),
+                                   true_strength - true_strength.mean(), atol=0.15)
+        self.assertTrue(np.all(error < 0.1))
+
+    def test_unbeaten_and_unplayed_items_stay_finite(self):
+        # item 0 always wins, item 2 never plays
+        strength, error = fit_bradley_terry([0, 0, 0], [1, 1, 1], [False, False, True], 3)
+
+        self.assertTrue(np.all(np.isfinite(strength)))
+        self.assertGreater(strength[0], strength[1])
+        self.assertAlmostEqual(strength[2], 0, places=4)
+        self.assertGreater(error[2], error[0])
@@ -0,0 +1,68 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from statistik.calibration import (compute_calibration, get_user_calibration,
+                                   invalidate_calibration)
+from statistik.constants import IIDX
+from statistik.models import Song, Chart, Review
+
+
+class CalibrationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other, third = [User.objects.create_user(name, password='pass')
+                                      for name in ('reviewer', 'other', 'third')]
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        charts = [Chart.objects.create(song=song, type=chart_type, difficulty=12,
+                                       note_count=1000) for chart_type in range(3)]
+        # others average 11.0 on both charts, the last chart only has this user's review
+        Review.objects.create(chart=charts[0], user=cls.user, clear_rating=12.0,
+                              characteristics=[0])
+        Review.objects.create(chart=charts[0], user=cls.other, clear_rating=11.0)
+        Review.objects.create(chart=charts[1], user=cls.user, clear_rating=11.5,
+                              characteristics=[0, 1])
+        Review.objects.create(chart=charts[1], user=cls.other, clear_rating=11.0)
+        Review.objects.create(chart=charts[1], user=third, clear_rating=11.0)
+        Review.objects.create(chart=charts[2], user=cls.user, clear_rating=10.0)
+        cls.charts = charts
+
+    def setUp(self):
+        cache.clear()
+
+    def test_offsets_from_chart_averages(self):
+        calibration = compute_calibration(self.user.id)[IIDX]
+        self.assertEqual(calibration['reviews'], 2)
+        clear, hc = calibration['ratings'][:2]
+        self.assertEqual((clear['rating'], clear['count'], clear['offset'], clear['mae']),
+                         ('clear_rating', 2, 0.75, 0.75))
+        self.assertEqual((hc['count'], hc['offset']), (0, None))
+        techniques = {technique['technique']: technique
+                      for technique in calibration['techniques']}
+        self.assertEqual(sorted(techniques), [0, 1])
+        self.assertEqual(techniques[0]['offsets'][0], 0.75)
+        self.assertEqual((techniques[1]['count'], techniques[1]['offsets'][0]), (1, 0.5))
+
+    def test_own_rating_is_left_out_of_the_average(self):
+        # the other reviewer is a level below on the first chart, not half a level
+        Review.objects.filter(chart=self.charts[1], user=self.other).delete()
+        clear = compute_calibration(self.other.id)[IIDX]['ratings'][0]
+        self.assertEqual((clear['count'], clear['offset'], clear['mae']), (1, -1.0, 1.0))
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(get_user_calibration(self.user.id)[IIDX]['reviews'], 2)
+        Review.objects.filter(chart=self.charts[0], user=self.user).delete()
+        self.assertEqual(get_user_calibration(self.user.id)[IIDX]['reviews'], 2)
+        invalidate_calibration(self.user.id)
+        self.assertEqual(get_user_calibration(self.user.id)[IIDX]['reviews'], 1)
+
+    def test_user_page_json(self):
+        response = self.client.get(reverse('users', kwargs={'user_id': self.user.id}),
+                                   {'json': 'true'})
+        calibration = json.loads(response.content.decode())['calibration']
+        self.assertEqual(calibration['IIDX']['ratings'][0]['offset'], 0.75)
+        self.assertEqual(calibration['IIDX']['techniques'][0]['label'], 'Scratching')
@@ -0,0 +1,63 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from statistik.consensus import fit_additive, fit_game, save_consensus
+from statistik.constants import IIDX
+from statistik.models import Song, Chart, Review, ChartConsensus
+
+
+class FitAdditiveTest(TestCase):
+    def test_recovers_difficulties_of_biased_reviewers(self):
+        difficulties = np.array([10.0, 11.0, 11.5, 12.5])
+        offsets = np.array([1.0, 0.0, -1.0])
+        users, charts = [a.ravel() for a in np.meshgrid(range(3), range(4), indexing='ij')]
+
+        fitted, fitted_offsets = fit_additive(users, charts,
+                                              difficulties[charts] + offsets[users], 3, 4)
+
+        np.testing.assert_allclose(fitted, difficulties, atol=1e-3)
+        # shrunk towards 0 by the prior, but in order
+        self.assertEqual(list(np.argsort(fitted_offsets)), [2, 1, 0])
+
+
+class ConsensusTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        harsh, other = [User.objects.create_user(name, password='pass')
+                        for name in ('harsh', 'other')]
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        cls.charts = [Chart.objects.create(song=song, type=chart_type, difficulty=12,
+                                           note_count=1000) for chart_type in range(3)]
+        for chart, rating in zip(cls.charts, (11.0, 11.0, 12.0)):
+            Review.objects.create(chart=chart, user=harsh, clear_rating=rating)
+        for chart in cls.charts[:2]:
+            Review.objects.create(chart=chart, user=other, clear_rating=10.0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fit_and_save(self):
+        chart_ids, consensus, review_counts = fit_game(IIDX)
+        self.assertEqual(list(chart_ids), [chart.id for chart in self.charts])
+        self.assertEqual(list(review_counts), [2, 2, 1])
+        # the harsh reviewer's offset is taken out of the chart only they reviewed
+        self.assertAlmostEqual(consensus[2, 0], 11.8, places=2)
+        self.assertTrue(np.isnan(consensus[0, 1]))
+
+        self.assertEqual(save_consensus(IIDX, chart_ids, consensus, review_counts), 3)
+        self.assertAlmostEqual(ChartConsensus.objects.get(chart=self.charts[2]).clear_rating,
+                               11.8, places=2)
+        self.assertEqual(Chart.objects.get(id=self.charts[2].id).aggregate_version, 1)
+        # nothing to re-render when a refit doesn't change anything
+        self.assertEqual(save_consensus(IIDX, chart_ids, consensus, review_counts), 0)
+
+    def test_ratings_page_shows_consensus(self):
+        save_consensus(IIDX, *fit_game(IIDX))
+        url = reverse('ratings', kwargs={'game': 'IIDX'})
+        self.assertNotContains(self.client.get(url, {'difficulty': 12}), '11.8')
+        self.assertContains(self.client.get(url, {'difficulty': 12, 'consensus': 'true'}),
+                            '11.8')
@@ -0,0 +1,75 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.matchmaking import clear_level_states
+from statistik.models import Song, Chart, EloReview
+
+
+class EloBatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('voter', password='pass')
+        cls.charts = []
+        for i in range(4):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000))
+
+    def setUp(self):
+        clear_level_states()
+        self.client.login(username='voter', password='pass')
+
+    def test_matchups_are_distinct_pairs(self):
+        response = self.client.get(reverse('elo_matchups', kwargs={'game': 'IIDX'}),
+                                   {'level': 12, 'count': 4})
+
+        matchups = json.loads(response.content.decode())['matchups']
+        pairs = [frozenset(chart['id'] for chart in matchup) for matchup in matchups]
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertTrue(all(len(pair) == 2 for pair in pairs))
+
+    def test_matchup_parameters_are_checked(self):
+        url = reverse('elo_matchups', kwargs={'game': 'IIDX'})
+        for params in ({'count': 'abc'}, {'type': 'hc'}, {'level': 'twelve'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        response = self.client.get(url, {'level': 12, 'count': -5})
+        self.assertEqual(len(json.loads(response.content.decode())['matchups']), 1)
+
+    def test_votes_are_applied_in_one_batch(self):
+        first, second, third = [chart.id for chart in self.charts[:3]]
+        votes = [{'first': first, 'second': second, 'result': 'first'},
+                 {'first': second, 'second': third, 'result': 'second'},
+                 {'first': first, 'second': third, 'result': 'pass'},
+                 {'first': first, 'second': third, 'result': 'draw'}]
+
+        response = self.client.post(reverse('elo_votes', kwargs={'game': 'IIDX'}),
+                                    {'votes': json.dumps(votes), 'type': 0})
+
+        self.assertEqual(json.loads(response.content.decode()), {'applied': 3})
+        self.assertEqual(list(EloReview.objects.order_by('id').values_list(
+            'first_id', 'second_id', 'drawn')),
+            [(first, second, False), (third, second, False), (first, third, True)])
+        self.assertGreater(Chart.objects.get(id=first).elo_rating, 1000)
+
+    def test_invalid_batches_are_rejected(self):
+        url = reverse('elo_votes', kwargs={'game': 'IIDX'})
+        for votes in ([{'first': self.charts[0].id, 'second': self.charts[0].id,
+                        'result': 'first'}],
+                      [{'first': self.charts[0].id, 'second': 0, 'result': 'first'}],
+                      [{'first': self.charts[0].id, 'second': self.charts[1].id,
+                        'result': 'maybe'}]):
+            response = self.client.post(url, {'votes': json.dumps(votes)})
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(EloReview.objects.exists())
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.post(reverse('elo_votes', kwargs={'game': 'IIDX'}),
+                                    {'votes': '[]'})
+        self.assertEqual(response.status_code, 403)
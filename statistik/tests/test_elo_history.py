@@ -0,0 +1,83 @@
+import datetime
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from statistik.constants import IIDX
+from statistik.controller import elo_rate_charts
+from statistik.elo_history import (encode_snapshot, decode_snapshot, take_snapshot,
+                                   ratings_as_of, movers_since, KEYFRAME_INTERVAL)
+from statistik.models import Song, Chart
+
+
+class SnapshotEncodingTest(TestCase):
+    def test_keyframe_round_trip(self):
+        ids = np.array([3, 7, 8, 120])
+        ratings = np.array([1000.0, 1012.34, 987.5, 1500.01])
+
+        decoded_ids, decoded_ratings = decode_snapshot(encode_snapshot(ids, ratings))
+
+        np.testing.assert_array_equal(decoded_ids, ids)
+        np.testing.assert_allclose(decoded_ratings, ratings)
+
+    def test_delta_against_previous_snapshot(self):
+        previous = (np.array([3, 7]), np.array([1010.0, 990.0]))
+        ids = np.array([3, 7, 9])
+        ratings = np.array([1010.0, 995.5, 1003.0])
+
+        data = encode_snapshot(ids, ratings, previous)
+        decoded_ids, decoded_ratings = decode_snapshot(data, previous)
+
+        np.testing.assert_array_equal(decoded_ids, ids)
+        np.testing.assert_allclose(decoded_ratings, ratings)
+
+
+class EloHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('voter', password='pass')
+        cls.charts = []
+        for i in range(3):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000))
+
+    def vote(self, winner, loser):
+        elo_rate_charts(self.charts[winner].id, self.charts[loser].id, self.user)
+
+    def current_ratings(self):
+        return dict(Chart.objects.values_list('id', 'elo_rating'))
+
+    def test_reconstructs_from_snapshot_and_later_votes(self):
+        self.vote(0, 1)
+        take_snapshot(IIDX, 12, 0)
+        self.vote(2, 0)
+        self.vote(2, 1)
+
+        ratings = ratings_as_of(IIDX, 12, 0, timezone.now())
+
+        for chart_id, rating in self.current_ratings().items():
+            self.assertAlmostEqual(ratings[chart_id], rating, places=1)
+
+    def test_uses_keyframes_and_deltas(self):
+        for i in range(KEYFRAME_INTERVAL + 1):
+            self.vote(i % 3, (i + 1) % 3)
+            snapshot = take_snapshot(IIDX, 12, 0)
+            self.assertEqual(snapshot.keyframe, i % KEYFRAME_INTERVAL == 0)
+
+        ratings = ratings_as_of(IIDX, 12, 0, timezone.now())
+        for chart_id, rating in self.current_ratings().items():
+            self.assertAlmostEqual(ratings[chart_id], rating, places=1)
+
+    def test_before_any_votes_everything_is_default(self):
+        self.vote(0, 1)
+        past = timezone.now() - datetime.timedelta(days=1)
+
+        self.assertEqual(set(ratings_as_of(IIDX, 12, 0, past).values()), {1000})
+        changes = {mover['id']: mover['rating_change']
+                   for mover in movers_since(IIDX, 12, 0, past)}
+        self.assertEqual(changes, {self.charts[0].id: 10.0, self.charts[1].id: -10.0,
+                                   self.charts[2].id: 0})
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.controller import elo_rate_charts
+from statistik.elo_queue import apply_pending_votes
+from statistik.models import Song, Chart, EloReview, PendingEloVote
+
+VOTES = [(0, 1, False, 0), (2, 0, False, 0), (1, 2, True, 1), (0, 2, False, 0)]
+
+
+class EloQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('voter', password='pass')
+        cls.charts = []
+        for i in range(3):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000))
+
+    def ratings(self):
+        return list(Chart.objects.order_by('id').values_list('elo_rating', 'elo_rating_hc'))
+
+    def test_batch_matches_synchronous_votes(self):
+        for first, second, drawn, rate_type in VOTES:
+            elo_rate_charts(self.charts[first].id, self.charts[second].id, self.user, drawn,
+                            rate_type)
+        expected = self.ratings()
+        Chart.objects.update(elo_rating=1000, elo_rating_hc=1000)
+        EloReview.objects.all().delete()
+
+        for first, second, drawn, rate_type in VOTES:
+            PendingEloVote.objects.create(first=self.charts[first], second=self.charts[second],
+                                          drawn=drawn, type=rate_type, created_by=self.user)
+        self.assertEqual(apply_pending_votes(), len(VOTES))
+
+        for rating, expected_rating in zip(self.ratings(), expected):
+            self.assertAlmostEqual(rating[0], expected_rating[0])
+            self.assertAlmostEqual(rating[1], expected_rating[1])
+        self.assertEqual(EloReview.objects.count(), len(VOTES))
+        self.assertFalse(PendingEloVote.objects.exists())
+        self.assertEqual(apply_pending_votes(), 0)
+
+    def test_applies_in_batches_in_order(self):
+        for first, second, drawn, rate_type in VOTES:
+            PendingEloVote.objects.create(first=self.charts[first], second=self.charts[second],
+                                          drawn=drawn, type=rate_type)
+
+        self.assertEqual(apply_pending_votes(batch_size=3), 3)
+        remaining = PendingEloVote.objects.get()
+        self.assertEqual((remaining.first_id, remaining.second_id),
+                         (self.charts[0].id, self.charts[2].id))
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.fields import (techniques_to_mask, mask_to_techniques, options_to_mask,
+                              mask_to_options)
+from statistik.models import Song, Chart, Review, UserProfile
+
+
+class BitmaskFieldsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reviewer', password='pass')
+        UserProfile.objects.create(user=cls.user, play_side=0, max_reviewable=12, location='',
+                                   best_techniques=[3, 104])
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        cls.chart = Chart.objects.create(song=song, type=0, difficulty=12, note_count=1000)
+        cls.other_chart = Chart.objects.create(song=song, type=1, difficulty=12,
+                                               note_count=1200)
+
+    def test_masks_round_trip(self):
+        self.assertEqual(mask_to_techniques(techniques_to_mask(['9', 0, 3])), [0, 3, 9])
+        self.assertEqual(mask_to_techniques(techniques_to_mask([100, 111])), [100, 111])
+        self.assertNotEqual(techniques_to_mask([1]), techniques_to_mask([101]))
+        self.assertEqual(mask_to_options(options_to_mask([23, 5])), [5, 23])
+        self.assertEqual(techniques_to_mask([]), 0)
+
+    def test_models_keep_list_api(self):
+        Review.objects.create(chart=self.chart, user=self.user, clear_rating=12,
+                              characteristics=['2', '0'], recommended_options=[1])
+        review = Review.objects.get(chart=self.chart)
+
+        self.assertEqual(review.characteristics, [0, 2])
+        self.assertEqual(review.recommended_options, [1])
+        self.assertEqual(UserProfile.objects.get(user=self.user).best_techniques, [3, 104])
+
+    def test_technique_search_uses_masks(self):
+        from statistik.controller import get_charts_by_query
+        Review.objects.create(chart=self.chart, user=self.user, clear_rating=12,
+                              characteristics=[1, 3])
+        Review.objects.create(chart=self.other_chart, user=self.user, clear_rating=12,
+                              characteristics=[3])
+
+        charts = get_charts_by_query(IIDX, difficulty=12, params={'techs': ['1', '3']})
+
+        self.assertEqual(list(charts), [self.chart])
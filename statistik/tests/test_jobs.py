@@ -0,0 +1,65 @@
+from django.test import TestCase
+
+from statistik.jobs import job, enqueue, claim_jobs, run_job, set_progress
+from statistik.models import Job
+
+calls = []
+
+
+@job('test_record')
+def record(value=None):
+    set_progress(0.5, 'halfway')
+    calls.append(value)
+
+
+@job('test_fail', max_attempts=2)
+def fail():
+    raise RuntimeError('failed')
+
+
+class JobTest(TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def test_queued_jobs_are_deduplicated(self):
+        first = enqueue('test_record', value=1)
+        self.assertEqual(enqueue('test_record', value=1), first)
+        self.assertNotEqual(enqueue('test_record', value=2), first)
+        self.assertEqual(enqueue('test_record', key='shared').key, 'shared')
+        with self.assertRaises(KeyError):
+            enqueue('no such job')
+
+        # once it's running, a new request queues it again
+        claim_jobs(1)
+        self.assertNotEqual(enqueue('test_record', value=1), first)
+
+    def test_jobs_are_claimed_once(self):
+        jobs = [enqueue('test_record', value=i) for i in range(3)]
+
+        self.assertEqual(claim_jobs(2), [jobs[0].id, jobs[1].id])
+        self.assertEqual(claim_jobs(2), [jobs[2].id])
+        self.assertEqual(claim_jobs(2), [])
+
+    def test_run_records_progress_and_completion(self):
+        queued = enqueue('test_record', value=3)
+        claim_jobs(1)
+
+        self.assertEqual(run_job(queued.id), Job.DONE)
+        self.assertEqual(calls, [3])
+        finished = Job.objects.get(id=queued.id)
+        self.assertEqual((finished.progress, finished.message), (1, 'halfway'))
+        self.assertIsNotNone(finished.duration)
+
+    def test_failed_jobs_are_retried_then_failed(self):
+        queued = enqueue('test_fail')
+        claim_jobs(1)
+        self.assertEqual(run_job(queued.id), Job.QUEUED)
+        # retries wait before they can be claimed
+        self.assertEqual(claim_jobs(1), [])
+
+        Job.objects.filter(id=queued.id).update(run_after=queued.created_at)
+        claim_jobs(1)
+        self.assertEqual(run_job(queued.id), Job.FAILED)
+        failed = Job.objects.get(id=queued.id)
+        self.assertEqual(failed.attempts, 2)
+        self.assertIn('RuntimeError', failed.error)
@@ -0,0 +1,39 @@
+from django.test import TestCase
+from statistik.constants import IIDX, DDR
+from statistik.fields import techniques_to_mask
+from statistik.labels import get_label_table, format_options, format_characteristics_mask
+
+
+class LabelsTest(TestCase):
+    def test_label_tables_are_built_once_per_language_and_game(self):
+        self.assertIs(get_label_table(IIDX, 'en'), get_label_table(IIDX, 'en'))
+        self.assertIsNot(get_label_table(IIDX, 'en'), get_label_table(DDR, 'en'))
+
+    def test_format_characteristics_highlights_best_techniques(self):
+        labels = get_label_table(IIDX, 'en')
+        items = format_characteristics_mask(labels, techniques_to_mask([0, 3]),
+                                            best_techniques=techniques_to_mask([3]),
+                                            difficulty_spike=3)
+
+        self.assertEqual(items, [('Scratching', '#000'),
+                                 ('Charge Notes', '#187638'),
+                                 ('Difficult End', '#000')])
+
+    def test_format_characteristics_uses_stored_ddr_values(self):
+        labels = get_label_table(DDR, 'en')
+
+        self.assertEqual(format_characteristics_mask(labels, techniques_to_mask([100, 111])),
+                         [('Crossovers', '#000'), ('Candles', '#000')])
+
+    def test_format_options_joins_labels(self):
+        labels = get_label_table(IIDX, 'en')
+
+        self.assertEqual(format_options(labels, [1, 4]), 'Random, Mirror')
+        self.assertEqual(format_options(labels, None), '')
+
+    def test_format_characteristics_mask_without_techniques(self):
+        labels = get_label_table(DDR, 'en')
+
+        self.assertEqual(format_characteristics_mask(labels, None, None), [])
+        self.assertEqual(format_characteristics_mask(labels, 0, 0, 2),
+                         [('Difficult Middle', '#000')])
@@ -0,0 +1,47 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.leaderboard import get_leaderboard, chart_rank, chart_url
+from statistik.models import Song, Chart
+
+
+class LeaderboardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.charts = []
+        for i, rating in enumerate([1000, 1100, 1000, 950]):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000, elo_rating=rating))
+        # doubles charts aren't ranked
+        cls.doubles = Chart.objects.create(song=song, type=5, difficulty=12, note_count=1000)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranks_by_rating_then_id(self):
+        rows = get_leaderboard(IIDX, 12, 'elo_rating').rows
+
+        self.assertEqual([(row[0], row[1]) for row in rows],
+                         [(1, self.charts[1].id), (2, self.charts[0].id),
+                          (3, self.charts[2].id), (4, self.charts[3].id)])
+
+    def test_chart_rank_matches_with_and_without_cache(self):
+        uncached = [chart_rank(chart, IIDX, 'elo_rating') for chart in self.charts]
+        get_leaderboard(IIDX, 12, 'elo_rating')
+        cached = [chart_rank(chart, IIDX, 'elo_rating') for chart in self.charts]
+
+        self.assertEqual(uncached, [(2, 4), (1, 4), (3, 4), (4, 4)])
+        self.assertEqual(cached, uncached)
+        self.assertIsNone(chart_rank(self.doubles, IIDX, 'elo_rating'))
+
+    def test_json_and_links(self):
+        data = json.loads(get_leaderboard(IIDX, 12, 'elo_rating').json)['data']
+
+        self.assertEqual(data[0], {'rank': 1, 'id': self.charts[1].id, 'title': 'song 1',
+                                   'type': 'SPA', 'rating': 1100})
+        self.assertEqual(chart_url(5), '/chart/5')
@@ -0,0 +1,34 @@
+from django.test import TestCase
+from statistik.loaders import IdentityMap
+from statistik.models import Song, Chart
+
+
+class LoaderTest(TestCase):
+    def setUp(self):
+        self.songs = [Song.objects.create(title=title, artist='Artist', bpm_min=150,
+                                          bpm_max=150, game=0, game_version=25)
+                      for title in ['Song A', 'Song B']]
+        self.charts = [Chart.objects.create(song=song, type=0, difficulty=12)
+                       for song in self.songs]
+
+    def test_repeated_lookups_are_served_from_memory(self):
+        identity_map = IdentityMap()
+        with self.assertNumQueries(1):
+            chart = identity_map.charts.load(self.charts[0].id)
+            self.assertIs(identity_map.charts.load(self.charts[0].id), chart)
+            # the chart's song is loaded and shared with the song loader
+            self.assertEqual(chart.song.title, 'Song A')
+            self.assertIs(identity_map.songs.load(self.songs[0].id), chart.song)
+
+    def test_queued_keys_are_batched_into_one_query(self):
+        identity_map = IdentityMap()
+        identity_map.charts.want(self.charts[1].id)
+        with self.assertNumQueries(1):
+            identity_map.charts.load(self.charts[0].id)
+            self.assertEqual(identity_map.charts.load(self.charts[1].id).song.title, 'Song B')
+
+    def test_missing_keys_load_as_none(self):
+        identity_map = IdentityMap()
+        with self.assertNumQueries(1):
+            self.assertIsNone(identity_map.charts.load(-1))
+            self.assertIsNone(identity_map.charts.load(-1))
@@ -0,0 +1,56 @@
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.matchmaking import (choose_pair, rating_variance, get_level_state,
+                                   clear_level_states, invalidate_level_states,
+                                   LEVEL_STATE_VERSION_KEY)
+from statistik.models import Song, Chart
+
+
+class MatchmakingTest(TestCase):
+    def test_variance_shrinks_with_votes(self):
+        variance = rating_variance(np.array([0, 1, 10, 100]))
+        self.assertTrue(np.all(np.diff(variance) < 0))
+
+    def test_prefers_new_charts_close_in_rating(self):
+        # charts 0-3 are well established, chart 4 is new at the default rating
+        ratings = np.array([600.0, 800.0, 1000.0, 1200.0, 1000.0])
+        votes = np.array([500, 500, 500, 500, 0])
+        rng = np.random.RandomState(0)
+
+        pairs = [set(choose_pair(ratings, votes, rng, top_pairs=1)) for _ in range(20)]
+
+        self.assertTrue(all(pair == {2, 4} for pair in pairs))
+
+    def test_never_pairs_a_chart_with_itself(self):
+        rng = np.random.RandomState(0)
+        for _ in range(50):
+            first, second = choose_pair(np.array([1000.0, 1000.0]), np.array([0, 0]), rng)
+            self.assertNotEqual(first, second)
+
+
+class LevelStateTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        cls.chart = Chart.objects.create(song=song, type=2, difficulty=12, note_count=1000)
+
+    def setUp(self):
+        cache.clear()
+        clear_level_states()
+
+    def test_reloaded_once_invalidated(self):
+        self.assertEqual(list(get_level_state(IIDX, 12).ratings), [1000.0])
+        Chart.objects.filter(id=self.chart.id).update(elo_rating=1100)
+        self.assertEqual(list(get_level_state(IIDX, 12).ratings), [1000.0])
+
+        invalidate_level_states()
+        self.assertEqual(list(get_level_state(IIDX, 12).ratings), [1100.0])
+
+        # as if invalidated by another process sharing the cache
+        Chart.objects.filter(id=self.chart.id).update(elo_rating=1200)
+        cache.incr(LEVEL_STATE_VERSION_KEY)
+        self.assertEqual(list(get_level_state(IIDX, 12).ratings), [1200.0])
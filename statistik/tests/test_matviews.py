@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from unittest import skipUnless
+
+from statistik.constants import IIDX
+from statistik.controller import get_avg_ratings
+from statistik.leaderboard import load_leaderboard
+from statistik.matviews import refresh_matviews, matviews_enabled
+from statistik.models import Song, Chart, Review, MatviewRefresh
+
+
+@skipUnless(connection.vendor == 'postgresql', 'materialized views are Postgres only')
+class MatviewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user('reviewer %d' % i, password='pass') for i in range(4)]
+        cls.charts = []
+        for i, rating in enumerate([1000, 1100, 1000, 1050]):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000, elo_rating=rating))
+        # one outlier to trim, one tie to round, and one chart with too few reviews to trim
+        for user, rating in zip(users, [11.2, 11.3, 11.2, 12.9]):
+            Review.objects.create(chart=cls.charts[0], user=user, clear_rating=rating,
+                                  hc_rating=rating + 0.1)
+        for user, rating in zip(users, [11.2, 11.3]):
+            Review.objects.create(chart=cls.charts[1], user=user, clear_rating=rating)
+        # a mean of 12.05 that numeric rounding would take down
+        for user, rating in zip(users, [12.0, 12.1]):
+            Review.objects.create(chart=cls.charts[3], user=user, clear_rating=rating)
+        cls.user = users[0]
+
+    def test_disabled_by_default(self):
+        self.assertFalse(matviews_enabled())
+
+    @override_settings(USE_MATERIALIZED_VIEWS=True)
+    def test_averages_match_computed_averages(self):
+        refresh_matviews()
+        chart_ids = [chart.id for chart in self.charts]
+        materialized = get_avg_ratings(chart_ids, user_id=self.user.id)
+        with self.settings(USE_MATERIALIZED_VIEWS=False):
+            computed = get_avg_ratings(chart_ids, user_id=self.user.id)
+
+        self.assertEqual(materialized, computed)
+        self.assertEqual(materialized[self.charts[3].id]['clear_rating'], '12.1')
+        self.assertEqual(MatviewRefresh.objects.count(), 2)
+
+    @override_settings(USE_MATERIALIZED_VIEWS=True)
+    def test_leaderboard_matches_computed_leaderboard(self):
+        refresh_matviews()
+        materialized = load_leaderboard(IIDX, 12, 'elo_rating').rows
+        with self.settings(USE_MATERIALIZED_VIEWS=False):
+            computed = load_leaderboard(IIDX, 12, 'elo_rating').rows
+
+        self.assertEqual([tuple(row) for row in materialized], [tuple(row) for row in computed])
@@ -0,0 +1,187 @@
+"""
+Query plan regression tests.
+
+Seeds a large synthetic dataset, captures every query issued by each controller
+function and fails if Postgres plans a sequential scan over one of the big
+tables. Seeding takes a while, so these only run against Postgres when
+STATISTIK_PLAN_TESTS is set, e.g.:
+
+    STATISTIK_PLAN_TESTS=1 python manage.py test statistik.tests.test_query_plans
+"""
+import json
+import os
+import random
+from unittest import skipUnless
+
+from django.contrib.auth.models import User, AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from statistik.constants import IIDX
+from statistik.controller import (get_chart_data, get_avg_ratings,
+                                  get_charts_by_query, get_reviews_for_chart,
+                                  get_reviews_for_user, get_elo_rankings,
+                                  make_elo_matchup, generate_review_form,
+                                  elo_rate_charts, delete_review)
+from statistik.models import Song, Chart, Review, EloReview, UserProfile
+
+SCALE = int(os.environ.get('STATISTIK_PLAN_TEST_SCALE', 1))
+SONG_COUNT = 2000 * SCALE
+USER_COUNT = 500 * SCALE
+REVIEWS_PER_USER = 200
+ELO_REVIEW_COUNT = 100000 * SCALE
+
+# sequential scans over tables with more rows than this fail the test
+SEQ_SCAN_ROW_THRESHOLD = 5000
+WATCHED_TABLES = ['statistik_review', 'statistik_eloreview', 'statistik_chart']
+
+
+def seed_large_dataset():
+    """
+    Bulk create songs, charts, users, reviews and Elo reviews
+    """
+    rng = random.Random(1)
+    Song.objects.bulk_create([Song(title='Song %d' % i,
+                                   artist='Artist %d' % (i % 300),
+                                   genre='Genre %d' % (i % 50),
+                                   bpm_min=150,
+                                   bpm_max=150,
+                                   game=IIDX,
+                                   game_version=i % 25 + 1)
+                              for i in range(SONG_COUNT)], batch_size=1000)
+    Chart.objects.bulk_create([Chart(song=song,
+                                     type=chart_type,
+                                     difficulty=min(12, song.id % 10 + chart_type + 1),
+                                     note_count=1000,
+                                     elo_rating=rng.gauss(1000, 100),
+                                     elo_rating_hc=rng.gauss(1000, 100))
+                               for song in Song.objects.all()
+                               for chart_type in range(6)], batch_size=5000)
+
+    User.objects.bulk_create([User(username='user%d' % i) for i in range(USER_COUNT)],
+                             batch_size=1000)
+    users = list(User.objects.all())
+    UserProfile.objects.bulk_create([UserProfile(user=user,
+                                                 dj_name='DJ',
+                                                 location='USA',
+                                                 play_side=0,
+                                                 best_techniques=[0, 1],
+                                                 max_reviewable=12)
+                                     for user in users], batch_size=1000)
+
+    chart_ids = list(Chart.objects.values_list('id', flat=True))
+    reviews = []
+    for user in users:
+        for chart_id in rng.sample(chart_ids, REVIEWS_PER_USER):
+            reviews.append(Review(chart_id=chart_id,
+                                  user=user,
+                                  clear_rating=round(rng.uniform(1, 14), 1),
+                                  hc_rating=round(rng.uniform(1, 14), 1),
+                                  characteristics=[rng.randrange(10)],
+                                  recommended_options=[rng.randrange(5)]))
+    Review.objects.bulk_create(reviews, batch_size=5000)
+
+    EloReview.objects.bulk_create([EloReview(first_id=rng.choice(chart_ids),
+                                             second_id=rng.choice(chart_ids),
+                                             drawn=False,
+                                             type=rng.randrange(2),
+                                             created_by=rng.choice(users))
+                                   for _ in range(ELO_REVIEW_COUNT)], batch_size=5000)
+
+    # make sure the planner has statistics for the new rows
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def find_seq_scans(plan):
+    """
+    Find all sequential scans in an EXPLAIN (FORMAT JSON) plan tree
+    :param dict plan:   Plan node to search
+    :rtype list:        Names of relations that are sequentially scanned
+    """
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scans.append(plan.get('Relation Name'))
+    for subplan in plan.get('Plans', []):
+        scans.extend(find_seq_scans(subplan))
+    return scans
+
+
+@skipUnless(os.environ.get('STATISTIK_PLAN_TESTS') and connection.vendor == 'postgresql',
+            'Set STATISTIK_PLAN_TESTS to run query plan tests against Postgres')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_large_dataset()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT relname, reltuples FROM pg_class WHERE relname IN %s',
+                           [tuple(WATCHED_TABLES)])
+            cls.table_rows = dict(cursor.fetchall())
+        cls.user = User.objects.get(username='user0')
+        cls.chart_id = Review.objects.filter(user=cls.user).values_list(
+            'chart_id', flat=True).first()
+        cls.level_12_ids = list(Chart.objects.filter(difficulty=12).values_list('id', flat=True))
+
+    def assertNoLargeSeqScans(self, func, *args, **kwargs):
+        """
+        Run a controller function and check the plans of all queries it issued
+        """
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+            # force evaluation of lazy querysets
+            if hasattr(result, '__iter__') and not isinstance(result, (dict, str)):
+                list(result)
+
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            for relation in find_seq_scans(plan[0]['Plan']):
+                if relation in WATCHED_TABLES:
+                    self.assertLessEqual(
+                        self.table_rows.get(relation, 0), SEQ_SCAN_ROW_THRESHOLD,
+                        '%s planned a sequential scan on %s:\n%s' % (
+                            func.__name__, relation, sql))
+        return result
+
+    def test_get_chart_data_by_level(self):
+        cache.clear()
+        self.assertNoLargeSeqScans(get_chart_data, IIDX, difficulty=12, play_style='SP',
+                                   user=self.user.id)
+
+    def test_get_charts_by_query_by_version(self):
+        self.assertNoLargeSeqScans(get_charts_by_query, IIDX, versions=['25'], play_style='DP')
+
+    def test_get_avg_ratings(self):
+        self.assertNoLargeSeqScans(get_avg_ratings, self.level_12_ids, IIDX, self.user.id,
+                                   include_reviews=True)
+
+    def test_get_reviews_for_chart(self):
+        self.assertNoLargeSeqScans(get_reviews_for_chart, self.chart_id)
+
+    def test_get_reviews_for_user(self):
+        self.assertNoLargeSeqScans(get_reviews_for_user, self.user.id)
+
+    def test_get_elo_rankings(self):
+        self.assertNoLargeSeqScans(get_elo_rankings, IIDX, 12, 'elo_rating')
+        self.assertNoLargeSeqScans(get_elo_rankings, IIDX, 12, 'elo_rating_hc')
+
+    def test_make_elo_matchup(self):
+        self.assertNoLargeSeqScans(make_elo_matchup, IIDX, 12)
+
+    def test_generate_review_form(self):
+        self.assertNoLargeSeqScans(generate_review_form, self.user, self.chart_id)
+        self.assertNoLargeSeqScans(generate_review_form, AnonymousUser(), self.chart_id)
+
+    def test_elo_rate_charts(self):
+        self.assertNoLargeSeqScans(elo_rate_charts, self.level_12_ids[0],
+                                   self.level_12_ids[1], self.user)
+
+    def test_delete_review(self):
+        self.assertNoLargeSeqScans(delete_review, self.user.id, self.chart_id)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from statistik.querylog import fingerprint_sql, summarize_slow_queries, log_slow_query
+
+
+class QueryLogTest(TestCase):
+    def test_fingerprint_sql_groups_queries_with_different_in_lists(self):
+        sql1 = 'SELECT * FROM "statistik_review" WHERE "statistik_review"."chart_id" IN (%s, %s, %s)'
+        sql2 = 'SELECT * FROM "statistik_review" WHERE "statistik_review"."chart_id" IN (%s)'
+
+        self.assertEqual(fingerprint_sql(sql1), fingerprint_sql(sql2))
+
+    def test_fingerprint_sql_replaces_literals(self):
+        sql = "SELECT * FROM statistik_chart WHERE difficulty = 12 AND title = 'V'"
+
+        self.assertEqual(fingerprint_sql(sql),
+                         'SELECT * FROM statistik_chart WHERE difficulty = ? AND title = ?')
+
+    def test_summarize_slow_queries_orders_by_total_time(self):
+        entries = [
+            {'fingerprint': 'a', 'duration_ms': 150.0, 'controller': 'get_avg_ratings',
+             'view': 'ratings_view'},
+            {'fingerprint': 'b', 'duration_ms': 120.0, 'controller': 'get_elo_rankings',
+             'view': 'elo_view'},
+            {'fingerprint': 'b', 'duration_ms': 130.0, 'controller': 'get_elo_rankings',
+             'view': 'elo_view'}
+        ]
+        summary = summarize_slow_queries(entries)
+
+        self.assertEqual([group['fingerprint'] for group in summary], ['b', 'a'])
+        self.assertEqual(summary[0]['count'], 2)
+        self.assertEqual(summary[0]['max_ms'], 130.0)
+        self.assertEqual(summary[0]['origins'], {'elo_view/get_elo_rankings'})
+
+    def test_explaining_a_slow_select_keeps_its_rows(self):
+        sql = 'SELECT 1 UNION SELECT 2'
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            # plans are only taken outside of transactions
+            with mock.patch.object(connection, 'in_atomic_block', False), \
+                    self.assertLogs('statistik.slow_queries') as logs:
+                log_slow_query(connection, sql, None, 1.0)
+            self.assertEqual(sorted(cursor.fetchall()), [(1,), (2,)])
+        self.assertEqual(len(logs.records), 1)
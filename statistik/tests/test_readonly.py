@@ -0,0 +1,21 @@
+from django.test import TestCase, RequestFactory
+
+from statistik.readonly import ReadOnlyMiddleware
+
+
+class ReadOnlyMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReadOnlyMiddleware()
+
+    def test_allows_reads(self):
+        self.assertIsNone(self.middleware.process_request(
+            self.factory.get('/ratings', {'difficulty': 12})))
+        self.assertIsNone(self.middleware.process_request(
+            self.factory.get('/elo', {'level': 12, 'list': 'true'})))
+
+    def test_rejects_writes(self):
+        for request in (self.factory.post('/register', {'username': 'x'}),
+                        self.factory.get('/elo', {'win': 1, 'lose': 2}),
+                        self.factory.get('/chart/1', {'delete': 'true'})):
+            self.assertEqual(self.middleware.process_request(request).status_code, 405)
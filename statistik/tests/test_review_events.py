@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.models import Song, Chart, Review, ReviewEvent
+from statistik.review_events import save_review, remove_review, consume_events, rating_delta
+
+
+class ReviewEventTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reviewer', password='pass')
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        cls.chart = Chart.objects.create(song=song, type=0, difficulty=12, note_count=1000)
+
+    def test_changes_are_logged_with_old_and_new_values(self):
+        save_review(self.chart, self.user, {'clear_rating': 11.5, 'characteristics': [3]})
+        save_review(self.chart, self.user, {'clear_rating': 12.0, 'characteristics': [3, 4]})
+        self.assertTrue(remove_review(self.chart.id, self.user.id))
+        self.assertFalse(remove_review(self.chart.id, self.user.id))
+
+        events = list(ReviewEvent.objects.order_by('id'))
+        self.assertEqual([event.action for event in events],
+                         [ReviewEvent.CREATED, ReviewEvent.UPDATED, ReviewEvent.DELETED])
+        self.assertEqual(len({event.review_id for event in events}), 1)
+        self.assertEqual([(event.old_clear_rating, event.new_clear_rating) for event in events],
+                         [(None, 11.5), (11.5, 12.0), (12.0, None)])
+        self.assertEqual(events[1].old_characteristics, [3])
+        self.assertEqual(events[1].new_characteristics, [3, 4])
+        self.assertFalse(Review.objects.exists())
+        # each change re-renders the chart's cached table row
+        self.assertEqual(Chart.objects.get(id=self.chart.id).aggregate_version, 3)
+
+    def test_admin_changes_are_logged(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.login(username='admin', password='pass')
+        review = save_review(self.chart, self.user, {'clear_rating': 11.5})
+
+        self.client.post(reverse('admin:statistik_review_delete', args=[review.id]),
+                         {'post': 'yes'})
+
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(list(ReviewEvent.objects.order_by('id').values_list('action', flat=True)),
+                         [ReviewEvent.CREATED, ReviewEvent.DELETED])
+
+    def test_consumers_resume_from_their_cursor(self):
+        totals = {'sum': 0, 'count': 0}
+
+        def tally(events):
+            for event in events:
+                change, count = rating_delta(event, 'clear_rating')
+                totals['sum'] += change
+                totals['count'] += count
+
+        save_review(self.chart, self.user, {'clear_rating': 11.5})
+        self.assertEqual(consume_events('tally', tally, batch_size=1), 1)
+        save_review(self.chart, self.user, {'clear_rating': 12.0})
+        other = User.objects.create_user('other', password='pass')
+        save_review(self.chart, other, {'clear_rating': 11.0})
+
+        self.assertEqual(consume_events('tally', tally, batch_size=1), 2)
+        self.assertEqual(consume_events('tally', tally), 0)
+        self.assertEqual(totals, {'sum': 23.0, 'count': 2})
@@ -0,0 +1,51 @@
+# coding=UTF-8
+from django.test import TestCase
+from statistik.rows import build_chart_rows
+
+# id, title, alt_title, note_count, bpm_min, bpm_max, difficulty, game_version,
+# type, clickagain_nc, clickagain_hc, aggregate_version
+SAMPLE_ROWS = [
+    (1, 'Boys Like You', None, 1200, 120, 120, 12, 25, 2, None, None, 0),
+    (2, 'Gangster Trippin', 'GANGSTER', None, 160, 320, 12, 9, 1, 11.8, 12.2, 3)
+]
+
+
+class RowsTest(TestCase):
+    def test_build_chart_rows_formats_display_fields(self):
+        avg_ratings = {1: {'clear_rating': '11.5', 'hc_rating': '12.0', 'has_reviewed': True},
+                       2: {}}
+        rows = build_chart_rows(SAMPLE_ROWS, avg_ratings)
+
+        self.assertEqual(rows[0].difficulty_display, '12★')
+        self.assertEqual(rows[0].bpm, '120')
+        self.assertEqual(rows[0].alt_title, 'Boys Like You')
+        self.assertEqual(rows[0].game_version_display, 'CB')
+        self.assertEqual(rows[0].type_display, 'SPA')
+        self.assertEqual(rows[0].avg_clear_rating, '11.5')
+        self.assertEqual(rows[0].avg_exhc_rating, '')
+
+        self.assertEqual(rows[1].difficulty_display, '12☆')
+        self.assertEqual(rows[1].bpm, '160 - 320')
+        self.assertEqual(rows[1].note_count, '--')
+
+    def test_build_chart_rows_falls_back_to_clickagain_ratings(self):
+        rows = build_chart_rows(SAMPLE_ROWS, {1: {}, 2: {}})
+
+        self.assertFalse(rows[0].clickagain_nc)
+        self.assertTrue(rows[1].clickagain_nc)
+        self.assertEqual(rows[1].avg_clear_rating, '11.8')
+        self.assertEqual(rows[1].avg_hc_rating, '12.2')
+
+    def test_build_chart_rows_filters_by_average_rating(self):
+        avg_ratings = {1: {'clear_rating': '11.5'}, 2: {'clear_rating': '12.5'}}
+        rows = build_chart_rows(SAMPLE_ROWS, avg_ratings, params={'min_nc': '12.0'})
+
+        self.assertEqual([row.id for row in rows], [2])
+
+    def test_as_dict_matches_json_output(self):
+        rows = build_chart_rows(SAMPLE_ROWS, {1: {'reviews': []}, 2: {}}, include_reviews=True)
+        data = rows[0].as_dict(include_reviews=True)
+
+        self.assertEqual(data['reviews'], [])
+        self.assertEqual(data['difficulty'], 12)
+        self.assertNotIn('has_reviewed', data)
@@ -0,0 +1,78 @@
+import json
+import random
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from statistik.constants import IIDX
+from statistik.controller import elo_rate_charts, make_elo_matchup
+from statistik.matchmaking import clear_level_states
+from statistik.models import Song, Chart, EloSeenPairs
+from statistik.seen_pairs import BloomFilter, get_seen_pairs, MIN_CAPACITY
+
+
+class BloomFilterTest(TestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        rng = random.Random(0)
+        pairs = {tuple(rng.sample(range(1, 3000), 2)) for _ in range(1000)}
+        bloom = BloomFilter(len(pairs))
+        for pair in pairs:
+            bloom.add(*pair)
+
+        self.assertTrue(all(pair in bloom and pair[::-1] in bloom for pair in pairs))
+        unseen = [pair for pair in ((rng.randint(1, 3000), rng.randint(3001, 6000))
+                                    for _ in range(10000))]
+        self.assertLess(sum(1 for pair in unseen if pair in bloom), 300)
+
+    def test_round_trips_through_bytes(self):
+        bloom = BloomFilter(100)
+        bloom.add(1, 2)
+        self.assertIn((2, 1), BloomFilter(100, bytes(bloom.bits)))
+
+
+class SeenPairsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('voter', password='pass')
+        cls.charts = []
+        for i in range(3):
+            song = Song.objects.create(title='song %d' % i, artist='artist', game=IIDX,
+                                       game_version=1, bpm_min=150, bpm_max=150)
+            cls.charts.append(Chart.objects.create(song=song, type=2, difficulty=12,
+                                                   note_count=1000))
+
+    def setUp(self):
+        clear_level_states()
+
+    def test_votes_are_remembered(self):
+        first, second, third = [chart.id for chart in self.charts]
+        elo_rate_charts(first, second, self.user)
+        elo_rate_charts(third, second, self.user)
+
+        record = EloSeenPairs.objects.get(user=self.user, type=0)
+        self.assertEqual(record.capacity, MIN_CAPACITY)
+        seen = get_seen_pairs(self.user, 0)
+        self.assertIn((second, first), seen)
+        self.assertIn((second, third), seen)
+
+    def test_matchups_skip_seen_pairs(self):
+        first, second, third = [chart.id for chart in self.charts]
+        elo_rate_charts(first, second, self.user)
+        elo_rate_charts(third, second, self.user)
+
+        for _ in range(10):
+            matchup = make_elo_matchup(IIDX, 12, 0, self.user)
+            self.assertEqual({chart['id'] for chart in matchup}, {first, third})
+
+    def test_batched_matchups_skip_seen_pairs(self):
+        first, second, third = [chart.id for chart in self.charts]
+        elo_rate_charts(first, second, self.user)
+        elo_rate_charts(third, second, self.user)
+        self.client.login(username='voter', password='pass')
+
+        for _ in range(10):
+            response = self.client.get(reverse('elo_matchups', kwargs={'game': 'IIDX'}),
+                                       {'level': 12, 'count': 1})
+            matchup, = json.loads(response.content.decode())['matchups']
+            self.assertEqual({chart['id'] for chart in matchup}, {first, third})
@@ -0,0 +1,45 @@
+import json
+
+from django.test import TestCase
+from statistik.controller import create_new_user
+from statistik.models import Song, Chart, Review
+from statistik.serializers import serialize_reviews, encode_json, parse_fields
+
+
+class SerializersTest(TestCase):
+    def setUp(self):
+        song = Song.objects.create(title='Song A', artist='Artist', bpm_min=150, bpm_max=150,
+                                   game=0, game_version=25)
+        self.chart = Chart.objects.create(song=song, type=2, difficulty=12)
+        self.user = create_new_user({'username': 'ben', 'password': 'lel', 'dj_name': 'blarg',
+                                     'dancer_name': '', 'playside': 1, 'location': 'USA',
+                                     'best_techniques_iidx': [1], 'best_techniques_ddr': []})
+        Review.objects.create(chart=self.chart, user=self.user, text='hard', clear_rating=11.5,
+                              characteristics=[0, 1], recommended_options=[1],
+                              difficulty_spike=3)
+
+    def test_serialize_reviews_formats_chart_page_fields(self):
+        with self.assertNumQueries(1):
+            [review] = serialize_reviews(Review.objects.filter(chart=self.chart))
+
+        self.assertEqual(review.user, 'ben')
+        self.assertEqual(review.playside, '2P')
+        self.assertEqual(review.clear_rating, 11.5)
+        self.assertEqual(review.characteristics, [('Scratching', '#000'),
+                                                  ('Jacks', '#187638'),
+                                                  ('Difficult End', '#000')])
+        self.assertEqual(review.recommended_options, 'Random')
+
+    def test_serialize_reviews_only_includes_selected_fields(self):
+        [review] = serialize_reviews(Review.objects.filter(chart=self.chart),
+                                     parse_fields('user,clear_rating,bogus'))
+
+        self.assertEqual(dict(review.json_items()), {'user': 'ben', 'clear_rating': 11.5})
+
+    def test_encode_json_matches_json_dumps(self):
+        data = {'data': [{'id': 1, 'title': 'ワン', 'reviews': [], 'rating': 11.5},
+                         {'id': 2, 'reviews': [{'a': None, 'b': [1, 2]}], 'empty': {}}]}
+
+        self.assertEqual(encode_json(data, indent=4),
+                         json.dumps(data, indent=4, ensure_ascii=False))
+        self.assertEqual(encode_json(data), json.dumps(data, ensure_ascii=False))
@@ -0,0 +1,100 @@
+import copy
+
+from django.core.cache import cache
+from django.template import engines
+from django.test import TestCase, RequestFactory
+from django.utils import translation
+
+from statistik.rows import build_chart_rows
+
+RATINGS = {1: {'clear_rating': '11.5', 'hc_rating': '12.1', 'has_reviewed': True},
+           2: {}, 3: {'clear_rating': '10.2', 'score_rating': '9.0'}}
+CHARTS = [(1, 'A&B <"quoted">', None, 1500, 150, 150, 12, 25, 2, None, None, 0),
+          (2, "It's", 'alt', None, None, None, 12, 24, 1, 11.9, 12.4, 1),
+          (3, 'DDR', None, 400, 90, 180, 15, 116, 103, None, None, 2)]
+REVIEWS = [{'chart_id': 1, 'title': '<b>', 'type_display': 'SPA', 'difficulty': 12,
+            'text': "it's <hard>", 'characteristics': [('Scratching', '#187638'),
+                                                       ('Trills', '#000')],
+            'recommended_options': 'R-RANDOM', 'clear_rating': 11.5, 'hc_rating': None,
+            'exhc_rating': 12.0, 'score_rating': ''},
+           {'chart_id': 2, 'title': 'B', 'type_display': 'ESP', 'difficulty': 15, 'text': '',
+            'characteristics': [('Stamina', '#000')], 'recommended_options': '',
+            'clear_rating': 14.0, 'score_rating': None}]
+TEMPLATE = "{% load tables %}{% table name %}"
+
+
+class TableTemplatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def render(self, name, engine, **context):
+        template = engines['django'].from_string(TEMPLATE)
+        request = RequestFactory().get('/')
+        with self.settings(TABLE_TEMPLATE_ENGINE=engine):
+            return template.render(dict(context, name=name), request)
+
+    def assertSameOutput(self, name, **context):
+        django_output = self.render(name, 'django', **context)
+        # rendered rows are cached across engines
+        cache.clear()
+        self.assertEqual(self.render(name, 'jinja2', **context), django_output)
+        return django_output
+
+    def test_ratings_tables(self):
+        charts = build_chart_rows(CHARTS, RATINGS)
+        output = self.assertSameOutput('ratings_iidx', charts=charts)
+        self.assertIn('A&amp;B &lt;&quot;quoted&quot;&gt;', output)
+        self.assertIn('It&#39;s', output)
+        self.assertSameOutput('ratings_ddr', charts=charts)
+
+    def test_elo_table(self):
+        self.assertSameOutput('elo_rankings', chart_list=[
+            {'index': 1, 'id': 1, 'title': 'A & B', 'type': 'SPA', 'rating': 1012.345,
+             'link': '/chart/1', 'deviation': 12.5},
+            {'index': 2, 'id': 2, 'title': 'C', 'type': 'SPH', 'rating': 990.0,
+             'link': '/chart/2'}])
+
+    def test_user_tables(self):
+        self.assertSameOutput('user_iidx', iidx_reviews=REVIEWS)
+        self.assertSameOutput('user_ddr', ddr_reviews=REVIEWS)
+
+    def test_translated_tables(self):
+        with translation.override('ja'):
+            self.assertSameOutput('ratings_iidx', charts=build_chart_rows(CHARTS, RATINGS))
+
+
+class CachedChartRowsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def render(self, charts, engine='django'):
+        template = engines['django'].from_string("{% load tables %}{% table 'ratings_iidx' %}")
+        with self.settings(TABLE_TEMPLATE_ENGINE=engine):
+            return template.render({'charts': charts}, RequestFactory().get('/'))
+
+    def test_cached_rows_match_uncached_rows(self):
+        for engine in ('django', 'jinja2'):
+            cache.clear()
+            uncached = self.render(build_chart_rows(CHARTS, RATINGS), engine)
+            self.assertEqual(self.render(build_chart_rows(CHARTS, RATINGS), engine), uncached)
+
+    def test_new_aggregate_version_renders_new_averages(self):
+        self.render(build_chart_rows(CHARTS, RATINGS))
+        ratings = copy.deepcopy(RATINGS)
+        ratings[1]['clear_rating'] = '11.8'
+        self.assertIn('11.5', self.render(build_chart_rows(CHARTS, ratings)))
+
+        charts = [CHARTS[0][:-1] + (1,)] + CHARTS[1:]
+        output = self.render(build_chart_rows(charts, ratings))
+        self.assertIn('11.8', output)
+        self.assertNotIn('11.5', output)
+
+    def test_reviewed_markers_are_per_user(self):
+        self.render(build_chart_rows(CHARTS, RATINGS))
+        ratings = copy.deepcopy(RATINGS)
+        ratings[1]['has_reviewed'] = False
+        ratings[2]['has_reviewed'] = True
+        output = self.render(build_chart_rows(CHARTS, ratings))
+        self.assertIn('12☆', output)
+        self.assertIn('12★', output)
+        self.assertEqual(output.count('★'), 1)
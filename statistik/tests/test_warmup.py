@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from statistik import warmup
+from statistik.constants import IIDX
+from statistik.controller import get_chart_data, invalidate_chart_data
+from statistik.models import Song, Chart, Review, PageAccess
+from django.contrib.auth.models import User
+
+
+class WarmupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reviewer', password='pass')
+        song = Song.objects.create(title='song', artist='artist', game=IIDX, game_version=1,
+                                   bpm_min=150, bpm_max=150)
+        cls.chart = Chart.objects.create(song=song, type=2, difficulty=12, note_count=1000)
+
+    def setUp(self):
+        cache.clear()
+        warmup._counts.clear()
+
+    def test_access_counts_are_flushed(self):
+        for i in range(3):
+            warmup.record_access('ratings', IIDX, '12', 'SP')
+        warmup.record_access('elo', IIDX, 11, 1)
+        warmup.flush_access_counts()
+        warmup.record_access('elo', IIDX, 11, 1)
+        warmup.record_access('elo', IIDX, 11, 1)
+        warmup.flush_access_counts()
+
+        self.assertEqual(PageAccess.objects.count(), 2)
+        self.assertEqual(warmup.popular_pages(1), [('elo', IIDX, 11, '1')])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_warmed_chart_lists_mark_user_reviews(self):
+        warmup.warm_page('ratings', IIDX, 12, 'SP')
+        Review.objects.create(chart=self.chart, user=self.user, clear_rating=11.5)
+
+        # averages are served from the cache until invalidated, reviews aren't
+        row = get_chart_data(IIDX, difficulty='12', play_style='SP', user=self.user.id)[0]
+        self.assertEqual((row.avg_clear_rating, row.has_reviewed), ('', True))
+        self.assertIsNone(get_chart_data(IIDX, difficulty=12, play_style='SP')[0].has_reviewed)
+
+        invalidate_chart_data()
+        row = get_chart_data(IIDX, difficulty=12, play_style='SP', user=self.user.id)[0]
+        self.assertEqual((row.avg_clear_rating, row.difficulty_display), ('11.5', '12★'))
+
+    def test_chart_lists_are_fresh_without_a_shared_cache(self):
+        warmup.warm_page('ratings', IIDX, 12, 'SP')
+        Review.objects.create(chart=self.chart, user=self.user, clear_rating=11.5)
+
+        row = get_chart_data(IIDX, difficulty=12, play_style='SP')[0]
+        self.assertEqual(row.avg_clear_rating, '11.5')
+
+    @override_settings(WARM_CACHES_ON_START=True)
+    def test_ready_after_warmup(self):
+        warmup._ready.clear()
+        self.assertEqual(self.client.get('/healthz/ready').status_code, 503)
+        warmup._ready.set()
+        self.assertEqual(self.client.get('/healthz/ready').status_code, 200)
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 from unittest import skip
 from statistik.controller import (get_charts_by_ids, get_charts_by_query,
@@ -84,6 +85,8 @@ def create_some_reviews(charts, users):
 @skip("These tests are broken...please fix or remove me :(")
 class SongTests(TestCase):
     def setUp(self):
+        # chart lists are cached per level
+        cache.clear()
         self.songs = create_some_songs()
         self.charts = create_some_charts(self.songs)
         self.users = create_some_users()
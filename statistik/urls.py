@@ -19,7 +19,10 @@ from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from statistik import views
 
 urlpatterns = [
+    url(r'^admin/profiles$', views.profiles_view, name='profiles'),
+    url(r'^admin/jobs$', views.jobs_view, name='jobs'),
     url(r'^admin/', include(admin.site.urls)),
+    url(r'^healthz/ready$', views.ready_view, name='ready'),
     url(r'^$', views.index, name='index'),
     url(r'^(?P<game>(IIDX|DDR))$', views.index, name='index'),
     url(r'^ratings$', views.ratings_view, name='ratings'),
@@ -29,6 +32,8 @@ urlpatterns = [
     url(r'^chart/(?P<chart_id>([0-9]*))$', views.chart_view, name='chart'),
     url(r'^elo$', views.elo_view, name='elo'),
     url(r'^(?P<game>(IIDX|DDR))/elo$', views.elo_view, name='elo'),
+    url(r'^(?P<game>(IIDX|DDR))/elo/matchups$', views.elo_matchups_view, name='elo_matchups'),
+    url(r'^(?P<game>(IIDX|DDR))/elo/votes$', views.elo_votes_view, name='elo_votes'),
     url(r'^login$', views.login_view, name='login'),
     url(r'^logout$', views.logout_view, name='logout'),
     url(r'^register$', views.register_view, name='register'),
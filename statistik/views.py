@@ -1,16 +1,22 @@
 """
 Main view controller for Statistik
 """
+import datetime
 import json
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout, authenticate, login
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.db import IntegrityError
 from django.http import (HttpResponseBadRequest, HttpResponseRedirect,
-                         HttpResponse)
+                         HttpResponse, HttpResponseForbidden)
 from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.translation import ugettext as _
+from django.views.decorators.http import require_POST
+from statistik.calibration import get_user_calibration, format_calibration
 from statistik.constants import (FULL_VERSION_NAMES, generate_version_urls,
                                  generate_level_urls, SCORE_CATEGORY_CHOICES,
                                  generate_elo_level_urls, IIDX, DDR, GAMES, GAME_CHOICES)
@@ -18,10 +24,23 @@ from statistik.controller import (get_chart_data, generate_review_form,
                                   get_charts_by_ids, get_reviews_for_chart,
                                   get_reviews_for_user, get_user_list,
                                   create_new_user, elo_rate_charts,
-                                  get_elo_rankings, make_elo_matchup,
+                                  get_elo_rankings, get_elo_movers, make_elo_matchup,
+                                  make_elo_matchups, elo_rate_batch,
                                   create_page_title, make_nav_links,
                                   generate_user_form, delete_review, make_game_links)
 from statistik.forms import RegisterForm, DDRSearchForm, IIDXSearchForm
+from statistik.jobs import load_jobs, enqueue
+from statistik.leaderboard import get_leaderboard, chart_rank
+from statistik.models import Chart, Job
+from statistik.profiling import list_profiles
+from statistik.serializers import parse_fields, encode_json
+from statistik.tasks import CATALOG_SCRIPTS
+from statistik.warmup import record_access, is_ready
+
+
+# most matchups handed out or votes accepted per batch request
+MAX_ELO_BATCH = 50
+JOB_PAGE_SIZE = 100
 
 
 def index(request, game='IIDX'):
@@ -59,6 +78,8 @@ def ratings_view(request, game='IIDX'):
     versions = request.GET.getlist('version')
     play_style = request.GET.get('style', 'SP')
     user = request.user.id
+    # bias-corrected ratings instead of averages, see consensus.py
+    consensus = bool(request.GET.get('consensus')) and not request.GET.get('json')
 
     # if versions:
     #     game = int(versions[0]) // 100
@@ -86,20 +107,31 @@ def ratings_view(request, game='IIDX'):
     if not request.GET.get('submit') and not (difficulty or versions):
         difficulty = 12
 
+    if difficulty and not (versions or params or request.GET.get('json')):
+        record_access('ratings', GAMES[game], difficulty, play_style)
+
+    # the JSON API can ask for a subset of review fields, e.g. &fields=user,clear_rating
     chart_data = get_chart_data(GAMES[game], versions, difficulty, play_style, user, params,
-                                include_reviews=bool(request.GET.get('json')))
+                                include_reviews=bool(request.GET.get('json')),
+                                review_fields=parse_fields(request.GET.get('fields')),
+                                consensus=consensus)
 
     if request.GET.get('json'):
         return HttpResponse(
-            json.dumps({'data': chart_data}, indent=4, ensure_ascii=False))
-
-    _generate_chart_difficulty_display(chart_data)
-    _generate_chart_bpm_display(chart_data)
+            encode_json({'data': [chart.as_dict(include_reviews=True) for chart in chart_data]},
+                        indent=4))
 
     # assemble displayed info for each of the charts
     context = {
-        'charts': chart_data
+        'charts': chart_data,
+        'consensus': consensus
     }
+    query = request.GET.copy()
+    if consensus:
+        del query['consensus']
+    else:
+        query['consensus'] = 'true'
+    context['consensus_toggle_url'] = request.path + '?' + query.urlencode()
 
     # assemble page title
     title_elements = []
@@ -159,12 +191,17 @@ def chart_view(request, chart_id=None):
 
     context['difficulty'] = chart.difficulty
     context['chart_id'] = chart_id
+    context['elo_ranks'] = [
+        (SCORE_CATEGORY_CHOICES[chart.song.game][clear_type][1], rank)
+        for clear_type, rank in enumerate(chart_rank(chart, chart.song.game, column)
+                                          for column in ('elo_rating', 'elo_rating_hc'))
+        if rank is not None]
 
     form_data = request.POST if request.method == 'POST' else None
     context['form'], context['review_exists'] = generate_review_form(
             request.user, chart_id, form_data)
 
-    # get reviews for this chart, cache users for username and playside lookup
+    # get reviews for this chart, reviewers' profiles are joined in
     context['reviews'] = get_reviews_for_chart(chart_id)
     if chart.song.game == IIDX:
         style = chart.get_type_display()[:2]
@@ -184,6 +221,21 @@ def chart_view(request, chart_id=None):
         return render(request, 'chart_ddr.html', context)
 
 
+def _parse_end_of_day(value):
+    """
+    Parse a YYYY-MM-DD date from a query parameter
+    :param str value:   Date to parse, may be None or invalid
+    :rtype datetime:    The end of that day in the current time zone, or None
+    """
+    try:
+        date = parse_date(value or '')
+    except ValueError:
+        return None
+    if date is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.max))
+
+
 def elo_view(request, game='IIDX'):
     """
     Handle requests for Elo views (lists as well as individual matchups)
@@ -195,6 +247,9 @@ def elo_view(request, game='IIDX'):
     level = request.GET.get('level', '12')
     display_list = bool(request.GET.get('list'))
     clear_type = int(request.GET.get('type', 0))
+    model = 'bt' if request.GET.get('model') == 'bt' else 'elo'
+    as_of = _parse_end_of_day(request.GET.get('as_of'))
+    since = _parse_end_of_day(request.GET.get('since'))
     # game = int(request.GET.get('game', IIDX))
 
     if not (display_list or request.user.is_authenticated()):
@@ -217,14 +272,24 @@ def elo_view(request, game='IIDX'):
     # handle regular requests
     else:
         context = {}
+        if model == 'elo' and not as_of:
+            record_access('elo', GAMES[game], level, clear_type)
+        if display_list and request.GET.get('json'):
+            return HttpResponse(get_leaderboard(GAMES[game], level, rate_type_column).json,
+                                content_type='application/json')
         if display_list:
             # display list of charts ranked by elo
             # TODO fix line length
-            context['chart_list'] = get_elo_rankings(GAMES[game], level, rate_type_column)
+            context['chart_list'] = get_elo_rankings(GAMES[game], level, rate_type_column,
+                                                     model, as_of)
+            if since:
+                context['movers'] = get_elo_movers(GAMES[game], level, clear_type, since)
+                context['since'] = request.GET.get('since')
             title_elements = ['ELO', game + ' ' + level + '☆ ' + type_display + _(' LIST')]
         else:
             # display two songs to rank
-            [context['chart1'], context['chart2']] = make_elo_matchup(GAMES[game], level)
+            [context['chart1'], context['chart2']] = make_elo_matchup(GAMES[game], level,
+                                                                          clear_type, request.user)
 
             # add page title
             title_elements = ['ELO', game + ' ' + level + '☆ ' + type_display + _(' MATCHING')]
@@ -234,6 +299,7 @@ def elo_view(request, game='IIDX'):
     context['level'] = level
     context['is_hc'] = clear_type
     context['is_hc_display'] = type_display
+    context['model'] = model
     context['level_links'] = generate_elo_level_urls(GAMES[game])
     context['nav_links'] = make_nav_links(
             level=int(level),
@@ -243,6 +309,42 @@ def elo_view(request, game='IIDX'):
     return render(request, 'elo_rating.html', context)
 
 
+def elo_matchups_view(request, game='IIDX'):
+    """
+    Hand out a batch of Elo matchups as JSON, for voting without page loads
+    :param request: Request to handle
+    """
+    if not request.user.is_authenticated():
+        return HttpResponseForbidden()
+    try:
+        level = int(request.GET.get('level', 12))
+        clear_type = int(request.GET.get('type', 0))
+        count = max(1, min(int(request.GET.get('count', 10)), MAX_ELO_BATCH))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid parameters')
+    matchups = make_elo_matchups(GAMES[game], level, clear_type, count, request.user)
+    return HttpResponse(encode_json({'matchups': matchups}), content_type='application/json')
+
+
+@require_POST
+def elo_votes_view(request, game='IIDX'):
+    """
+    POST only, records a batch of Elo votes sent as JSON in the 'votes' field
+    (see elo_rate_batch for the format)
+    :param request: Request to handle
+    """
+    if not request.user.is_authenticated():
+        return HttpResponseForbidden()
+    try:
+        results = json.loads(request.POST.get('votes', '[]'))
+        if len(results) > MAX_ELO_BATCH:
+            return HttpResponseBadRequest('Too many votes')
+        applied = elo_rate_batch(results, request.user, int(request.POST.get('type', 0)))
+    except (ValueError, KeyError, TypeError, AttributeError, Chart.DoesNotExist):
+        return HttpResponseBadRequest('Invalid votes')
+    return HttpResponse(encode_json({'applied': applied}), content_type='application/json')
+
+
 def user_view(request, user_id=None):
     """
     Handle requests for both individual user pages as well as the userlist
@@ -256,6 +358,12 @@ def user_view(request, user_id=None):
         if not user:
             return HttpResponseBadRequest()
 
+        calibration = format_calibration(get_user_calibration(user.id))
+        if request.GET.get('json'):
+            return HttpResponse(encode_json({'calibration': calibration}),
+                                content_type='application/json')
+        context['calibration'] = calibration
+
         user_reviews = get_reviews_for_user(user.id)
         if IIDX in user_reviews:
             context['iidx_reviews'] = user_reviews[IIDX]
@@ -385,24 +493,50 @@ def search_view(request, game='IIDX'):
     context['game'] = game
     return render(request, 'search.html', context)
 
-# TODO: These don't really belong here...move them somewhere else
-def _generate_chart_difficulty_display(chart_data):
-    for chart in chart_data:
-        if 'has_reviewed' in chart and chart['has_reviewed']:
-            chart['difficulty'] = str(chart['difficulty']) + "★"
-        else:
-            chart['difficulty'] = str(chart['difficulty']) + "☆"
 
-    return chart_data
+def ready_view(request):
+    """
+    Readiness check for load balancers, 503 until this process has warmed its caches
+    :param request: Request to handle
+    """
+    if is_ready():
+        return HttpResponse('ready', content_type='text/plain')
+    return HttpResponse('warming up', content_type='text/plain', status=503)
 
-def _generate_chart_bpm_display(chart_data):
-    for chart in chart_data:
-        if 'bpm_min' in chart:
-            if 'bpm_max' in chart and chart['bpm_min'] != chart['bpm_max']:
-                chart['bpm'] = "{0} - {1}".format(chart['bpm_min'], chart['bpm_max'])
-            else:
-                chart['bpm'] = str(chart['bpm_min']) 
+
+@staff_member_required
+def profiles_view(request):
+    """
+    Staff only, lists recent request profiles with their most expensive functions
+    :param request: Request to handle
+    """
+    context = {'profiles': list_profiles()}
+    create_page_title(context, ['PROFILES'])
+    return render(request, 'profiles.html', context)
+
+
+@staff_member_required
+def jobs_view(request):
+    """
+    Staff only, lists recent background jobs and queues new ones
+    :param request: Request to handle
+    """
+    if request.method == 'POST':
+        name = request.POST.get('name')
+        if name == 'import_catalog':
+            script = request.POST.get('script')
+            if script not in CATALOG_SCRIPTS:
+                return HttpResponseBadRequest()
+            enqueue(name, script=script)
+        elif name in load_jobs():
+            enqueue(name)
         else:
-            chart['bpm'] = '--'
-    
-    return chart_data
\ No newline at end of file
+            return HttpResponseBadRequest()
+        return redirect('jobs')
+    context = {
+        'jobs': Job.objects.order_by('-id')[:JOB_PAGE_SIZE],
+        'job_names': sorted(name for name in load_jobs() if name != 'import_catalog'),
+        'catalog_scripts': CATALOG_SCRIPTS
+    }
+    create_page_title(context, ['JOBS'])
+    return render(request, 'jobs.html', context)
@@ -0,0 +1,165 @@
+"""
+Cache warm-up for the most requested ratings and Elo pages.
+
+Views count requests per (kind, game, level, variant) with record_access();
+counts are kept in memory and added to PageAccess at most once every
+ACCESS_FLUSH_INTERVAL seconds. warm_caches() loads the chart lists, Elo
+leaderboards and matchmaking state of the most requested pages in a thread
+pool, so the first visitors after a deploy don't pay for them.
+
+Chart lists are only cached with a shared cache (SHARED_CACHE), and
+matchmaking state is cached per process, so with gunicorn each worker warms
+itself after it starts (see gunicorn.conf.py, enabled by
+WARM_CACHES_ON_START). Until it's done, /healthz/ready answers 503 so the load
+balancer can hold traffic back.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction, connection, DatabaseError, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from statistik.constants import IIDX
+from statistik.controller import get_level_chart_data
+from statistik.leaderboard import get_leaderboard
+from statistik.matchmaking import get_level_state
+from statistik.models import PageAccess
+
+logger = logging.getLogger(__name__)
+
+ACCESS_FLUSH_INTERVAL = 60
+DEFAULT_PAGES = 20
+DEFAULT_THREADS = 4
+# warmed when nothing has been recorded yet
+FALLBACK_PAGES = [('ratings', IIDX, 12, 'SP'), ('elo', IIDX, 12, '0'), ('elo', IIDX, 12, '1')]
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_last_flush = time.time()
+_ready = threading.Event()
+
+
+def record_access(kind, game, level, variant):
+    """
+    Count a request for a page
+    :param str kind:        'ratings' or 'elo'
+    :param int game:        The game (from GAME_CHOICES)
+    :param int level:       Level of the page
+    :param str variant:     Play style of a ratings page, or rating type of an Elo page
+    """
+    if not getattr(settings, 'RECORD_PAGE_ACCESS', True):
+        return
+    with _counts_lock:
+        _counts[(kind, game, int(level), str(variant))] += 1
+        due = time.time() - _last_flush > ACCESS_FLUSH_INTERVAL
+    if due:
+        flush_access_counts()
+
+
+def flush_access_counts():
+    """
+    Add the in-memory request counts to PageAccess
+    """
+    global _last_flush
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _last_flush = time.time()
+    try:
+        with transaction.atomic():
+            for (kind, game, level, variant), count in sorted(counts.items()):
+                page = PageAccess.objects.filter(kind=kind, game=game, level=level,
+                                                 variant=variant)
+                if page.update(count=F('count') + count, last_accessed=timezone.now()):
+                    continue
+                try:
+                    with transaction.atomic():
+                        PageAccess.objects.create(kind=kind, game=game, level=level,
+                                                  variant=variant, count=count)
+                except IntegrityError:
+                    # created by another process in the meantime
+                    page.update(count=F('count') + count)
+    except DatabaseError:
+        # counts are only a hint, e.g. read-only databases can't store them
+        logger.warning('Could not store page access counts', exc_info=True)
+
+
+def popular_pages(limit=DEFAULT_PAGES):
+    """
+    :param int limit:   Number of pages to return
+    :rtype list:        (kind, game, level, variant) of the most requested pages
+    """
+    pages = list(PageAccess.objects.order_by('-count').values_list(
+        'kind', 'game', 'level', 'variant')[:limit])
+    return pages or FALLBACK_PAGES[:limit]
+
+
+def warm_page(kind, game, level, variant):
+    """
+    Load the cached data behind a page
+    :rtype float:   Seconds taken
+    """
+    start = time.time()
+    if kind == 'ratings':
+        get_level_chart_data(game, level, variant)
+    elif kind == 'elo':
+        rate_type = int(variant)
+        get_leaderboard(game, level, 'elo_rating_hc' if rate_type == 1 else 'elo_rating')
+        get_level_state(game, level, rate_type)
+    return time.time() - start
+
+
+def _warm_page(page):
+    try:
+        return page, warm_page(*page)
+    except Exception:
+        logger.exception('Warming %s failed', page)
+        return page, None
+    finally:
+        # runs in pool threads, which requests don't close connections for
+        connection.close()
+
+
+def warm_caches(limit=None, threads=None):
+    """
+    Warm the caches of the most requested pages, then mark this process ready
+    :param int limit:   Number of pages to warm, defaults to WARM_CACHES_PAGES
+    :param int threads: Number of pages to warm at once, defaults to WARM_CACHES_THREADS
+    :rtype list:        (page, seconds taken or None if it failed) for each page
+    """
+    limit = limit or getattr(settings, 'WARM_CACHES_PAGES', DEFAULT_PAGES)
+    threads = threads or getattr(settings, 'WARM_CACHES_THREADS', DEFAULT_THREADS)
+    try:
+        pages = popular_pages(limit)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(_warm_page, pages))
+    finally:
+        # a failed warm-up shouldn't keep the process out of rotation forever
+        _ready.set()
+
+
+def start_warmup():
+    """
+    Warm caches in a background thread, e.g. from a gunicorn worker hook
+    """
+    def warm():
+        try:
+            warm_caches()
+        finally:
+            connection.close()
+    thread = threading.Thread(target=warm, name='cache-warmup')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def is_ready():
+    """
+    :rtype bool:    Whether this process has finished warming up, if it warms up at all
+    """
+    return not getattr(settings, 'WARM_CACHES_ON_START', False) or _ready.is_set()